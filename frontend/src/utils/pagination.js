@@ -0,0 +1,31 @@
+// src/utils/pagination.js
+import axios from 'axios';
+
+/**
+ * Загружает все страницы курсорного списка, следуя по ссылкам `next`.
+ * Используется там, где страница работает с полным списком
+ * (клиентская фильтрация в каталоге и категории, история заказов).
+ *
+ * @param {string} url - Адрес первой страницы
+ * @param {object} config - Конфигурация axios (заголовки)
+ * @param {object} options - resultsKey: ключ списка в ответе,
+ *   onPage: функция, вызываемая с данными каждой страницы
+ */
+export async function fetchAllPages(url, config = {}, { resultsKey = 'results', onPage } = {}) {
+  const results = [];
+  let response = await axios.get(url, config);
+  for (;;) {
+    const data = response.data;
+    if (Array.isArray(data)) {
+      return results.concat(data);
+    }
+    if (onPage) {
+      onPage(data);
+    }
+    results.push(...(data[resultsKey] || []));
+    if (!data.next) {
+      return results;
+    }
+    response = await axios.get(data.next, { headers: config.headers });
+  }
+}
@@ -0,0 +1,12 @@
+// src/utils/products.js
+
+/**
+ * Поля товара для страниц с клиентской фильтрацией по характеристикам
+ * (каталог, категория). Списки товаров по умолчанию отдаются без описания
+ * и характеристик, поэтому эти страницы запрашивают их через ?fields=.
+ */
+export const CATALOG_PRODUCT_FIELDS = [
+  'id', 'sku', 'name', 'description', 'price', 'discount', 'discounted_price',
+  'stock', 'category', 'image', 'is_available', 'specifications', 'url',
+  'average_rating', 'creation_date',
+].join(',');
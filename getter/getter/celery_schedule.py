@@ -13,6 +13,11 @@ CELERY_BEAT_SCHEDULE: Dict[str, Dict[str, Any]] = {
         'schedule': crontab(minute='0', hour='*/3'),  # Каждые 3 часа
         'options': {'expires': 3600}  # Задача истекает через 1 час
     },
+    'refresh_home_rails': {
+        'task': 'main.tasks.refresh_home_rails',
+        'schedule': crontab(minute='*/10'),  # Каждые 10 минут
+        'options': {'expires': 600}  # Задача истекает через 10 минут
+    },
     'generate_daily_sales_report': {
         'task': 'main.tasks.generate_daily_sales_report',
         'schedule': crontab(minute='0', hour='7'),  # Каждый день в 7:00
@@ -23,6 +28,11 @@ CELERY_BEAT_SCHEDULE: Dict[str, Dict[str, Any]] = {
         'schedule': crontab(minute='*/30'),  # Каждые 30 минут
         'options': {'expires': 1800}  # Задача истекает через 30 минут
     },
+    'process_order_status_events': {
+        'task': 'main.tasks.process_order_status_events',
+        'schedule': crontab(minute='*/5'),  # Каждые 5 минут
+        'options': {'expires': 300}  # Задача истекает через 5 минут
+    },
     'calculate_product_ratings': {
         'task': 'main.tasks.calculate_product_ratings',
         'schedule': crontab(minute='0', hour='3'),  # Каждый день в 3:00
@@ -145,8 +145,34 @@ if env('DATABASE_ENGINE') == 'django.db.backends.postgresql':
             'PASSWORD': env('DATABASE_PASSWORD'),
             'HOST': env('DATABASE_HOST'),
             'PORT': env('DATABASE_PORT'),
+            # Постоянные соединения: процесс переиспользует соединение между
+            # запросами (секунды, 0 - новое соединение на каждый запрос)
+            'CONN_MAX_AGE': env.int('DATABASE_CONN_MAX_AGE', default=60),
+            # Проверка переиспользуемого соединения в начале запроса
+            'CONN_HEALTH_CHECKS': True,
+            # PgBouncer в режиме transaction не сохраняет серверные курсоры
+            # между транзакциями, поэтому iterator() читает данные клиентскими курсорами
+            'DISABLE_SERVER_SIDE_CURSORS': env.bool('DATABASE_PGBOUNCER', default=False),
+            'OPTIONS': {},
         }
     }
+    # Пул соединений psycopg 3 (Django 5.1+). Воркеры Celery (CELERY_WORKER=True)
+    # выполняют задачи в одном потоке и получают отдельный, меньший пул.
+    if env.bool('DATABASE_POOL', default=False):
+        if env.bool('CELERY_WORKER', default=False):
+            pool_min_size = env.int('CELERY_DATABASE_POOL_MIN_SIZE', default=1)
+            pool_max_size = env.int('CELERY_DATABASE_POOL_MAX_SIZE', default=2)
+        else:
+            pool_min_size = env.int('DATABASE_POOL_MIN_SIZE', default=2)
+            pool_max_size = env.int('DATABASE_POOL_MAX_SIZE', default=10)
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': pool_min_size,
+            'max_size': pool_max_size,
+            'timeout': env.int('DATABASE_POOL_TIMEOUT', default=10),
+        }
+        # Соединения из пула возвращаются в пул после запроса, постоянные
+        # соединения Django с пулом несовместимы
+        DATABASES['default']['CONN_MAX_AGE'] = 0
 else:
     DATABASES = {
         'default': {
@@ -154,6 +180,26 @@ else:
                 'NAME': BASE_DIR / env('DATABASE_NAME'),
         }
     }
+    # Настроенный режим SQLite для небольших установок с параллельной записью
+    # (корзина, оформление заказов). Django выполняет init_command при открытии
+    # каждого соединения: WAL позволяет читать во время записи, busy_timeout
+    # ждет освобождения блокировки вместо ошибки "database is locked", а
+    # BEGIN IMMEDIATE берет блокировку записи в начале транзакции atomic(),
+    # поэтому транзакции с чтением и последующей записью не конфликтуют.
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': env.int('SQLITE_BUSY_TIMEOUT', default=5000),  # миллисекунды
+        'mmap_size': 128 * 1024 * 1024,
+        'cache_size': -20000,  # килобайты (отрицательное значение)
+        'temp_store': 'MEMORY',
+    }
+    SQLITE_TUNED_OPTIONS = {
+        'init_command': ';'.join(f'PRAGMA {name}={value}' for name, value in SQLITE_PRAGMAS.items()),
+        'transaction_mode': 'IMMEDIATE',
+    }
+    if env.bool('SQLITE_TUNED', default=False):
+        DATABASES['default']['OPTIONS'] = SQLITE_TUNED_OPTIONS
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -228,6 +274,35 @@ else:
     EMAIL_USE_TLS = env('EMAIL_USE_TLS', default=True)
     DEFAULT_FROM_EMAIL = env('DEFAULT_FROM_EMAIL', default='noreply@example.com')
 
+# Массовые рассылки (users.mailing): писем в одной задаче Celery и одном
+# SMTP-соединении и ограничение частоты таких задач на воркер
+BULK_EMAIL_BATCH_SIZE = env.int('BULK_EMAIL_BATCH_SIZE', default=100)
+BULK_EMAIL_RATE_LIMIT = env('BULK_EMAIL_RATE_LIMIT', default='10/m')
+
+# Период полного перестроения индекса подсказок поиска в памяти процесса (секунды)
+SUGGEST_INDEX_MAX_AGE = env.int('SUGGEST_INDEX_MAX_AGE', default=300)
+
+# Кэш Django. Без REDIS_CACHE_URL используется кэш в памяти процесса
+# (разработка и тесты); в продакшене кэш общий для всех процессов в Redis,
+# что нужно для версий моделей и блокировок пересчета (см. main.caching).
+REDIS_CACHE_URL = env('REDIS_CACHE_URL', default='')
+if REDIS_CACHE_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_CACHE_URL,
+            'KEY_PREFIX': 'getter',
+            'TIMEOUT': 300,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'KEY_PREFIX': 'getter',
+        }
+    }
+
 # Настройки Celery
 CELERY_BROKER_URL = env('CELERY_BROKER_URL', default='redis://localhost:6379/0')
 CELERY_RESULT_BACKEND = env('CELERY_RESULT_BACKEND', default='redis://localhost:6379/0')
@@ -0,0 +1,259 @@
+"""
+Сводка активности пользователя для личного кабинета.
+
+Сводка (счетчики заказов, отзывов, избранного, сумма покупок и последние
+записи) хранится в кэше Django для каждого пользователя и сбрасывается
+сигналами при записи Order, Review и Wishlist (через слой main.caching,
+с защитой от одновременного пересчета). При промахе кэша она
+вычисляется двумя запросами: счетчики - одним SELECT со скалярными
+подзапросами, последние записи всех трех типов - одним UNION ALL.
+Вместе со сводкой хранится ETag, по которому клиент получает 304.
+
+Корзина (заказ в статусе 'pending') в сводку не входит, как и в истории
+заказов: ее стоимость меняется массовыми UPDATE без сигналов.
+"""
+
+import hashlib
+from datetime import datetime, timezone as dt_timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.models import (
+    CharField, Count, DecimalField, F, IntegerField, QuerySet, Subquery, Sum, TextField, Value,
+)
+from django.db.models.functions import Cast, Coalesce
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.utils.encoders import JSONEncoder
+
+from . import caching
+from .models import Order, Review, Wishlist
+
+USER_ACTIVITY_NAMESPACE = 'main:user_activity'
+# Страховочный срок жизни: названия и цены товаров в последних записях
+# меняются без сброса кэша пользователей
+USER_ACTIVITY_TIMEOUT = 10 * 60
+RECENT_LIMIT = 5
+
+_AMOUNT = DecimalField(max_digits=12, decimal_places=2)
+
+
+def _count(queryset: QuerySet) -> Coalesce:
+    """
+    Оборачивает выборку пользователя в скалярный подзапрос COUNT.
+
+    Args:
+        queryset: QuerySet, отфильтрованный по пользователю
+
+    Returns:
+        Выражение с количеством строк (0, если строк нет)
+    """
+    return Coalesce(Subquery(
+        queryset.order_by().values('user_id').annotate(total=Count('id')).values('total'),
+        output_field=IntegerField(),
+    ), 0)
+
+
+def _counters(user_id: int) -> Dict[str, Any]:
+    """
+    Считает счетчики активности одним запросом.
+
+    Args:
+        user_id: ID пользователя
+
+    Returns:
+        Словарь со счетчиками и суммой покупок
+    """
+    orders = Order.objects.filter(user_id=user_id).exclude(status='pending')
+    spent = orders.exclude(status='canceled').order_by().values('user_id').annotate(
+        total=Sum('total_price')
+    ).values('total')
+    row = get_user_model().objects.filter(id=user_id).annotate(
+        total_orders=_count(orders),
+        total_reviews=_count(Review.objects.filter(user_id=user_id)),
+        wishlist_count=_count(Wishlist.objects.filter(user_id=user_id)),
+        total_spent=Subquery(spent, output_field=_AMOUNT),
+    ).values('total_orders', 'total_reviews', 'wishlist_count', 'total_spent').first() or {}
+    return {
+        'totalOrders': row.get('total_orders', 0),
+        'totalReviews': row.get('total_reviews', 0),
+        'wishlistCount': row.get('wishlist_count', 0),
+        'totalSpent': float(row.get('total_spent') or 0),
+    }
+
+
+def _recent_branches(user_id: int) -> List[QuerySet]:
+    """
+    Строит выборки последних заказов, отзывов и товаров из избранного
+    с одинаковым набором столбцов для объединения через UNION ALL.
+
+    Столбцы: kind, row_id, created, product_ref, title, amount, text1, text2, text3.
+
+    Args:
+        user_id: ID пользователя
+
+    Returns:
+        Список QuerySet (values_list) с LIMIT
+    """
+    null_int = Value(None, output_field=IntegerField())
+    null_text = Value(None, output_field=TextField())
+    columns = ('kind', 'row_id', 'created', 'product_ref', 'title', 'amount', 'text1', 'text2', 'text3')
+    orders = Order.objects.filter(user_id=user_id).exclude(status='pending').annotate(
+        kind=Value('order', output_field=CharField()),
+        row_id=F('id'),
+        created=F('created_at'),
+        product_ref=null_int,
+        title=Cast('order_number', TextField()),
+        amount=Cast('total_price', _AMOUNT),
+        text1=Cast('status', TextField()),
+        text2=null_text,
+        text3=null_text,
+    ).order_by('-created_at', '-id')
+    reviews = Review.objects.filter(user_id=user_id).annotate(
+        kind=Value('review', output_field=CharField()),
+        row_id=F('id'),
+        created=F('created_at'),
+        product_ref=F('product_id'),
+        title=Cast('product__name', TextField()),
+        amount=Cast('rating', _AMOUNT),
+        text1=Cast('comment', TextField()),
+        text2=Cast('pros', TextField()),
+        text3=Cast('cons', TextField()),
+    ).order_by('-created_at', '-id')
+    wishlist = Wishlist.objects.filter(user_id=user_id).annotate(
+        kind=Value('wishlist', output_field=CharField()),
+        row_id=F('id'),
+        created=F('added_at'),
+        product_ref=F('product_id'),
+        title=Cast('product__name', TextField()),
+        amount=Cast('product__price', _AMOUNT),
+        text1=null_text,
+        text2=null_text,
+        text3=null_text,
+    ).order_by('-added_at', '-id')
+    return [queryset.values_list(*columns)[:RECENT_LIMIT] for queryset in (orders, reviews, wishlist)]
+
+
+def _fetch_recent(user_id: int) -> List[Tuple]:
+    """
+    Загружает последние записи всех трех типов одним запросом.
+
+    QuerySet.union() не допускает LIMIT в ветках на SQLite, поэтому каждая
+    ветка компилируется отдельно и оборачивается в подзапрос.
+
+    Args:
+        user_id: ID пользователя
+
+    Returns:
+        Строки объединенной выборки
+    """
+    parts, params = [], []
+    for branch in _recent_branches(user_id):
+        sql, branch_params = branch.query.sql_with_params()
+        parts.append(f'SELECT * FROM ({sql}) AS recent_{len(parts)}')
+        params.extend(branch_params)
+    with connection.cursor() as cursor:
+        cursor.execute(' UNION ALL '.join(parts), params)
+        return cursor.fetchall()
+
+
+def _as_datetime(value: Any) -> Optional[datetime]:
+    """
+    Приводит значение даты из курсора к datetime (SQLite возвращает строку).
+
+    Args:
+        value: Значение столбца created
+
+    Returns:
+        Дата и время с учетом часового пояса
+    """
+    if isinstance(value, str):
+        value = parse_datetime(value)
+    if value is not None and settings.USE_TZ and timezone.is_naive(value):
+        value = timezone.make_aware(value, dt_timezone.utc)
+    return value
+
+
+def compute_user_activity(user_id: int) -> Dict[str, Any]:
+    """
+    Вычисляет сводку активности пользователя (два запроса к БД).
+
+    Args:
+        user_id: ID пользователя
+
+    Returns:
+        Словарь в формате ответа эндпоинта user_activity
+    """
+    data = _counters(user_id)
+    data.update({'recentOrders': [], 'recentReviews': [], 'wishlistItems': []})
+    rows = sorted(_fetch_recent(user_id), key=lambda row: (_as_datetime(row[2]), row[1]), reverse=True)
+    for kind, row_id, created, product_id, title, amount, text1, text2, text3 in rows:
+        created = _as_datetime(created)
+        if kind == 'order':
+            data['recentOrders'].append({
+                'id': row_id,
+                'order_number': title,
+                'total_price': float(amount),
+                'status': text1,
+                'created_at': created,
+            })
+        elif kind == 'review':
+            data['recentReviews'].append({
+                'id': row_id,
+                'product': {'id': product_id, 'name': title},
+                'rating': int(amount),
+                'comment': text1,
+                'created_at': created,
+                'pros': text2,
+                'cons': text3,
+            })
+        else:
+            data['wishlistItems'].append({
+                'id': row_id,
+                'product': {'id': product_id, 'name': title, 'price': float(amount)},
+                'added_at': created,
+            })
+    return data
+
+
+def get_user_activity(user_id: int) -> Tuple[Dict[str, Any], str]:
+    """
+    Возвращает сводку активности из кэша, вычисляя ее при промахе.
+
+    Args:
+        user_id: ID пользователя
+
+    Returns:
+        Кортеж (сводка, ETag)
+    """
+    def compute() -> Tuple[Dict[str, Any], str]:
+        data = compute_user_activity(user_id)
+        body = JSONEncoder(sort_keys=True).encode(data)
+        return data, '"%s"' % hashlib.md5(body.encode()).hexdigest()
+
+    key = caching.make_key(USER_ACTIVITY_NAMESPACE, user_id)
+    return caching.get_or_set(key, compute, USER_ACTIVITY_TIMEOUT)
+
+
+def invalidate_user_activity(user_id: Optional[int]) -> None:
+    """
+    Сбрасывает кэшированную сводку активности пользователя.
+
+    Args:
+        user_id: ID пользователя
+    """
+    if user_id is not None:
+        caching.delete(caching.make_key(USER_ACTIVITY_NAMESPACE, user_id))
+
+
+def invalidate_users_activity(user_ids: Iterable[int]) -> None:
+    """
+    Сбрасывает кэшированные сводки нескольких пользователей
+    (после массовых UPDATE, которые не отправляют сигналы).
+
+    Args:
+        user_ids: ID пользователей
+    """
+    caching.delete_many(caching.make_key(USER_ACTIVITY_NAMESPACE, user_id) for user_id in set(user_ids))
@@ -1,5 +1,6 @@
+from django import forms
 from django.contrib import admin
-from django.db.models import Sum, Avg
+from django.db.models import Sum
 from django.http import HttpResponse
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import A4
@@ -11,6 +12,8 @@ from typing import Any, List, Optional, Tuple, Union, Dict, Set
 from django.http.request import HttpRequest
 from django.db.models.query import QuerySet
 from .models import Category, Product, Order, OrderItem, Review, Wishlist
+from .order_status import MANUAL_STATUSES, transition_orders
+from .projections import admin_grid_queryset
 
 # Регистрируем шрифт DejaVuSerif
 FONT_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'static', 'fonts', 'DejaVuSerif.ttf')
@@ -27,7 +30,7 @@ class CategoryAdmin(admin.ModelAdmin):
         list_filter: Поля, по которым осуществляется фильтрация
         inlines: Встроенные формы для связанных моделей
     """
-    list_display = ('name', 'get_product_count')
+    list_display = ('name', 'get_product_count', 'products_in_stock')
     search_fields = ('name',)
     list_filter = ('name',)
     inlines = []
@@ -41,9 +44,9 @@ class CategoryAdmin(admin.ModelAdmin):
             obj: Объект категории
             
         Returns:
-            Количество продуктов в категории
+            Количество продуктов в категории (сохраненный счетчик)
         """
-        return obj.products.count()
+        return obj.products_total
 
 class ProductInline(admin.TabularInline):
     """
@@ -77,6 +80,24 @@ class ProductAdmin(admin.ModelAdmin):
     list_filter = ('category', 'price', 'discount', 'is_available')
     autocomplete_fields = ['category']
     ordering = ['name']
+    list_select_related = ('category',)
+
+    def get_queryset(self, request: HttpRequest) -> QuerySet:
+        """
+        В списке товаров загружает только столбцы list_display
+        (без описания и характеристик); формы редактирования получают все поля.
+        
+        Args:
+            request: HTTP запрос
+            
+        Returns:
+            QuerySet товаров
+        """
+        queryset = super().get_queryset(request)
+        match = getattr(request, 'resolver_match', None)
+        if match is not None and match.url_name == 'main_product_changelist':
+            return admin_grid_queryset(queryset)
+        return queryset
 
     @admin.display(description='Средний рейтинг')
     def get_average_rating(self, obj: Product) -> Union[float, str]:
@@ -89,8 +110,7 @@ class ProductAdmin(admin.ModelAdmin):
         Returns:
             Средний рейтинг продукта или строку "Нет отзывов"
         """
-        average_rating = obj.reviews.aggregate(average=Avg('rating'))['average']
-        return round(average_rating, 2) if average_rating else 'Нет отзывов'
+        return round(obj.average_rating, 2) if obj.average_rating else 'Нет отзывов'
 
 
 class OrderItemInline(admin.TabularInline):
@@ -132,6 +152,31 @@ class OrderItemInline(admin.TabularInline):
         """
         return obj.product.get_discounted_price() * obj.quantity
 
+class OrderAdminForm(forms.ModelForm):
+    """
+    Форма заказа в админке: статус существующего заказа меняется
+    только на один из MANUAL_STATUSES (см. main.order_status).
+    """
+    class Meta:
+        model = Order
+        fields = '__all__'
+
+    def clean_status(self) -> str:
+        """
+        Запрещает возвращать заказ в корзину (статус 'pending').
+        
+        Returns:
+            Новый статус заказа
+            
+        Raises:
+            ValidationError: Если заказ переводится в недопустимый статус
+        """
+        new_status = self.cleaned_data['status']
+        if self.instance.pk and new_status != self.initial.get('status') and new_status not in MANUAL_STATUSES:
+            raise forms.ValidationError('Заказ нельзя вернуть в статус "В обработке"')
+        return new_status
+
+
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
     """
@@ -148,7 +193,9 @@ class OrderAdmin(admin.ModelAdmin):
         ordering: Порядок сортировки по умолчанию
         actions: Действия для выбранных заказов
         fieldsets: Группировка полей в форме редактирования
+        form: Форма редактирования с проверкой смены статуса
     """
+    form = OrderAdminForm
     list_display = ('order_number', 'user', 'status', 'get_total_price', 'get_total_quantity', 'get_order_items_count', 'created_at')  # Заменили 'id' на 'order_number'
     list_filter = ('status',)
     date_hierarchy = 'created_at'
@@ -220,15 +267,38 @@ class OrderAdmin(admin.ModelAdmin):
         """
         return obj.get_shipping_address()
 
+    def save_model(self, request: HttpRequest, obj: Order, form: Any, change: bool) -> None:
+        """
+        Сохраняет заказ; изменение статуса выполняется через main.order_status,
+        чтобы покупатель получил уведомление, а товар отмененного заказа вернулся на склад.
+        
+        Args:
+            request: Объект запроса
+            obj: Сохраняемый заказ
+            form: Форма редактирования
+            change: True, если заказ редактируется, а не создается
+        """
+        if not change or 'status' not in form.changed_data:
+            super().save_model(request, obj, form, change)
+            return
+        new_status = obj.status
+        obj.status = form.initial['status']
+        super().save_model(request, obj, form, change)
+        transition_orders(Order.objects.filter(id=obj.id), new_status)
+        obj.status = new_status
+
     def mark_as_shipped(self, request: HttpRequest, queryset: QuerySet) -> None:
         """
         Отмечает выбранные заказы как отправленные.
+        Уведомления, возврат товара и сброс кэша выполняет задача
+        process_order_status_events (см. main.order_status).
         
         Args:
             request: Объект запроса
             queryset: QuerySet с выбранными заказами
         """
-        queryset.update(status='shipped')
+        changed = transition_orders(queryset, 'shipped')
+        self.message_user(request, f"Отмечено как отправленные: {changed}")
     mark_as_shipped.short_description = "Отметить как отправленные"
 
     def mark_as_delivered(self, request: HttpRequest, queryset: QuerySet) -> None:
@@ -239,7 +309,8 @@ class OrderAdmin(admin.ModelAdmin):
             request: Объект запроса
             queryset: QuerySet с выбранными заказами
         """
-        queryset.update(status='delivered')
+        changed = transition_orders(queryset, 'delivered')
+        self.message_user(request, f"Отмечено как доставленные: {changed}")
     mark_as_delivered.short_description = "Отметить как доставленные"
 
     def mark_as_canceled(self, request: HttpRequest, queryset: QuerySet) -> None:
@@ -250,7 +321,8 @@ class OrderAdmin(admin.ModelAdmin):
             request: Объект запроса
             queryset: QuerySet с выбранными заказами
         """
-        queryset.update(status='canceled')
+        changed = transition_orders(queryset, 'canceled')
+        self.message_user(request, f"Отмечено как отмененные: {changed}")
     mark_as_canceled.short_description = "Отметить как отмененные"
 
     def send_invoice(self, request: HttpRequest, queryset: QuerySet) -> None:
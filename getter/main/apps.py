@@ -11,3 +11,9 @@ class MainConfig(AppConfig):
     """
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'main'
+
+    def ready(self) -> None:
+        """
+        Подключает обработчики сигналов приложения.
+        """
+        from . import signals  # noqa: F401
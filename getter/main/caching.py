@@ -0,0 +1,255 @@
+"""
+Слой кэширования для чтения данных.
+
+Все модули приложения работают с кэшем через эти функции:
+
+- make_key() строит ключ в пространстве имен ('main:catalog_stats');
+  общий префикс проекта добавляет KEY_PREFIX из настроек CACHES.
+- Версии моделей (Product, Category, Review) - отметки времени
+  последнего изменения в миллисекундах. Они увеличиваются после фиксации
+  транзакции сигналами моделей и явно после массовых UPDATE. Ключ,
+  построенный versioned_key(), включает версии моделей, от которых зависит
+  значение, поэтому увеличение версии делает устаревшими сразу все такие
+  ключи без их перебора. Версии также входят в ETag ответов (main.http_cache).
+- get_or_set() защищает от одновременного пересчета (cache stampede):
+  значение пересчитывается заранее, до истечения срока жизни, одним
+  процессом под блокировкой, остальные в это время получают текущее
+  значение; при промахе процессы без блокировки ждут результата
+  пересчитывающего процесса.
+"""
+
+import time
+from typing import Any, Callable, Iterable, Optional, Type, Union
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Model
+
+# Доля срока жизни, после которой значение пересчитывается заранее
+EARLY_REFRESH_FRACTION = 0.2
+# Срок жизни блокировки пересчета (секунды): ограничивает ожидание при сбое процесса
+LOCK_TIMEOUT = 30
+# Сколько ждать значение, которое пересчитывает другой процесс (секунды)
+LOCK_WAIT = 5
+LOCK_POLL_INTERVAL = 0.05
+
+# Модели, версии которых отслеживаются (см. main.signals)
+VERSIONED_MODELS = ('main.product', 'main.category', 'main.review')
+
+ModelRef = Union[Type[Model], str]
+
+
+def make_key(namespace: str, *parts: Any) -> str:
+    """
+    Строит ключ кэша в пространстве имен.
+
+    Args:
+        namespace: Пространство имен (обычно имя приложения)
+        *parts: Части ключа
+
+    Returns:
+        Ключ вида 'namespace:part1:part2'
+    """
+    return ':'.join([namespace, *map(str, parts)])
+
+
+def _model_label(model: ModelRef) -> str:
+    """
+    Возвращает метку модели ('main.product') для класса или строки.
+
+    Args:
+        model: Класс модели или метка
+
+    Returns:
+        Метка модели в нижнем регистре
+    """
+    return model if isinstance(model, str) else model._meta.label_lower
+
+
+def _now_ms() -> int:
+    """
+    Текущее время в миллисекундах.
+
+    Returns:
+        Отметка времени
+    """
+    return int(time.time() * 1000)
+
+
+def get_model_version(model: ModelRef) -> int:
+    """
+    Возвращает текущую версию данных модели.
+    Если версии нет в кэше (кэш очищен), она начинается с текущего момента,
+    поэтому не совпадает ни с одной выданной ранее.
+
+    Args:
+        model: Класс модели или метка ('main.review')
+
+    Returns:
+        Версия (отметка времени в миллисекундах)
+    """
+    key = make_key('version', _model_label(model))
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _now_ms(), None)
+        version = cache.get(key, _now_ms())
+    return version
+
+
+def bump_model_version(model: ModelRef) -> None:
+    """
+    Увеличивает версию данных модели (не меньше текущего времени).
+
+    Args:
+        model: Класс модели или метка
+    """
+    key = make_key('version', _model_label(model))
+    cache.set(key, max(get_model_version(model) + 1, _now_ms()), None)
+
+
+def bump_model_version_on_commit(model: ModelRef) -> None:
+    """
+    Увеличивает версию модели после фиксации текущей транзакции, чтобы
+    другие процессы не сохранили старые данные под новой версией.
+
+    Args:
+        model: Класс модели или метка
+    """
+    label = _model_label(model)
+    transaction.on_commit(lambda: bump_model_version(label))
+
+
+def versioned_key(namespace: str, name: str, models: Iterable[ModelRef], *parts: Any) -> str:
+    """
+    Строит ключ, который устаревает при изменении версии любой из моделей.
+
+    Args:
+        namespace: Пространство имен
+        name: Название значения
+        models: Модели, от данных которых зависит значение
+        *parts: Дополнительные части ключа
+
+    Returns:
+        Ключ с версиями моделей
+    """
+    versions = '.'.join(str(get_model_version(model)) for model in models)
+    return make_key(namespace, name, *parts, f'v{versions}')
+
+
+def _store(key: str, value: Any, timeout: int) -> Any:
+    """
+    Сохраняет значение вместе со временем планового пересчета.
+
+    Args:
+        key: Ключ кэша
+        value: Значение
+        timeout: Срок жизни (секунды)
+
+    Returns:
+        Сохраненное значение
+    """
+    refresh_at = time.time() + timeout * (1 - EARLY_REFRESH_FRACTION)
+    cache.set(key, (value, refresh_at), timeout)
+    return value
+
+
+def set_value(key: str, value: Any, timeout: int) -> None:
+    """
+    Записывает значение в формате get_or_set (например, при фоновом обновлении).
+
+    Args:
+        key: Ключ кэша
+        value: Значение
+        timeout: Срок жизни (секунды)
+    """
+    _store(key, value, timeout)
+
+
+def get_or_set(key: str, compute: Callable[[], Any], timeout: int) -> Any:
+    """
+    Возвращает значение из кэша, при необходимости пересчитывая его
+    с защитой от одновременного пересчета.
+
+    Args:
+        key: Ключ кэша
+        compute: Функция, вычисляющая значение
+        timeout: Срок жизни значения (секунды)
+
+    Returns:
+        Значение (может быть None)
+    """
+    entry = cache.get(key)
+    if entry is not None:
+        value, refresh_at = entry
+        if time.time() < refresh_at or not cache.add(f'{key}:lock', 1, LOCK_TIMEOUT):
+            return value
+        # Пересчет заранее: остальные процессы продолжают получать текущее значение
+        try:
+            return _store(key, compute(), timeout)
+        finally:
+            cache.delete(f'{key}:lock')
+
+    if cache.add(f'{key}:lock', 1, LOCK_TIMEOUT):
+        try:
+            return _store(key, compute(), timeout)
+        finally:
+            cache.delete(f'{key}:lock')
+
+    # Значение пересчитывает другой процесс - ждем его результат
+    deadline = time.time() + LOCK_WAIT
+    while time.time() < deadline:
+        time.sleep(LOCK_POLL_INTERVAL)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry[0]
+    return compute()
+
+
+def acquire_lock(key: str, timeout: int) -> bool:
+    """
+    Захватывает блокировку в кэше (например, чтобы поставить задачу
+    в очередь один раз за интервал).
+
+    Args:
+        key: Ключ блокировки
+        timeout: Срок жизни блокировки (секунды)
+
+    Returns:
+        True, если блокировка захвачена этим вызовом
+    """
+    return cache.add(key, 1, timeout)
+
+
+def delete(key: str) -> None:
+    """
+    Удаляет значение из кэша.
+
+    Args:
+        key: Ключ кэша
+    """
+    cache.delete(key)
+
+
+def delete_many(keys: Iterable[str]) -> None:
+    """
+    Удаляет несколько значений из кэша одной операцией.
+
+    Args:
+        keys: Ключи кэша
+    """
+    cache.delete_many(list(keys))
+
+
+def get_value(key: str, default: Optional[Any] = None) -> Any:
+    """
+    Возвращает значение, записанное get_or_set или set_value, без пересчета.
+
+    Args:
+        key: Ключ кэша
+        default: Значение по умолчанию
+
+    Returns:
+        Значение или default
+    """
+    entry = cache.get(key)
+    return default if entry is None else entry[0]
@@ -0,0 +1,255 @@
+"""
+Операции с корзиной пользователя.
+
+Корзина - это заказ со статусом 'pending'. Изменение количества товара
+выполняется одним условным UPDATE по паре (заказ, товар) с F()-выражением
+(или INSERT, если позиции еще нет), а общая стоимость корзины
+пересчитывается одним UPDATE с подзапросом SUM по позициям и текущим ценам
+товаров, без загрузки позиций в Python. Поэтому число запросов не зависит
+от размера корзины, а стоимость остается верной после изменения цены или
+скидки товара.
+"""
+
+from decimal import Decimal
+from typing import Any, Dict, Optional
+
+from django.db import IntegrityError, transaction
+from django.db.models import DecimalField, ExpressionWrapper, F, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Cast, Coalesce, Round
+from django.utils import timezone
+
+from .models import Order, OrderItem, Product
+
+
+class CartError(Exception):
+    """
+    Ошибка изменения корзины.
+
+    Attributes:
+        message: Текст ошибки для ответа API
+        field: Поле запроса, к которому относится ошибка
+        not_found: True, если ошибка означает отсутствие объекта
+    """
+
+    def __init__(self, message: str, field: Optional[str] = None, not_found: bool = False):
+        super().__init__(message)
+        self.message = message
+        self.field = field
+        self.not_found = not_found
+
+    def as_response_data(self) -> Dict[str, Any]:
+        """
+        Формирует тело ответа с ошибкой.
+
+        Returns:
+            Словарь в формате ошибок сериализаторов ({поле: [ошибка]}) или {'error': ошибка}
+        """
+        if self.field:
+            return {self.field: [self.message]}
+        return {'error': self.message}
+
+
+def get_cart_id(user: Any, create: bool = False) -> Optional[int]:
+    """
+    Возвращает ID корзины пользователя.
+    Корзина у пользователя одна (ограничение one_pending_order_per_user),
+    поэтому поиск - это один запрос по частичному уникальному индексу.
+
+    Args:
+        user: Пользователь
+        create: Создать корзину, если ее нет
+
+    Returns:
+        ID корзины или None
+    """
+    cart_id = Order.objects.pending().filter(user=user).values_list('id', flat=True).first()
+    if cart_id is None and create:
+        try:
+            with transaction.atomic():
+                cart_id = Order.objects.create(user=user, status='pending').id
+        except IntegrityError:
+            # Корзину одновременно создал параллельный запрос
+            cart_id = Order.objects.pending().filter(user=user).values_list('id', flat=True).get()
+    return cart_id
+
+
+def get_cart(user: Any) -> Optional[Order]:
+    """
+    Возвращает корзину пользователя с предзагруженными позициями и товарами.
+
+    Args:
+        user: Пользователь
+
+    Returns:
+        Заказ в статусе 'pending' или None
+    """
+    return Order.objects.pending().filter(user=user).prefetch_related('items__product__category').first()
+
+
+def _cart_response(cart_id: int, product_id: int) -> Dict[str, Any]:
+    """
+    Формирует компактный ответ об измененной позиции корзины.
+
+    Args:
+        cart_id: ID корзины
+        product_id: ID товара
+
+    Returns:
+        Словарь с позицией и общей стоимостью корзины
+    """
+    row = (
+        OrderItem.objects.filter(order_id=cart_id, product_id=product_id)
+        .values('id', 'quantity', 'order__total_price')
+        .first()
+    )
+    if row is None:
+        total_price = Order.objects.filter(id=cart_id).values_list('total_price', flat=True).first()
+        return {'order_id': cart_id, 'item': None, 'total_price': float(total_price or 0)}
+    return {
+        'order_id': cart_id,
+        'item': {'id': row['id'], 'product_id': product_id, 'quantity': row['quantity']},
+        'total_price': float(row['order__total_price']),
+    }
+
+
+def _refresh_total(cart_id: int) -> None:
+    """
+    Пересчитывает общую стоимость корзины одним UPDATE с подзапросом.
+    Цена позиции считается в целых копейках и округляется половиной вверх,
+    как в Product.get_discounted_price: округление ROUND() в SQLite
+    выполняется над float, поэтому половина копейки могла бы уйти вниз.
+
+    Args:
+        cart_id: ID корзины
+    """
+    integer = IntegerField()
+    price_cents = Cast(Round(F('product__price') * Value(100)), integer)
+    # Цена со скидкой в сотых долях копейки, округленная до копеек: (x + 50) // 100
+    discounted_cents = ExpressionWrapper(
+        (price_cents * (Value(100) - F('product__discount')) + Value(50)) / Value(100), output_field=integer
+    )
+    items_total = (
+        OrderItem.objects.filter(order=OuterRef('pk')).order_by().values('order')
+        .annotate(total=Sum(ExpressionWrapper(discounted_cents * F('quantity'), output_field=integer)))
+        .values('total')
+    )
+    Order.objects.filter(id=cart_id).update(
+        total_price=ExpressionWrapper(
+            Coalesce(Subquery(items_total), Value(0)) * Value(Decimal('0.01')),
+            output_field=DecimalField(max_digits=12, decimal_places=2),
+        ),
+        updated_at=timezone.now(),
+    )
+
+
+def add_to_cart(user: Any, product_id: int, quantity: int) -> Dict[str, Any]:
+    """
+    Добавляет товар в корзину или изменяет его количество.
+
+    Отрицательное количество уменьшает позицию; итоговое количество должно
+    быть от 1 до остатка на складе.
+
+    Args:
+        user: Пользователь
+        product_id: ID товара
+        quantity: Изменение количества
+
+    Returns:
+        Компактное описание измененной позиции и стоимость корзины
+
+    Raises:
+        CartError: Если товар не найден или количество недопустимо
+    """
+    product = Product.objects.filter(id=product_id).only('stock').first()
+    if product is None:
+        raise CartError('Указанный товар не найден', field='product_id')
+
+    with transaction.atomic():
+        cart_id = get_cart_id(user, create=True)
+        if not _increment_item(cart_id, product_id, quantity, product.stock):
+            if not 1 <= quantity <= product.stock:
+                raise _quantity_error(cart_id, product_id, quantity, product.stock)
+            try:
+                with transaction.atomic():
+                    OrderItem.objects.create(order_id=cart_id, product_id=product_id, quantity=quantity)
+            except IntegrityError:
+                # Позицию создал параллельный запрос - повторяем инкремент
+                if not _increment_item(cart_id, product_id, quantity, product.stock):
+                    raise _quantity_error(cart_id, product_id, quantity, product.stock)
+
+        _refresh_total(cart_id)
+
+    return _cart_response(cart_id, product_id)
+
+
+def _increment_item(cart_id: int, product_id: int, quantity: int, stock: int) -> bool:
+    """
+    Изменяет количество существующей позиции одним условным UPDATE.
+    Условие в WHERE гарантирует, что итоговое количество останется от 1 до остатка.
+
+    Args:
+        cart_id: ID корзины
+        product_id: ID товара
+        quantity: Изменение количества
+        stock: Остаток товара на складе
+
+    Returns:
+        True, если позиция существует и была изменена
+    """
+    return OrderItem.objects.filter(
+        order_id=cart_id,
+        product_id=product_id,
+        quantity__gte=1 - quantity,
+        quantity__lte=stock - quantity,
+    ).update(quantity=F('quantity') + quantity) > 0
+
+
+def _quantity_error(cart_id: int, product_id: int, quantity: int, stock: int) -> CartError:
+    """
+    Формирует ошибку недопустимого количества товара.
+
+    Args:
+        cart_id: ID корзины
+        product_id: ID товара
+        quantity: Запрошенное изменение количества
+        stock: Остаток товара на складе
+
+    Returns:
+        Ошибка с описанием причины
+    """
+    current = (
+        OrderItem.objects.filter(order_id=cart_id, product_id=product_id)
+        .values_list('quantity', flat=True)
+        .first()
+    ) or 0
+    if current + quantity > stock:
+        return CartError(f'Недостаточно товара на складе. Доступно: {stock}', field='quantity')
+    return CartError('Убедитесь, что это значение больше либо равно 1.', field='quantity')
+
+
+def remove_from_cart(user: Any, item_id: int) -> Dict[str, Any]:
+    """
+    Удаляет позицию из корзины.
+
+    Args:
+        user: Пользователь
+        item_id: ID позиции
+
+    Returns:
+        Компактное описание корзины после удаления
+
+    Raises:
+        CartError: Если позиция не найдена в корзине пользователя
+    """
+    with transaction.atomic():
+        item = (
+            OrderItem.objects.filter(id=item_id, order__user=user, order__status='pending')
+            .only('id', 'order_id', 'product_id')
+            .first()
+        )
+        if item is None:
+            raise CartError('Позиция не найдена', not_found=True)
+        OrderItem.objects.filter(id=item.id).delete()
+        _refresh_total(item.order_id)
+
+    return _cart_response(item.order_id, item.product_id)
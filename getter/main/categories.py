@@ -0,0 +1,98 @@
+"""
+Кэшируемый список категорий со счетчиками товаров.
+
+Счетчики товаров (всего и в наличии) хранятся в строках категорий и
+пересчитываются одним UPDATE после фиксации транзакции, в которой
+изменились товары (CategoryManager.refresh_counts). Список категорий
+сериализуется в JSON один раз и хранится в кэше Django вместе с ETag под
+ключом с версиями категорий и товаров (см. main.caching), поэтому запросы
+списка не обращаются к базе данных до ближайшего изменения каталога.
+
+Ссылки на изображения в ответе абсолютные, поэтому в ключ входит адрес
+сайта, по которому пришел запрос.
+"""
+
+import hashlib
+import threading
+from typing import Any, Dict, Iterable, Optional
+
+from django.db import transaction
+from django.db.models import F
+from rest_framework.renderers import JSONRenderer
+
+from . import caching
+from .models import Category, Product
+from .serializers import CategorySerializer
+
+CATEGORY_LIST_TIMEOUT = 60 * 60  # Страховочный срок жизни, основное обновление - по версиям моделей
+
+
+def render_category_list(request: Any) -> Dict[str, Any]:
+    """
+    Сериализует список категорий со счетчиками товаров в JSON.
+
+    Args:
+        request: Объект запроса (для абсолютных ссылок на изображения)
+
+    Returns:
+        Словарь с телом ответа (bytes) и ETag
+    """
+    categories = Category.objects.annotate(
+        product_count=F('products_total'),
+        in_stock_count=F('products_in_stock'),
+    ).order_by('pk')
+    data = CategorySerializer(categories, many=True, context={'request': request}).data
+    body = JSONRenderer().render(data)
+    return {'body': body, 'etag': '"%s"' % hashlib.md5(body).hexdigest()}
+
+
+def get_category_list(request: Any) -> Dict[str, Any]:
+    """
+    Возвращает список категорий из кэша, сериализуя его при промахе.
+
+    Args:
+        request: Объект запроса
+
+    Returns:
+        Словарь с телом ответа и ETag
+    """
+    key = caching.versioned_key('main', 'categories', [Category, Product], request.build_absolute_uri('/'))
+    return caching.get_or_set(key, lambda: render_category_list(request), CATEGORY_LIST_TIMEOUT)
+
+
+_pending = threading.local()
+
+
+def schedule_counts_refresh(category_ids: Optional[Iterable[int]] = None) -> None:
+    """
+    Планирует пересчет счетчиков товаров после фиксации текущей транзакции.
+    Категории, запрошенные в одной транзакции, пересчитываются одним UPDATE
+    (первым из зарегистрированных обработчиков).
+
+    Args:
+        category_ids: ID категорий (None - все категории, например при
+            переносе товара в другую категорию)
+    """
+    if category_ids is not None:
+        category_ids = set(category_ids)
+        if not category_ids:
+            return
+    pending = getattr(_pending, 'ids', False)
+    if category_ids is None or pending is None:
+        _pending.ids = None
+    elif pending is False:
+        _pending.ids = category_ids
+    else:
+        pending.update(category_ids)
+    transaction.on_commit(_flush_pending)
+
+
+def _flush_pending() -> None:
+    """
+    Пересчитывает счетчики категорий, накопленных schedule_counts_refresh,
+    и увеличивает версию категорий: счетчики входят в данные категорий.
+    """
+    ids, _pending.ids = getattr(_pending, 'ids', False), False
+    if ids is not False:
+        Category.objects.refresh_counts(None if ids is None else sorted(ids))
+        caching.bump_model_version(Category)
@@ -0,0 +1,266 @@
+"""
+Оформление заказа из корзины.
+
+Заказ создается одним INSERT, в котором уже есть номер (см. main.order_numbers)
+и итоговая стоимость (она считается один раз по ценам товаров, загруженным
+вместе с корзиной), а позиции копируются одним bulk_create.
+
+Резервирование товара на складе выполняется условным массовым UPDATE:
+остаток уменьшается только у тех товаров, где его хватает
+(WHERE stock >= q), а доступность снимается в том же запросе, если товар
+закончился. Если обновлено меньше строк, чем позиций в заказе, транзакция
+откатывается и покупатель получает список товаров, которых не хватило.
+Условие проверяется самой базой данных при обновлении строки, поэтому
+параллельные оформления не могут продать больше, чем есть на складе.
+Заказ с зарезервированным товаром отмечается временем резервирования
+(Order.stock_reserved_at). Возврат товара при отмене заказа (restore_stock)
+выполняется так же, одним UPDATE на пакет товаров.
+"""
+
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Sequence, Set
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+
+from .categories import schedule_counts_refresh
+from .models import Order, OrderItem, Product
+from .stats import invalidate_catalog_stats
+
+# Количество товаров в одном UPDATE (ограничение числа параметров SQLite)
+RESERVE_BATCH_SIZE = 200
+
+
+class StockShortageError(Exception):
+    """
+    Ошибка резервирования: товара на складе недостаточно.
+
+    Attributes:
+        shortages: Список товаров, которых не хватает
+    """
+
+    def __init__(self, shortages: List[Dict[str, Any]]):
+        super().__init__('Недостаточно товара на складе')
+        self.shortages = shortages
+
+    def as_response_data(self) -> Dict[str, Any]:
+        """
+        Формирует тело ответа с отчетом о нехватке товара.
+
+        Returns:
+            Словарь с текстом ошибки и списком товаров по артикулам
+        """
+        return {'error': str(self), 'shortages': self.shortages}
+
+
+def _reserve_batch(quantities: Dict[int, int]) -> int:
+    """
+    Списывает остатки одного пакета товаров одним UPDATE.
+
+    Args:
+        quantities: Словарь {id товара: количество}
+
+    Returns:
+        Количество обновленных товаров
+    """
+    requested = Case(
+        *[When(id=product_id, then=Value(quantity)) for product_id, quantity in quantities.items()],
+        output_field=IntegerField(),
+    )
+    # В SET используются значения строки до обновления, поэтому stock <= q
+    # означает, что после списания товар закончится
+    return Product.objects.filter(id__in=list(quantities), stock__gte=requested).update(
+        stock=F('stock') - requested,
+        is_available=Case(When(stock__lte=requested, then=Value(False)), default=F('is_available')),
+        updated_at=timezone.now(),
+    )
+
+
+def _category_ids(product_ids: List[int]) -> Set[int]:
+    """
+    Возвращает категории товаров, счетчики которых нужно пересчитать.
+
+    Args:
+        product_ids: ID товаров
+
+    Returns:
+        Множество ID категорий
+    """
+    category_ids = set()
+    for start in range(0, len(product_ids), RESERVE_BATCH_SIZE):
+        category_ids.update(
+            Product.objects.filter(id__in=product_ids[start:start + RESERVE_BATCH_SIZE])
+            .values_list('category_id', flat=True).distinct()
+        )
+    return category_ids
+
+
+def find_shortages(quantities: Dict[int, int]) -> List[Dict[str, Any]]:
+    """
+    Составляет отчет о товарах, которых на складе меньше, чем требуется.
+
+    Args:
+        quantities: Словарь {id товара: требуемое количество}
+
+    Returns:
+        Список словарей с артикулом, названием, требуемым и доступным количеством
+    """
+    shortages = []
+    products = Product.objects.filter(id__in=list(quantities)).values('id', 'sku', 'name', 'stock')
+    found = set()
+    for product in products:
+        found.add(product['id'])
+        if product['stock'] < quantities[product['id']]:
+            shortages.append({
+                'product_id': product['id'],
+                'sku': product['sku'],
+                'name': product['name'],
+                'requested': quantities[product['id']],
+                'available': product['stock'],
+            })
+    for product_id in set(quantities) - found:
+        shortages.append({
+            'product_id': product_id,
+            'sku': None,
+            'name': None,
+            'requested': quantities[product_id],
+            'available': 0,
+        })
+    return shortages
+
+
+class CartChangedError(Exception):
+    """
+    Ошибка оформления: корзина изменилась (например, уже оформлена параллельным запросом).
+    """
+
+    def __init__(self):
+        super().__init__('Корзина изменилась, обновите страницу')
+
+
+class _ReservationFailed(Exception):
+    """
+    Внутренний сигнал для отката точки сохранения при неудачном списании.
+    """
+
+
+def reserve_stock(quantities: Dict[int, int]) -> None:
+    """
+    Резервирует товары на складе для заказа.
+
+    Списания выполняются в точке сохранения: при нехватке хотя бы одного
+    товара откатываются все пакеты, после чего строится отчет по артикулам.
+    Вызывающий код должен выполнять оформление внутри transaction.atomic,
+    чтобы резерв и создание заказа фиксировались вместе.
+
+    Args:
+        quantities: Словарь {id товара: количество}
+
+    Raises:
+        StockShortageError: Если какого-либо товара недостаточно
+    """
+    items = list(quantities.items())
+    try:
+        with transaction.atomic():
+            for start in range(0, len(items), RESERVE_BATCH_SIZE):
+                batch = dict(items[start:start + RESERVE_BATCH_SIZE])
+                if _reserve_batch(batch) != len(batch):
+                    raise _ReservationFailed
+    except _ReservationFailed:
+        raise StockShortageError(find_shortages(quantities))
+    # QuerySet.update() не отправляет сигналы, поэтому сбрасываем кэш
+    # и пересчитываем счетчики товаров в наличии категорий этих товаров явно
+    transaction.on_commit(invalidate_catalog_stats)
+    schedule_counts_refresh(_category_ids(list(quantities)))
+
+
+def restore_stock(quantities: Dict[int, int]) -> int:
+    """
+    Возвращает товары на склад (например, при отмене заказа).
+
+    Остаток каждого пакета товаров увеличивается одним UPDATE, товары,
+    которые закончились, снова становятся доступными.
+
+    Args:
+        quantities: Словарь {id товара: количество}
+
+    Returns:
+        Количество обновленных товаров
+    """
+    items = list(quantities.items())
+    restored = 0
+    for start in range(0, len(items), RESERVE_BATCH_SIZE):
+        batch = dict(items[start:start + RESERVE_BATCH_SIZE])
+        returned = Case(
+            *[When(id=product_id, then=Value(quantity)) for product_id, quantity in batch.items()],
+            output_field=IntegerField(),
+        )
+        restored += Product.objects.filter(id__in=list(batch)).update(
+            stock=F('stock') + returned,
+            is_available=Case(When(stock=0, then=Value(True)), default=F('is_available')),
+            updated_at=timezone.now(),
+        )
+    if restored:
+        transaction.on_commit(invalidate_catalog_stats)
+        schedule_counts_refresh(_category_ids(list(quantities)))
+    return restored
+
+
+def calculate_items_total(items: Sequence[OrderItem]) -> Decimal:
+    """
+    Считает стоимость позиций с учетом скидок по уже загруженным товарам.
+
+    Args:
+        items: Позиции с загруженными товарами (select_related/prefetch_related)
+
+    Returns:
+        Общая стоимость
+    """
+    return sum((item.product.get_discounted_price() * item.quantity for item in items), Decimal('0.00'))
+
+
+def create_order_from_cart(user: Any, cart: Order, cart_items: Sequence[OrderItem],
+                           shipping: Optional[Dict[str, Any]] = None) -> Order:
+    """
+    Оформляет заказ из корзины в одной транзакции.
+
+    Корзина очищается первой: если ее уже оформил параллельный запрос,
+    позиций не останется и оформление прерывается. Затем товар резервируется
+    на складе, заказ создается одним INSERT с номером и стоимостью,
+    а позиции копируются одним bulk_create.
+
+    Args:
+        user: Пользователь
+        cart: Корзина пользователя
+        cart_items: Позиции корзины с загруженными товарами
+        shipping: Поля адреса доставки (shipping_city, shipping_street, ...)
+
+    Returns:
+        Созданный заказ
+
+    Raises:
+        CartChangedError: Если корзина была изменена или оформлена параллельно
+        StockShortageError: Если товара на складе недостаточно
+    """
+    quantities = {item.product_id: item.quantity for item in cart_items}
+    with transaction.atomic():
+        deleted, _ = OrderItem.objects.filter(id__in=[item.id for item in cart_items]).delete()
+        if deleted != len(cart_items):
+            raise CartChangedError()
+        Order.objects.filter(id=cart.id).update(total_price=0)
+
+        reserve_stock(quantities)
+
+        order = Order.objects.create(
+            user=user,
+            status='assembling',
+            total_price=calculate_items_total(cart_items),
+            stock_reserved_at=timezone.now(),
+            **(shipping or {})
+        )
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product_id=item.product_id, quantity=item.quantity)
+            for item in cart_items
+        ])
+    return order
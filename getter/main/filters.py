@@ -1,16 +1,48 @@
 import django_filters
-from django.db.models import Avg, QuerySet
+from django.db.models import QuerySet
+from rest_framework.filters import BaseFilterBackend
+from rest_framework.request import Request
 from typing import Any, Dict, List, Optional, Union
 from .models import Product, Category
+from .search import get_search_backend
+
+
+class ProductSearchFilter(BaseFilterBackend):
+    """
+    Полнотекстовый поиск товаров по параметру ?search=.
+
+    Ищет по названию, артикулу, категории и описанию с учетом морфологии
+    и добавляет аннотацию search_rank, по которой пагинация сортирует
+    результаты, если явная сортировка не задана.
+    """
+    search_param = 'search'
+
+    def filter_queryset(self, request: Request, queryset: QuerySet, view: Any) -> QuerySet:
+        """
+        Фильтрует товары по поисковому запросу.
+
+        Args:
+            request: Объект запроса
+            queryset: Исходный QuerySet товаров
+            view: Представление
+
+        Returns:
+            Отфильтрованный QuerySet с аннотацией релевантности
+        """
+        query = request.query_params.get(self.search_param, '').strip()
+        if not query:
+            return queryset
+        return get_search_backend().search(queryset, query)
+
 
 class ProductFilter(django_filters.FilterSet):
     """
     Фильтр для модели Product с расширенным функционалом фильтрации.
     
     Attributes:
-        name: Фильтр по названию товара (частичное совпадение)
-        description: Фильтр по описанию товара (частичное совпадение)
-        sku: Фильтр по артикулу товара (частичное совпадение)
+        name: Полнотекстовый поиск по названию товара
+        description: Полнотекстовый поиск по описанию товара
+        sku: Поиск по артикулу товара (по префиксу)
         min_price: Фильтр по минимальной цене товара
         max_price: Фильтр по максимальной цене товара
         category: Фильтр по категории товара
@@ -21,9 +53,9 @@ class ProductFilter(django_filters.FilterSet):
         min_rating: Фильтр по минимальному рейтингу товара
         ordering: Сортировка результатов
     """
-    name = django_filters.CharFilter(lookup_expr='icontains', help_text="Поиск по названию товара")
-    description = django_filters.CharFilter(lookup_expr='icontains', help_text="Поиск по описанию товара")
-    sku = django_filters.CharFilter(lookup_expr='icontains', help_text="Поиск по артикулу")
+    name = django_filters.CharFilter(method='filter_full_text', help_text="Поиск по названию товара")
+    description = django_filters.CharFilter(method='filter_full_text', help_text="Поиск по описанию товара")
+    sku = django_filters.CharFilter(method='filter_full_text', help_text="Поиск по артикулу")
     
     min_price = django_filters.NumberFilter(field_name='price', lookup_expr='gte', help_text="Минимальная цена")
     max_price = django_filters.NumberFilter(field_name='price', lookup_expr='lte', help_text="Максимальная цена")
@@ -68,6 +100,23 @@ class ProductFilter(django_filters.FilterSet):
         help_text="Сортировка результатов. Используйте '-' для обратного порядка (например: -price)"
     )
     
+    def filter_full_text(self, queryset: QuerySet, name: str, value: str) -> QuerySet:
+        """
+        Полнотекстовый поиск по одному полю индекса.
+        
+        Args:
+            queryset: Исходный QuerySet продуктов
+            name: Название поля индекса (name, description или sku)
+            value: Поисковый запрос
+            
+        Returns:
+            Отфильтрованный QuerySet с товарами, в поле которых найдены все слова запроса
+        """
+        value = value.strip()
+        if not value:
+            return queryset
+        return get_search_backend().search(queryset, value, fields=(name,), rank=False)
+    
     def filter_has_discount(self, queryset: QuerySet, name: str, value: bool) -> QuerySet:
         """
         Фильтр по наличию скидки.
@@ -97,8 +146,8 @@ class ProductFilter(django_filters.FilterSet):
         Returns:
             Отфильтрованный QuerySet с товарами, имеющими средний рейтинг не ниже указанного
         """
-        # Аннотируем queryset средним рейтингом и фильтруем
-        return queryset.annotate(average_rating=Avg('reviews__rating')).filter(average_rating__gte=value)
+        # Средний рейтинг хранится в модели, поэтому join с отзывами не нужен
+        return queryset.filter(average_rating__gte=value)
     
     class Meta:
         model = Product
@@ -0,0 +1,106 @@
+"""
+Условные GET-запросы (ETag и Last-Modified) для чтения каталога.
+
+Валидаторы списков строятся только из версий моделей (см. main.caching) и
+адреса запроса, без запросов к базе данных, поэтому любая страница списка
+и ответ 304 одинаково дешевы. Валидаторы карточки товара вычисляются по
+значениям одной строки товара вместе с версиями связанных данных. Если
+клиент прислал совпадающий If-None-Match или If-Modified-Since,
+возвращается 304 без выборки и сериализации данных.
+"""
+
+import hashlib
+from datetime import datetime
+from typing import Any, Callable, Iterable, Optional, Tuple
+
+from django.http import HttpResponseBase
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+
+from .caching import get_model_version
+
+# Модели, версии которых входят в товары каталога помимо updated_at
+CATALOG_VERSIONS = ('main.review', 'main.category')
+# Модели, от которых зависят списки товаров
+PRODUCT_LIST_VERSIONS = ('main.product',) + CATALOG_VERSIONS
+
+
+def make_etag(*parts: Any) -> str:
+    """
+    Строит сильный ETag из значений, от которых зависит ответ.
+
+    Args:
+        *parts: Значения (версии, отметки времени, параметры запроса)
+
+    Returns:
+        ETag в кавычках
+    """
+    return '"%s"' % hashlib.md5('|'.join(map(str, parts)).encode()).hexdigest()
+
+
+def last_modified_ms(updated_at: Optional[datetime], versions: Iterable[str]) -> int:
+    """
+    Вычисляет время последнего изменения ответа в миллисекундах
+    как максимум из updated_at и версий связанных данных.
+
+    Args:
+        updated_at: Максимальное updated_at выбранных товаров
+        versions: Модели, от версий которых зависит ответ
+
+    Returns:
+        Отметка времени в миллисекундах
+    """
+    values = [get_model_version(model) for model in versions]
+    if updated_at is not None:
+        values.append(int(updated_at.timestamp() * 1000))
+    return max(values)
+
+
+def list_validators(request: Any, versions: Iterable[str] = PRODUCT_LIST_VERSIONS) -> Tuple[str, int]:
+    """
+    Вычисляет ETag и время изменения списка без запросов к базе данных.
+    Любое изменение товаров (в том числе массовыми UPDATE) увеличивает
+    версию товаров; адрес запроса отличает фильтры, страницы, сортировки
+    и набор полей.
+
+    Args:
+        request: Объект запроса
+        versions: Модели, от версий которых зависит список
+
+    Returns:
+        Кортеж (ETag, время последнего изменения в миллисекундах)
+    """
+    values = [get_model_version(model) for model in versions]
+    return make_etag(request.build_absolute_uri(), *values), max(values)
+
+
+def conditional_response(request: Any, etag: str, last_modified: int,
+                         build: Callable[[], HttpResponseBase]) -> HttpResponseBase:
+    """
+    Возвращает 304, если представление клиента актуально, иначе строит ответ.
+    В обоих случаях добавляет ETag, Last-Modified и Cache-Control: публичный
+    для анонимных запросов (ответ могут хранить CDN) и приватный для остальных;
+    клиент и CDN обязаны перепроверять ответ (no-cache).
+
+    Args:
+        request: Объект запроса
+        etag: ETag текущего представления
+        last_modified: Время последнего изменения в миллисекундах
+        build: Функция, строящая полный ответ
+
+    Returns:
+        Ответ 304 или полный ответ
+    """
+    last_modified_seconds = last_modified // 1000
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified_seconds)
+    if response is None:
+        response = build()
+    if response.status_code in (200, 304):
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified_seconds)
+        if request.user.is_authenticated:
+            patch_cache_control(response, private=True, no_cache=True)
+        else:
+            patch_cache_control(response, public=True, no_cache=True)
+        patch_vary_headers(response, ('Authorization',))
+    return response
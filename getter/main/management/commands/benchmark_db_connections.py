@@ -0,0 +1,73 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.urls import reverse
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает задержку запросов с новым соединением на каждый запрос, постоянными соединениями и пулом psycopg'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Количество запросов в каждом режиме')
+        parser.add_argument('--url', default=None, help='Адрес запроса (по умолчанию список товаров)')
+
+    def modes(self):
+        """Возвращает режимы соединений: название, CONN_MAX_AGE и параметры пула"""
+        pool = connection.settings_dict['OPTIONS'].get('pool') or {'min_size': 2, 'max_size': 4}
+        modes = [
+            ('Новое соединение на запрос', 0, None),
+            ('Постоянное соединение', 600, None),
+        ]
+        if connection.vendor == 'postgresql':
+            modes.append(('Пул psycopg', 0, pool))
+        return modes
+
+    def measure(self, client, url, count):
+        """Выполняет запросы через тестовый клиент и возвращает задержки в миллисекундах"""
+        # Тестовый клиент отправляет request_started и request_finished, поэтому
+        # соединения закрываются или возвращаются в пул так же, как в рабочем сервере
+        client.get(url)
+        timings = []
+        for _ in range(count):
+            start = time.perf_counter()
+            response = client.get(url)
+            timings.append((time.perf_counter() - start) * 1000)
+            if response.status_code != 200:
+                raise RuntimeError(f'Запрос {url} вернул {response.status_code}')
+        return timings
+
+    def handle(self, *args, **options):
+        url = options['url'] or reverse('product-list')
+        client = Client(HTTP_HOST='localhost')
+        settings_dict = connection.settings_dict
+        original = (settings_dict['CONN_MAX_AGE'], settings_dict['OPTIONS'].get('pool'))
+
+        self.stdout.write(f'База данных: {connection.vendor}, запросов в режиме: {options["requests"]}, адрес: {url}')
+        try:
+            for name, conn_max_age, pool in self.modes():
+                connection.close()
+                if connection.vendor == 'postgresql':
+                    connection.close_pool()
+                settings_dict['CONN_MAX_AGE'] = conn_max_age
+                settings_dict['OPTIONS'].pop('pool', None)
+                if pool is not None:
+                    settings_dict['OPTIONS']['pool'] = pool
+                timings = self.measure(client, url, options['requests'])
+                timings.sort()
+                self.stdout.write(
+                    f'{name}: среднее {statistics.mean(timings):.2f} мс, '
+                    f'медиана {statistics.median(timings):.2f} мс, '
+                    f'p95 {timings[int(len(timings) * 0.95) - 1]:.2f} мс'
+                )
+        finally:
+            connection.close()
+            if connection.vendor == 'postgresql':
+                connection.close_pool()
+            settings_dict['CONN_MAX_AGE'], pool = original
+            settings_dict['OPTIONS'].pop('pool', None)
+            if pool is not None:
+                settings_dict['OPTIONS']['pool'] = pool
+        self.stdout.write(self.style.SUCCESS('Готово'))
@@ -0,0 +1,88 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models.functions import Mod
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from main.models import Order
+from main.order_status import apply_time_based_transitions
+from users.models import User
+
+STATUS_CYCLE = ('shipped', 'delivered', 'assembling', 'canceled')
+BATCH_SIZE = 10000
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает смену статусов заказов по одному (Order.update_status_by_time) '
+            'и двумя UPDATE (apply_time_based_transitions). Данные создаются в транзакции и откатываются')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=1000000, help='Количество заказов')
+        parser.add_argument('--users', type=int, default=10000, help='Количество пользователей (у каждого одна корзина)')
+        parser.add_argument('--legacy-sample', type=int, default=2000,
+                            help='Сколько заказов обработать по одному для оценки прежнего способа')
+
+    def create_orders(self, orders, users):
+        """Создает пользователей и заказы; треть заказов старше сроков смены статуса"""
+        created_users = User.objects.bulk_create([
+            User(username=f'bench_orders_{index}', email=f'bench_orders_{index}@example.com', password='!')
+            for index in range(users)
+        ], batch_size=BATCH_SIZE)
+        user_ids = [user.id for user in created_users]
+        for start in range(0, orders, BATCH_SIZE):
+            Order.objects.bulk_create([
+                Order(
+                    user_id=user_ids[index % users],
+                    status='pending' if index < users else STATUS_CYCLE[index % len(STATUS_CYCLE)],
+                )
+                for index in range(start, min(start + BATCH_SIZE, orders))
+            ], batch_size=BATCH_SIZE)
+        old = timezone.now() - timedelta(days=30)
+        Order.objects.annotate(remainder=Mod('id', 3)).filter(remainder=0).update(created_at=old, updated_at=old)
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        with transaction.atomic():
+            self.create_orders(options['orders'], options['users'])
+            candidates = Order.objects.filter(status__in=['pending', 'shipped'])
+            candidates_count = candidates.count()
+            self.stdout.write(
+                f'Заказов: {options["orders"]}, в статусах pending и shipped: {candidates_count} '
+                f'(подготовка {time.perf_counter() - start:.1f} с)'
+            )
+
+            # Прежний способ на выборке: изменения откатываются до точки сохранения
+            with transaction.atomic():
+                # Последние заказы: и корзины, и отправленные заказы
+                sample = list(candidates.order_by('-id')[:options['legacy_sample']])
+                # Журнал запросов в режиме DEBUG ограничен, иначе подсчет обнулится
+                connection.queries_log.clear()
+                with CaptureQueriesContext(connection) as context:
+                    start = time.perf_counter()
+                    for order in sample:
+                        order.update_status_by_time()
+                    legacy_time = time.perf_counter() - start
+                transaction.set_rollback(True)
+            per_order = legacy_time / max(len(sample), 1)
+            self.stdout.write(
+                f'По одному: {len(sample)} заказов за {legacy_time:.2f} с, запросов {len(context.captured_queries)}; '
+                f'оценка для всех: {per_order * candidates_count:.0f} с, '
+                f'{len(context.captured_queries) / max(len(sample), 1) * candidates_count:.0f} запросов'
+            )
+
+            connection.queries_log.clear()
+            with CaptureQueriesContext(connection) as context:
+                start = time.perf_counter()
+                changed = apply_time_based_transitions()
+                bulk_time = time.perf_counter() - start
+            queries = [q for q in context.captured_queries if q['sql'].startswith('UPDATE')]
+            self.stdout.write(
+                f'Два UPDATE: отменено {len(changed["canceled"])}, доставлено {len(changed["delivered"])} '
+                f'за {bulk_time:.2f} с, запросов {len(queries)}'
+            )
+            if bulk_time:
+                self.stdout.write(self.style.SUCCESS(f'Ускорение: {per_order * candidates_count / bulk_time:.0f}x'))
+            transaction.set_rollback(True)
@@ -0,0 +1,64 @@
+import timeit
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from main.models import Category, Product
+from main.serializers import ProductListSerializer, ProductSerializer
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает скорость сериализации списка товаров ProductSerializer и ProductListSerializer'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=1000, help='Количество товаров в списке')
+        parser.add_argument('--repeat', type=int, default=5, help='Количество повторов замера')
+
+    def build_products(self, count):
+        """Создает товары в памяти (без записи в БД), распределенные по 10 категориям"""
+        now = timezone.now()
+        categories = [
+            Category(id=index, name=f'Категория {index}', image=f'category_images/{index}.png')
+            for index in range(1, 11)
+        ]
+        products = []
+        for index in range(1, count + 1):
+            product = Product(
+                id=index,
+                sku=f'BENCH{index:06d}',
+                name=f'Товар {index}',
+                description='Описание товара ' * 20,
+                price=Decimal('1999.90'),
+                discount=index % 30,
+                stock=index % 50,
+                image=f'product_images/{index}.jpg',
+                is_available=True,
+                specifications={'Цвет': 'черный', 'Вес': '1 кг', 'Гарантия': '12 мес'},
+                average_rating=4.5,
+                creation_date=now,
+            )
+            product.category = categories[index % len(categories)]
+            products.append(product)
+        return products
+
+    def handle(self, *args, **options):
+        products = self.build_products(options['count'])
+        request = Request(APIRequestFactory().get('/main/products/', HTTP_HOST='localhost'))
+        context = {'request': request}
+
+        def full():
+            return ProductSerializer(products, many=True, context=context).data
+
+        def lean():
+            return ProductListSerializer(products, many=True, context=context).data
+
+        full_time = min(timeit.repeat(full, number=1, repeat=options['repeat']))
+        lean_time = min(timeit.repeat(lean, number=1, repeat=options['repeat']))
+
+        self.stdout.write(f'Товаров: {len(products)}')
+        self.stdout.write(f'ProductSerializer:     {full_time * 1000:.1f} мс')
+        self.stdout.write(f'ProductListSerializer: {lean_time * 1000:.1f} мс')
+        self.stdout.write(self.style.SUCCESS(f'Ускорение: {full_time / lean_time:.1f}x'))
@@ -1,24 +1,18 @@
 from django.core.management.base import BaseCommand
-from main.models import Review
+from main.review_cleanup import CLEANUP_CHUNK_SIZE, INVALID_COMMENT_MARKER, delete_invalid_reviews
 
 class Command(BaseCommand):
-    help = 'Удаляет отзывы с некорректными комментариями, содержащими текст "<generator object"'
+    help = f'Удаляет отзывы с некорректными комментариями, содержащими текст "{INVALID_COMMENT_MARKER}"'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=CLEANUP_CHUNK_SIZE,
+                            help='Размер диапазона первичных ключей, удаляемого одной транзакцией')
 
     def handle(self, *args, **options):
-        # Необходимо использовать прямой SQL-запрос, так как Django ORM может не корректно искать по таким строкам
         self.stdout.write(self.style.SUCCESS('Поиск и удаление отзывов с некорректными комментариями...'))
         
-        # Сначала получим все отзывы
-        reviews = Review.objects.all()
-        
-        deleted_count = 0
-        for review in reviews:
-            # Проверяем, содержит ли комментарий некорректный текст
-            comment_str = str(review.comment)
-            if "<generator object" in comment_str:
-                review_id = review.id
-                review.delete()
-                deleted_count += 1
-                self.stdout.write(f"Удален отзыв #{review_id} с некорректным комментарием: {comment_str[:60]}...")
+        # Удаление выполняется в базе данных диапазонами первичного ключа,
+        # рейтинги затронутых товаров пересчитываются там же
+        deleted = delete_invalid_reviews(include_empty=False, chunk_size=options['chunk_size'])
         
-        self.stdout.write(self.style.SUCCESS(f'Удалено {deleted_count} отзывов с некорректными комментариями')) 
\ No newline at end of file
+        self.stdout.write(self.style.SUCCESS(f'Удалено {deleted["invalid"]} отзывов с некорректными комментариями'))
@@ -149,16 +149,17 @@ class Command(BaseCommand):
         self.stdout.write(self.style.SUCCESS('Создание тестовых заказов...'))
         
         users = User.objects.all()[:10]  # Берем первых 10 пользователей
-        products = Product.objects.filter(stock__gt=0)[:15]  # Берем первые 15 товаров в наличии
+        products = list(Product.objects.filter(stock__gt=0)[:15])  # Берем первые 15 товаров в наличии
         
         if not users or not products:
             self.stdout.write(self.style.ERROR('Недостаточно пользователей или товаров для создания заказов'))
             return
         
         # 1. Создаем заказы в статусе "pending" с разными датами
-        for i in range(3):
+        # (корзина у пользователя может быть только одна)
+        users_without_cart = [user for user in users if not Order.objects.filter(user=user, status='pending').exists()]
+        for user in random.sample(users_without_cart, min(3, len(users_without_cart))):
             # Заказ в статусе "pending" более 7 дней - должен быть отменен задачей
-            user = random.choice(users)
             order = Order.objects.create(
                 user=user,
                 status='pending',
@@ -167,8 +168,7 @@ class Command(BaseCommand):
             )
             
             # Добавляем позиции заказа
-            for _ in range(random.randint(1, 3)):
-                product = random.choice(products)
+            for product in random.sample(products, random.randint(1, min(3, len(products)))):
                 quantity = random.randint(1, 5)
                 OrderItem.objects.create(
                     order=order,
@@ -192,8 +192,7 @@ class Command(BaseCommand):
             )
             
             # Добавляем позиции заказа
-            for _ in range(random.randint(1, 3)):
-                product = random.choice(products)
+            for product in random.sample(products, random.randint(1, min(3, len(products)))):
                 quantity = random.randint(1, 5)
                 OrderItem.objects.create(
                     order=order,
@@ -218,8 +217,7 @@ class Command(BaseCommand):
                 )
                 
                 # Добавляем позиции заказа
-                for _ in range(random.randint(1, 3)):
-                    product = random.choice(products)
+                for product in random.sample(products, random.randint(1, min(3, len(products)))):
                     quantity = random.randint(1, 5)
                     OrderItem.objects.create(
                         order=order,
@@ -294,4 +292,7 @@ class Command(BaseCommand):
                     cons=lorem.sentence(),
                     created_at=timezone.now() - timedelta(days=random.randint(366, 500))  # Старше 1 года
                 )
-                self.stdout.write(f'Создан старый отзыв с комментарием от {user.username} на товар {product.name}, рейтинг: {review.rating}') 
\ No newline at end of file
+                self.stdout.write(f'Создан старый отзыв с комментарием от {user.username} на товар {product.name}, рейтинг: {review.rating}')
+        
+        # Пересчитываем сохраненные агрегаты рейтинга товаров
+        Product.objects.refresh_ratings()
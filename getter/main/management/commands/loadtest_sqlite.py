@@ -0,0 +1,100 @@
+import os
+import tempfile
+import threading
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections, transaction
+from django.db.models import F
+
+from main.models import Category, Product
+
+LOADTEST_ALIAS = 'sqlite_loadtest'
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает параллельную запись в SQLite с настройками по умолчанию и в настроенном режиме (SQLITE_TUNED)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8, help='Количество параллельных потоков')
+        parser.add_argument('--transactions', type=int, default=200, help='Количество транзакций в каждом потоке')
+        parser.add_argument('--products', type=int, default=20, help='Количество товаров')
+
+    def setup_database(self, path, options, products):
+        """Создает временную базу данных с таблицами категорий и товаров"""
+        connections.settings[LOADTEST_ALIAS] = connections.configure_settings({
+            'default': connections.settings['default'],
+            LOADTEST_ALIAS: {'ENGINE': 'django.db.backends.sqlite3', 'NAME': path, 'OPTIONS': options},
+        })[LOADTEST_ALIAS]
+        with connections[LOADTEST_ALIAS].schema_editor() as editor:
+            editor.create_model(Category)
+            editor.create_model(Product)
+        # bulk_create не отправляет сигналы, которые обращаются к основной базе данных
+        category, = Category.objects.using(LOADTEST_ALIAS).bulk_create([Category(name='Нагрузочный тест')])
+        Product.objects.using(LOADTEST_ALIAS).bulk_create([
+            Product(sku=f'LOAD{index:04d}', name=f'Товар {index}', price=Decimal('100.00'),
+                    stock=10 ** 6, category=category)
+            for index in range(products)
+        ])
+
+    def worker(self, index, options, results):
+        """Выполняет транзакции в духе оформления заказа: чтение остатка и списание"""
+        done = locked = 0
+        product_ids = results['product_ids']
+        try:
+            for number in range(options['transactions']):
+                product_id = product_ids[(index + number) % len(product_ids)]
+                try:
+                    with transaction.atomic(using=LOADTEST_ALIAS):
+                        products = Product.objects.using(LOADTEST_ALIAS)
+                        stock = products.filter(id=product_id).values_list('stock', flat=True).get()
+                        if stock > 0:
+                            products.filter(id=product_id).update(stock=F('stock') - 1)
+                    done += 1
+                except OperationalError:
+                    locked += 1
+        finally:
+            connections[LOADTEST_ALIAS].close()
+        with results['lock']:
+            results['done'] += done
+            results['locked'] += locked
+
+    def run_mode(self, options, db_options):
+        """Запускает нагрузку на новой базе данных с заданными параметрами соединения"""
+        with tempfile.TemporaryDirectory() as directory:
+            self.setup_database(os.path.join(directory, 'loadtest.sqlite3'), db_options, options['products'])
+            results = {
+                'done': 0, 'locked': 0, 'lock': threading.Lock(),
+                'product_ids': list(Product.objects.using(LOADTEST_ALIAS).values_list('id', flat=True)),
+            }
+            connections[LOADTEST_ALIAS].close()
+            threads = [
+                threading.Thread(target=self.worker, args=(index, options, results))
+                for index in range(options['threads'])
+            ]
+            start = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - start
+            del connections[LOADTEST_ALIAS]
+            del connections.settings[LOADTEST_ALIAS]
+        return results['done'], results['locked'], elapsed
+
+    def handle(self, *args, **options):
+        tuned = getattr(settings, 'SQLITE_TUNED_OPTIONS', None)
+        if tuned is None:
+            self.stderr.write('Настроенный режим доступен только для SQLite (DATABASE_ENGINE=django.db.backends.sqlite3)')
+            return
+
+        total = options['threads'] * options['transactions']
+        self.stdout.write(f'Потоков: {options["threads"]}, транзакций: {total}')
+        for name, db_options in (('По умолчанию', {}), ('SQLITE_TUNED', tuned)):
+            done, locked, elapsed = self.run_mode(options, dict(db_options))
+            self.stdout.write(
+                f'{name}: выполнено {done}, ошибок "database is locked" {locked}, '
+                f'{elapsed:.2f} с, {done / elapsed:.0f} транзакций/с'
+            )
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from main.models import Product
+from main.search import get_search_backend
+
+class Command(BaseCommand):
+    help = 'Полностью перестраивает поисковый индекс товаров'
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        self.stdout.write(self.style.SUCCESS(f'Перестроение поискового индекса ({backend.__class__.__name__})...'))
+        
+        backend.rebuild()
+        
+        self.stdout.write(self.style.SUCCESS(f'Проиндексировано товаров: {Product.objects.count()}'))
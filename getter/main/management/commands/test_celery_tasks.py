@@ -1,6 +1,7 @@
 from django.core.management.base import BaseCommand
 from main.tasks import (
     update_product_availability,
+    refresh_home_rails,
     generate_daily_sales_report,
     update_order_statuses,
     calculate_product_ratings,
@@ -35,6 +36,7 @@ class Command(BaseCommand):
             help='Имя задачи для запуска',
             choices=[
                 'update_product_availability',
+                'refresh_home_rails',
                 'generate_daily_sales_report',
                 'update_order_statuses',
                 'calculate_product_ratings',
@@ -85,6 +87,7 @@ class Command(BaseCommand):
         
         tasks = {
             'update_product_availability': update_product_availability,
+            'refresh_home_rails': refresh_home_rails,
             'generate_daily_sales_report': generate_daily_sales_report,
             'update_order_statuses': update_order_statuses,
             'calculate_product_ratings': calculate_product_ratings,
@@ -0,0 +1,68 @@
+from django.db import migrations
+from django.db.utils import OperationalError
+
+from main.stemmer import normalize_text
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE TABLE main_product_search ('
+            'product_id bigint PRIMARY KEY REFERENCES main_product (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, '
+            'document tsvector NOT NULL)'
+        )
+        schema_editor.execute('CREATE INDEX main_product_search_document_gin ON main_product_search USING GIN (document)')
+        schema_editor.execute(
+            "INSERT INTO main_product_search (product_id, document) "
+            "SELECT p.id, "
+            "setweight(to_tsvector('russian', coalesce(p.name, '')), 'A') || "
+            "setweight(to_tsvector('simple', coalesce(p.sku, '')), 'B') || "
+            "setweight(to_tsvector('russian', coalesce(c.name, '')), 'C') || "
+            "setweight(to_tsvector('russian', coalesce(p.description, '')), 'D') "
+            "FROM main_product p JOIN main_category c ON c.id = p.category_id"
+        )
+    elif connection.vendor == 'sqlite':
+        try:
+            schema_editor.execute(
+                'CREATE VIRTUAL TABLE main_product_fts USING fts5('
+                "name, sku, category, description, tokenize = 'unicode61 remove_diacritics 2')"
+            )
+        except OperationalError:
+            # SQLite собран без FTS5: поиск будет работать через icontains
+            return
+        Product = apps.get_model('main', 'Product')
+        rows = [
+            (
+                product.id,
+                normalize_text(product.name),
+                normalize_text(product.sku),
+                normalize_text(product.category.name),
+                normalize_text(product.description),
+            )
+            for product in Product.objects.select_related('category').iterator()
+        ]
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                'INSERT INTO main_product_fts (rowid, name, sku, category, description) VALUES (%s, %s, %s, %s, %s)',
+                rows,
+            )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute('DROP TABLE IF EXISTS main_product_search')
+    elif vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS main_product_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0021_product_cursor_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.1.4 on 2026-10-18 18:05
+
+from django.db import migrations
+from django.db.models import Count, Min, Sum
+
+
+def merge_duplicate_items(apps, schema_editor):
+    """
+    Объединяет повторяющиеся позиции одного товара в заказе
+    перед добавлением ограничения уникальности.
+    """
+    OrderItem = apps.get_model('main', 'OrderItem')
+    duplicates = (
+        OrderItem.objects.values('order_id', 'product_id')
+        .annotate(items=Count('id'), keep_id=Min('id'), total_quantity=Sum('quantity'))
+        .filter(items__gt=1)
+    )
+    for row in duplicates.iterator():
+        OrderItem.objects.filter(id=row['keep_id']).update(quantity=row['total_quantity'])
+        OrderItem.objects.filter(
+            order_id=row['order_id'], product_id=row['product_id']
+        ).exclude(id=row['keep_id']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0022_product_search_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_items, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='orderitem',
+            unique_together={('order', 'product')},
+        ),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 5.1.4 on 2026-10-18 18:40
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def merge_duplicate_carts(apps, schema_editor):
+    """
+    Объединяет несколько корзин (заказов в статусе 'pending') одного пользователя
+    в самую последнюю перед добавлением ограничения уникальности.
+    """
+    Order = apps.get_model('main', 'Order')
+    OrderItem = apps.get_model('main', 'OrderItem')
+    user_ids = (
+        Order.objects.filter(status='pending')
+        .order_by()
+        .values('user_id')
+        .annotate(carts=Count('id'))
+        .filter(carts__gt=1)
+        .values_list('user_id', flat=True)
+    )
+    for user_id in list(user_ids):
+        carts = list(Order.objects.filter(user_id=user_id, status='pending').order_by('-created_at', '-id'))
+        cart, duplicates = carts[0], carts[1:]
+        quantities = dict(OrderItem.objects.filter(order=cart).values_list('product_id', 'quantity'))
+        for item in OrderItem.objects.filter(order__in=duplicates):
+            quantities[item.product_id] = quantities.get(item.product_id, 0) + item.quantity
+        OrderItem.objects.filter(order__in=duplicates).delete()
+        Order.objects.filter(id__in=[duplicate.id for duplicate in duplicates]).delete()
+
+        for item in OrderItem.objects.filter(order=cart):
+            item.quantity = quantities.pop(item.product_id)
+            item.save(update_fields=['quantity'])
+        OrderItem.objects.bulk_create([
+            OrderItem(order=cart, product_id=product_id, quantity=quantity)
+            for product_id, quantity in quantities.items()
+        ])
+
+        total = Decimal('0.00')
+        for item in OrderItem.objects.filter(order=cart).select_related('product'):
+            price = item.product.price
+            if item.product.discount:
+                price = round(price - price * item.product.discount / 100, 2)
+            total += price * item.quantity
+        Order.objects.filter(id=cart.id).update(total_price=total)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0023_orderitem_unique_order_product'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_carts, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='order',
+            constraint=models.UniqueConstraint(
+                condition=models.Q(('status', 'pending')),
+                fields=('user',),
+                name='one_pending_order_per_user',
+                violation_error_message='У пользователя уже есть корзина (заказ в статусе "В обработке")',
+            ),
+        ),
+    ]
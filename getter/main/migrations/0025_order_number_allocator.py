@@ -0,0 +1,35 @@
+# Generated by Django 5.1.4 on 2026-10-18 19:20
+
+from django.db import migrations
+
+from main.order_numbers import ORDER_NUMBER_BLOCK_SIZE, ORDER_NUMBER_COUNTER_TABLE, ORDER_NUMBER_SEQUENCE
+
+
+def create_allocator(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            f'CREATE SEQUENCE {ORDER_NUMBER_SEQUENCE} START WITH 1 INCREMENT BY {ORDER_NUMBER_BLOCK_SIZE}'
+        )
+    else:
+        schema_editor.execute(
+            f'CREATE TABLE {ORDER_NUMBER_COUNTER_TABLE} (id integer PRIMARY KEY, value bigint NOT NULL)'
+        )
+        schema_editor.execute(f'INSERT INTO {ORDER_NUMBER_COUNTER_TABLE} (id, value) VALUES (1, 0)')
+
+
+def drop_allocator(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(f'DROP SEQUENCE IF EXISTS {ORDER_NUMBER_SEQUENCE}')
+    else:
+        schema_editor.execute(f'DROP TABLE IF EXISTS {ORDER_NUMBER_COUNTER_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0024_order_one_pending_order_per_user'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_allocator, drop_allocator),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.1.4 on 2026-10-18 18:02
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_counts(apps, schema_editor):
+    Category = apps.get_model('main', 'Category')
+    Product = apps.get_model('main', 'Product')
+    products = Product.objects.filter(category=OuterRef('pk')).order_by().values('category')
+    Category.objects.update(
+        products_total=Coalesce(Subquery(products.annotate(total=Count('id')).values('total')), 0),
+        products_in_stock=Coalesce(Subquery(
+            products.filter(stock__gt=0).annotate(total=Count('id')).values('total')
+        ), 0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0025_order_number_allocator'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='products_in_stock',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Товаров в наличии'),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='products_total',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество товаров'),
+        ),
+        migrations.RunPython(backfill_counts, migrations.RunPython.noop),
+    ]
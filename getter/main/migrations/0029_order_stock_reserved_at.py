@@ -0,0 +1,26 @@
+# Generated by Django 5.1.4 on 2026-10-19 10:15
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_reservations(apps, schema_editor):
+    # Товар оформленных заказов, которые еще не доставлены и не отменены, зарезервирован
+    Order = apps.get_model('main', 'Order')
+    Order.objects.filter(status__in=['assembling', 'shipped']).update(stock_reserved_at=F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0028_orderstatusevent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='stock_reserved_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Товар зарезервирован'),
+        ),
+        migrations.RunPython(backfill_reservations, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-19 11:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0029_order_stock_reserved_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderstatusevent',
+            name='comment',
+            field=models.TextField(blank=True, default='', verbose_name='Комментарий'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-19 12:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0030_orderstatusevent_comment'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='order',
+            name='order_number',
+            field=models.CharField(blank=True, max_length=32, null=True, unique=True, verbose_name='Номер заказа'),
+        ),
+    ]
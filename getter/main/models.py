@@ -1,10 +1,41 @@
 from django.db import models
+from django.db.models import Avg, Count, F, FloatField, OuterRef, Subquery, Sum
+from django.db.models.functions import Cast, Coalesce, NullIf
 from django.conf import settings
 from django.utils import timezone
 from django.urls import reverse
-from decimal import Decimal
+from decimal import ROUND_HALF_UP, Decimal
 from typing import Optional, Union, List, Dict, Any
 
+from .caching import bump_model_version_on_commit
+from .order_numbers import allocate_order_number
+
+class CategoryManager(models.Manager):
+    """
+    Менеджер для модели Category с методом обслуживания счетчиков товаров.
+    """
+
+    def refresh_counts(self, category_ids: Optional[List[int]] = None) -> int:
+        """
+        Пересчитывает сохраненные счетчики товаров одним UPDATE
+        с коррелированными подзапросами.
+        
+        Args:
+            category_ids: ID категорий для пересчета (по умолчанию все категории)
+            
+        Returns:
+            Количество обновленных строк
+        """
+        queryset = self.all() if category_ids is None else self.filter(pk__in=category_ids)
+        products = Product.objects.filter(category=OuterRef('pk')).order_by().values('category')
+        return queryset.update(
+            products_total=Coalesce(Subquery(products.annotate(total=Count('id')).values('total')), 0),
+            products_in_stock=Coalesce(Subquery(
+                products.filter(stock__gt=0).annotate(total=Count('id')).values('total')
+            ), 0),
+        )
+
+
 class Category(models.Model):
     """
     Модель категории товаров.
@@ -12,9 +43,15 @@ class Category(models.Model):
     Attributes:
         name: Название категории
         image: Изображение категории
+        products_total: Количество товаров (обновляется CategoryManager.refresh_counts)
+        products_in_stock: Количество товаров в наличии
     """
     name = models.CharField(max_length=255, unique=True, verbose_name="Категория")
     image = models.ImageField(upload_to='category_images/', blank=True, null=True, verbose_name="Изображение")
+    products_total = models.PositiveIntegerField(default=0, editable=False, verbose_name="Количество товаров")
+    products_in_stock = models.PositiveIntegerField(default=0, editable=False, verbose_name="Товаров в наличии")
+
+    objects = CategoryManager()
 
     class Meta:
         verbose_name = "Категория"
@@ -38,6 +75,78 @@ class Category(models.Model):
         """
         return reverse('category-list')
 
+class ProductManager(models.Manager):
+    """
+    Менеджер для модели Product с методами обслуживания агрегатов рейтинга.
+    """
+
+    def apply_rating_change(self, product_id: int, rating_delta: int, count_delta: int) -> int:
+        """
+        Инкрементально изменяет сохраненные агрегаты рейтинга товара одним UPDATE.
+        Версия отзывов увеличивается после фиксации транзакции: от нее зависят
+        ETag и Last-Modified ответов с рейтингом (main.http_cache).
+        
+        Args:
+            product_id: ID товара
+            rating_delta: Изменение суммы оценок
+            count_delta: Изменение количества отзывов
+            
+        Returns:
+            Количество обновленных строк
+        """
+        new_sum = F('rating_sum') + rating_delta
+        new_count = F('rating_count') + count_delta
+        bump_model_version_on_commit('main.review')
+        return self.filter(pk=product_id).update(
+            rating_sum=new_sum,
+            rating_count=new_count,
+            average_rating=Cast(new_sum, FloatField()) / NullIf(new_count, 0),
+        )
+
+    def refresh_ratings(self, product_ids: Optional[List[int]] = None) -> int:
+        """
+        Пересчитывает агрегаты рейтинга по таблице отзывов одним UPDATE
+        с коррелированными подзапросами.
+        
+        Args:
+            product_ids: ID товаров для пересчета (по умолчанию все товары)
+            
+        Returns:
+            Количество обновленных строк
+        """
+        queryset = self.all() if product_ids is None else self.filter(pk__in=product_ids)
+        return queryset.update(**_rating_subqueries())
+
+    def with_rating_drift(self) -> models.QuerySet:
+        """
+        Возвращает товары, у которых сохраненные агрегаты рейтинга
+        разошлись с фактическими отзывами.
+        
+        Returns:
+            QuerySet товаров с расхождением
+        """
+        actual = _rating_subqueries()
+        return self.annotate(
+            actual_sum=actual['rating_sum'],
+            actual_count=actual['rating_count'],
+        ).exclude(rating_sum=F('actual_sum'), rating_count=F('actual_count'))
+
+
+def _rating_subqueries() -> Dict[str, Any]:
+    """
+    Строит подзапросы фактических агрегатов рейтинга для каждого товара.
+    
+    Returns:
+        Словарь выражений для полей rating_sum, rating_count и average_rating
+    """
+    reviews = Review.objects.filter(product=OuterRef('pk')).order_by().values('product')
+    return {
+        'rating_sum': Coalesce(Subquery(reviews.annotate(total=Sum('rating')).values('total')), 0),
+        'rating_count': Coalesce(Subquery(reviews.annotate(total=Count('id')).values('total')), 0),
+        'average_rating': Subquery(reviews.annotate(avg=Avg('rating')).values('avg')),
+    }
+
+
 class Product(models.Model):
     """
     Модель товара.
@@ -57,7 +166,12 @@ class Product(models.Model):
         specifications: Характеристики товара в формате JSON
         creation_date: Дата поступления товара
         updated_at: Дата и время обновления товара
+        rating_sum: Сумма оценок всех отзывов
+        rating_count: Количество отзывов
+        average_rating: Средний рейтинг (хранится денормализованно)
     """
+    objects = ProductManager()
+
     sku = models.CharField(max_length=50, unique=True, verbose_name="Артикул")
     name = models.CharField(max_length=255, verbose_name="Название")
     description = models.TextField(blank=True, null=True, verbose_name="Описание")
@@ -72,10 +186,21 @@ class Product(models.Model):
     specifications = models.JSONField(blank=True, null=True, verbose_name="Характеристики")
     creation_date = models.DateTimeField(default=timezone.now, verbose_name="Дата поступления")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Обновлен")
+    rating_sum = models.PositiveIntegerField(default=0, editable=False, verbose_name="Сумма оценок")
+    rating_count = models.PositiveIntegerField(default=0, editable=False, verbose_name="Количество отзывов")
+    average_rating = models.FloatField(blank=True, null=True, editable=False, verbose_name="Средний рейтинг")
 
     class Meta:
         verbose_name = "Продукт"
         verbose_name_plural = "Продукты"
+        indexes = [
+            models.Index(fields=['-rating_count', '-average_rating'], name='product_popularity_idx'),
+            # Составные индексы для курсорной пагинации каталога
+            models.Index(fields=['creation_date', 'id'], name='product_creation_cursor_idx'),
+            models.Index(fields=['price', 'id'], name='product_price_cursor_idx'),
+            models.Index(fields=['name', 'id'], name='product_name_cursor_idx'),
+            models.Index(fields=['discount', 'id'], name='product_discount_cursor_idx'),
+        ]
 
     def __str__(self) -> str:
         """
@@ -86,6 +211,27 @@ class Product(models.Model):
         """
         return self.name
 
+    @classmethod
+    def from_db(cls, db: str, field_names: List[str], values: List[Any]) -> 'Product':
+        """
+        Загружает товар из базы данных и запоминает категорию и наличие
+        товара: по ним сигналы определяют, какие счетчики категорий
+        пересчитать после сохранения (см. main.signals).
+        
+        Args:
+            db: Псевдоним базы данных
+            field_names: Загруженные поля
+            values: Значения полей
+            
+        Returns:
+            Товар
+        """
+        instance = super().from_db(db, field_names, values)
+        loaded = dict(zip(field_names, values))
+        if 'category_id' in loaded and 'stock' in loaded:
+            instance._counts_state = (loaded['category_id'], loaded['stock'] > 0)
+        return instance
+
     def get_absolute_url(self) -> str:
         """
         Получение абсолютного URL для товара.
@@ -98,6 +244,8 @@ class Product(models.Model):
     def get_discounted_price(self) -> Decimal:
         """
         Возвращает цену товара с учетом скидки.
+        Цена округляется до копеек половиной вверх, как в SQL-выражении
+        стоимости корзины (main.cart).
         
         Returns:
             Цена товара со скидкой
@@ -105,7 +253,7 @@ class Product(models.Model):
         if self.discount == 0:
             return self.price
         discount_amount = (self.price * self.discount) / 100
-        return round(self.price - discount_amount, 2)
+        return (self.price - discount_amount).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
 
 class OrderManager(models.Manager):
     """
@@ -143,6 +291,7 @@ class Order(models.Model):
         created_at: Дата создания заказа
         updated_at: Дата обновления заказа
         order_number: Уникальный номер заказа
+        stock_reserved_at: Время резервирования товара на складе (None, если товар не зарезервирован)
         shipping_city: Город доставки
         shipping_street: Улица доставки
         shipping_house: Дом доставки
@@ -151,6 +300,11 @@ class Order(models.Model):
         shipping_comment: Комментарий к доставке
     """
     objects = OrderManager()
+    # Сроки автоматической смены статуса (дней): корзина отменяется, если
+    # создана более PENDING_EXPIRY_DAYS дней назад, отправленный заказ
+    # считается доставленным через SHIPPED_DELIVERY_DAYS дней после отправки
+    PENDING_EXPIRY_DAYS = 7
+    SHIPPED_DELIVERY_DAYS = 3
     STATUS_CHOICES = [
         ('pending', 'В обработке'),
         ('assembling', 'В сборке'),
@@ -165,7 +319,11 @@ class Order(models.Model):
     total_price = models.DecimalField(max_digits=10, decimal_places=2, default=0, verbose_name="Общая стоимость")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Создан")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Обновлен")
-    order_number = models.CharField(max_length=20, unique=True, blank=True, null=True, verbose_name="Номер заказа")  
+    # Длина с запасом: порядковая часть номера не ограничена 8 цифрами (см. main.order_numbers)
+    order_number = models.CharField(max_length=32, unique=True, blank=True, null=True, verbose_name="Номер заказа")
+    # Товар резервируется при оформлении (main.checkout) и возвращается на склад
+    # при отмене заказа, после чего отметка снимается
+    stock_reserved_at = models.DateTimeField(blank=True, null=True, editable=False, verbose_name="Товар зарезервирован")
     
     # Поля информации о доставке
     shipping_city = models.CharField(max_length=100, blank=True, null=True, verbose_name="Город")
@@ -179,6 +337,20 @@ class Order(models.Model):
         ordering = ['-created_at']
         verbose_name = "Заказ"
         verbose_name_plural = "Заказы"
+        constraints = [
+            # Корзина (заказ в статусе 'pending') у пользователя может быть только одна
+            models.UniqueConstraint(
+                fields=['user'],
+                condition=models.Q(status='pending'),
+                name='one_pending_order_per_user',
+                violation_error_message='У пользователя уже есть корзина (заказ в статусе "В обработке")',
+            ),
+        ]
+        indexes = [
+            # Выборки автоматической смены статуса (main.order_status)
+            models.Index(fields=['status', 'created_at'], name='order_status_created_idx'),
+            models.Index(fields=['status', 'updated_at'], name='order_status_updated_idx'),
+        ]
 
     def calculate_total_price(self) -> Decimal:
         """
@@ -196,7 +368,7 @@ class Order(models.Model):
 
     def save(self, *args: Any, **kwargs: Any) -> None:
         """
-        Переопределенный метод сохранения для автоматической генерации номера заказа
+        Переопределенный метод сохранения для автоматического присвоения номера заказа
         и обновления общей стоимости.
         
         Args:
@@ -204,12 +376,10 @@ class Order(models.Model):
             **kwargs: Именованные аргументы для метода save родительского класса
         """
         is_new = self.pk is None
-        super().save(*args, **kwargs)  # Сначала сохраняем объект, чтобы получить ID
-        
-        # Генерация номера заказа только для новых объектов
+        # Номер выдается до INSERT, чтобы не делать отдельный UPDATE
         if is_new and not self.order_number:
-            self.order_number = f"ORDER{self.id:05d}"
-            super().save(update_fields=['order_number'])  # Сохраняем только поле order_number
+            self.order_number = allocate_order_number()
+        super().save(*args, **kwargs)
             
         # Обновляем total_price только если объект уже существует и имеет товары
         if not is_new:
@@ -240,7 +410,7 @@ class Order(models.Model):
         """
         Обновляет статус заказа на основе времени.
         
-        Правила:
+        Правила (для всех заказов сразу см. main.order_status.apply_time_based_transitions):
         - Если заказ в статусе 'pending' более 7 дней, отменяем его
         - Если заказ в статусе 'shipped' более 3 дней, помечаем как доставленный
         
@@ -256,7 +426,7 @@ class Order(models.Model):
         # Отменяем заказы, которые в обработке более 7 дней
         if self.status == 'pending':
             days_pending = (now - self.created_at).days
-            if days_pending > 7:
+            if days_pending > self.PENDING_EXPIRY_DAYS:
                 self.status = 'canceled'
                 status_changed = True
         
@@ -265,7 +435,7 @@ class Order(models.Model):
             # Проверяем, когда заказ был отмечен как отправленный
             # Используем updated_at как приблизительное время отправки
             days_shipped = (now - self.updated_at).days
-            if days_shipped > 3:
+            if days_shipped > self.SHIPPED_DELIVERY_DAYS:
                 self.status = 'delivered'
                 status_changed = True
         
@@ -309,6 +479,7 @@ class OrderItem(models.Model):
     quantity = models.PositiveIntegerField(verbose_name="Количество")
 
     class Meta:
+        unique_together = ('order', 'product')
         verbose_name = "Позиция заказа"
         verbose_name_plural = "Позиции заказов"
         
@@ -334,6 +505,50 @@ class OrderItem(models.Model):
         return f"{self.product.name} x {self.quantity} в заказе №{self.order.id}"
 
 
+class OrderStatusEvent(models.Model):
+    """
+    Событие смены статуса заказа (таблица исходящих событий).
+    
+    Записывается в той же транзакции, что и смена статуса
+    (см. main.order_status), и обрабатывается задачей
+    process_order_status_events: уведомления, возврат товара на склад, сброс кэша.
+    
+    Attributes:
+        order: Заказ
+        old_status: Статус до изменения
+        new_status: Новый статус
+        comment: Комментарий для уведомления покупателя
+        created_at: Дата изменения статуса
+        processed_at: Дата обработки события (None, пока событие не обработано)
+    """
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name="status_events", verbose_name="Заказ")
+    old_status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES, verbose_name="Прежний статус")
+    new_status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES, verbose_name="Новый статус")
+    comment = models.TextField(blank=True, default='', verbose_name="Комментарий")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Создано")
+    processed_at = models.DateTimeField(blank=True, null=True, verbose_name="Обработано")
+
+    class Meta:
+        verbose_name = "Смена статуса заказа"
+        verbose_name_plural = "Смены статусов заказов"
+        indexes = [
+            # Очередь необработанных событий: частичный индекс остается небольшим
+            models.Index(
+                fields=['id'],
+                condition=models.Q(processed_at__isnull=True),
+                name='order_event_unprocessed_idx',
+            ),
+        ]
+
+    def __str__(self) -> str:
+        """
+        Строковое представление события.
+        
+        Returns:
+            Строка с номером заказа и сменой статуса
+        """
+        return f"Заказ #{self.order_id}: {self.old_status} -> {self.new_status}"
+
 class Review(models.Model):
     """
     Модель отзыва на товар.
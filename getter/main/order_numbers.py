@@ -0,0 +1,100 @@
+"""
+Выдача номеров заказов.
+
+Номер выдается до INSERT заказа, поэтому заказ записывается одним запросом,
+а номера гарантированно уникальны без повторных попыток:
+
+- PostgreSQL: последовательность main_order_number_seq с шагом
+  ORDER_NUMBER_BLOCK_SIZE. Каждый процесс получает через nextval() блок
+  номеров и выдает их из памяти; nextval() не откатывается вместе
+  с транзакцией, поэтому разные процессы никогда не получают один блок.
+- SQLite: счетчик в таблице main_order_number_counter, увеличиваемый внутри
+  транзакции заказа (SQLite допускает только одного пишущего, поэтому
+  блоки в памяти не нужны).
+
+Формат номера: ORD-ГГММДД-NNNNNNNN, где дата - день выдачи номера, а
+порядковая часть дополняется нулями до 8 цифр и после 10^8 становится
+длиннее (поле Order.order_number допускает до 32 символов).
+"""
+
+import os
+import threading
+from typing import Optional
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+# Размер блока номеров, резервируемого процессом за одно обращение к БД.
+# Совпадает с INCREMENT BY последовательности (изменение требует миграции).
+ORDER_NUMBER_BLOCK_SIZE = 20
+ORDER_NUMBER_SEQUENCE = 'main_order_number_seq'
+ORDER_NUMBER_COUNTER_TABLE = 'main_order_number_counter'
+
+
+class _BlockAllocator:
+    """
+    Выдает номера из зарезервированного в PostgreSQL блока.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid: Optional[int] = None
+        self._next = 0
+        self._end = 0
+
+    def allocate(self) -> int:
+        """
+        Возвращает следующий номер, при необходимости резервируя новый блок.
+
+        Returns:
+            Порядковый номер заказа
+        """
+        with self._lock:
+            # После fork() дочерний процесс не должен выдавать номера из блока родителя
+            if self._pid != os.getpid() or self._next >= self._end:
+                with connection.cursor() as cursor:
+                    cursor.execute('SELECT nextval(%s)', [ORDER_NUMBER_SEQUENCE])
+                    start = cursor.fetchone()[0]
+                self._pid = os.getpid()
+                self._next, self._end = start, start + ORDER_NUMBER_BLOCK_SIZE
+            value = self._next
+            self._next += 1
+            return value
+
+
+_block_allocator = _BlockAllocator()
+
+
+def _next_counter_value() -> int:
+    """
+    Увеличивает счетчик номеров в таблице и возвращает новое значение.
+
+    Returns:
+        Порядковый номер заказа
+    """
+    update = f'UPDATE {ORDER_NUMBER_COUNTER_TABLE} SET value = value + 1 WHERE id = 1'
+    # Флаг can_return_columns_from_insert относится только к INSERT (MariaDB
+    # поддерживает INSERT ... RETURNING, но не UPDATE), поэтому проверяется
+    # версия SQLite: начиная с 3.35 один запрос вместо двух
+    if connection.vendor == 'sqlite' and connection.Database.sqlite_version_info >= (3, 35):
+        with connection.cursor() as cursor:
+            cursor.execute(f'{update} RETURNING value')
+            return cursor.fetchone()[0]
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(update)
+        cursor.execute(f'SELECT value FROM {ORDER_NUMBER_COUNTER_TABLE} WHERE id = 1')
+        return cursor.fetchone()[0]
+
+
+def allocate_order_number() -> str:
+    """
+    Выдает уникальный номер для нового заказа.
+
+    Returns:
+        Номер заказа вида ORD-ГГММДД-NNNNNNNN
+    """
+    if connection.vendor == 'postgresql':
+        value = _block_allocator.allocate()
+    else:
+        value = _next_counter_value()
+    return f"ORD-{timezone.localdate():%y%m%d}-{value:08d}"
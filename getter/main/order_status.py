@@ -0,0 +1,322 @@
+"""
+Смена статусов заказов.
+
+Автоматическая смена статусов по времени.
+
+Периодическая задача update_order_statuses отменяет старые корзины
+(заказы 'pending', созданные более Order.PENDING_EXPIRY_DAYS дней назад)
+и помечает доставленными заказы 'shipped', отправленные более
+Order.SHIPPED_DELIVERY_DAYS дней назад. Каждый переход выполняется одним
+UPDATE по индексу (status, created_at) или (status, updated_at), который
+возвращает ID и пользователей измененных заказов (UPDATE ... RETURNING),
+поэтому число запросов не зависит от количества заказов.
+
+Смена статусов из админки и API (transition_orders) выполняется UPDATE
+по пакетам ID.
+
+И при автоматических, и при ручных переходах в той же транзакции каждый
+переход записывается в таблицу исходящих событий OrderStatusEvent. Исключение -
+отмена брошенных корзин: покупатель их не оформлял, поэтому событие
+(и письмо об отмене) не создается.
+После фиксации задача process_order_status_events обрабатывает события
+пакетами: возвращает на склад товар отмененных заказов, для которых он был
+зарезервирован при оформлении (Order.stock_reserved_at), ставит в очередь
+уведомления покупателям и сбрасывает кэш (массовый UPDATE не вызывает
+Order.save() и сигналы). Возврат товара, снятие отметки резервирования и
+отметка об обработке события выполняются в одной транзакции, поэтому товар
+не возвращается дважды: ни при повторном запуске задачи, ни при повторной
+отмене заказа.
+"""
+
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from django.db import connection, transaction
+from django.db.models import QuerySet, Sum
+from django.utils import timezone
+
+from users.mailing import iter_batches
+from users.tasks import enqueue_on_commit, send_order_status_batch
+
+from .activity import invalidate_users_activity
+from .checkout import restore_stock
+from .models import Order, OrderItem, OrderStatusEvent
+
+# Автоматические переходы: новый статус -> (исходный статус, поле времени, срок в днях,
+# записывать ли событие смены статуса). Брошенная корзина не оформлялась: товар
+# не резервировался, а письмо об отмене заказа покупателю не нужно
+TIME_BASED_TRANSITIONS = {
+    'canceled': ('pending', 'created_at', Order.PENDING_EXPIRY_DAYS, False),
+    'delivered': ('shipped', 'updated_at', Order.SHIPPED_DELIVERY_DAYS, True),
+}
+# Статусы, в которые заказ переводится вручную (админка, API). 'pending' - корзина:
+# возврат заказа в нее нарушил бы ограничение one_pending_order_per_user
+MANUAL_STATUSES = tuple(status for status, _ in Order.STATUS_CHOICES if status != 'pending')
+# Количество заказов в одном UPDATE (ограничение числа параметров SQLite)
+TRANSITION_BATCH_SIZE = 500
+# Количество событий, обрабатываемых одной транзакцией
+EVENT_BATCH_SIZE = 500
+
+
+def _cutoff(now: datetime, days: int) -> datetime:
+    """
+    Вычисляет границу времени для перехода.
+    Order.update_status_by_time сравнивает целое число прошедших дней
+    (timedelta.days > days), то есть прошло не меньше days + 1 суток.
+
+    Args:
+        now: Текущее время
+        days: Срок в днях
+
+    Returns:
+        Время, не позже которого должен быть заказ
+    """
+    return now - timedelta(days=days + 1)
+
+
+def _supports_update_returning() -> bool:
+    """
+    Проверяет поддержку UPDATE ... RETURNING текущей базой данных.
+    Флаг can_return_columns_from_insert относится только к INSERT
+    (например, MariaDB поддерживает INSERT ... RETURNING, но не UPDATE),
+    поэтому поддержка определяется по типу базы данных.
+
+    Returns:
+        True для PostgreSQL и SQLite 3.35+
+    """
+    if connection.vendor == 'postgresql':
+        return True
+    return connection.vendor == 'sqlite' and connection.Database.sqlite_version_info >= (3, 35)
+
+
+def _bulk_transition(from_status: str, to_status: str, time_field: str,
+                     cutoff: datetime, now: datetime) -> List[Tuple[int, int]]:
+    """
+    Переводит заказы в новый статус одним UPDATE.
+
+    Args:
+        from_status: Исходный статус
+        to_status: Новый статус
+        time_field: Поле времени, по которому отбираются заказы
+        cutoff: Граница времени
+        now: Время изменения (updated_at)
+
+    Returns:
+        Список пар (ID заказа, ID пользователя)
+    """
+    meta = Order._meta
+    quote = connection.ops.quote_name
+    column = {name: quote(meta.get_field(name).column) for name in ('id', 'user', 'status', 'updated_at', time_field)}
+    update = (
+        f'UPDATE {quote(meta.db_table)} SET {column["status"]} = %s, {column["updated_at"]} = %s '
+        f'WHERE {column["status"]} = %s AND {column[time_field]} <= %s'
+    )
+    params = [
+        to_status, connection.ops.adapt_datetimefield_value(now),
+        from_status, connection.ops.adapt_datetimefield_value(cutoff),
+    ]
+    if _supports_update_returning():
+        with connection.cursor() as cursor:
+            cursor.execute(f'{update} RETURNING {column["id"]}, {column["user"]}', params)
+            return cursor.fetchall()
+    # Без RETURNING: выборка под блокировкой и UPDATE по тем же условиям
+    expired = Order.objects.filter(status=from_status, **{f'{time_field}__lte': cutoff})
+    rows = list(expired.select_for_update().values_list('id', 'user_id'))
+    expired.update(status=to_status, updated_at=now)
+    return rows
+
+
+def apply_time_based_transitions(now: Optional[datetime] = None) -> Dict[str, List[int]]:
+    """
+    Выполняет все автоматические переходы статусов заказов.
+
+    Args:
+        now: Текущее время (по умолчанию timezone.now())
+
+    Returns:
+        Словарь: новый статус -> список ID измененных заказов
+    """
+    now = now or timezone.now()
+    changed = {}
+    with transaction.atomic():
+        for to_status, (from_status, time_field, days, record_event) in TIME_BASED_TRANSITIONS.items():
+            rows = _bulk_transition(from_status, to_status, time_field, _cutoff(now, days), now)
+            changed[to_status] = [order_id for order_id, _ in rows]
+            if record_event:
+                _record_events([(order_id, from_status) for order_id, _ in rows], to_status)
+            elif rows:
+                # Без события кэш активности сбрасывается здесь, а не обработчиком событий
+                user_ids = {user_id for _, user_id in rows}
+                transaction.on_commit(lambda user_ids=user_ids: invalidate_users_activity(user_ids))
+    return changed
+
+
+def _record_events(rows: List[Tuple[int, str]], new_status: str, comment: str = '') -> Optional[str]:
+    """
+    Записывает события смены статуса и ставит их обработку в очередь
+    после фиксации транзакции.
+
+    Args:
+        rows: Список пар (ID заказа, прежний статус)
+        new_status: Новый статус
+        comment: Комментарий для уведомления покупателя
+
+    Returns:
+        ID задачи process_order_status_events или None, если событий нет
+    """
+    if not rows:
+        return None
+    OrderStatusEvent.objects.bulk_create([
+        OrderStatusEvent(order_id=order_id, old_status=old_status, new_status=new_status, comment=comment)
+        for order_id, old_status in rows
+    ], batch_size=TRANSITION_BATCH_SIZE)
+    # Импорт здесь: main.tasks импортирует этот модуль
+    from .tasks import process_order_status_events
+    return enqueue_on_commit(process_order_status_events)
+
+
+def _transition(queryset: QuerySet, new_status: str, comment: str) -> Tuple[int, Optional[str]]:
+    """
+    Переводит заказы в новый статус и записывает события смены статуса.
+
+    Args:
+        queryset: Заказы
+        new_status: Новый статус
+        comment: Комментарий для уведомления покупателя
+
+    Returns:
+        Пара (количество заказов, у которых изменился статус,
+        ID задачи обработки событий или None)
+
+    Raises:
+        ValueError: Если статус неизвестен или не входит в MANUAL_STATUSES
+    """
+    if new_status not in MANUAL_STATUSES:
+        raise ValueError(f'Недопустимый статус заказа: {new_status}')
+    now = timezone.now()
+    with transaction.atomic():
+        # Выборка по ID: QuerySet админки может содержать JOIN и DISTINCT
+        rows = list(
+            Order.objects.filter(id__in=queryset.values('id')).exclude(status=new_status)
+            .select_for_update().order_by('id').values_list('id', 'status')
+        )
+        for start in range(0, len(rows), TRANSITION_BATCH_SIZE):
+            batch = rows[start:start + TRANSITION_BATCH_SIZE]
+            Order.objects.filter(id__in=[order_id for order_id, _ in batch]).update(
+                status=new_status, updated_at=now,
+            )
+        task_id = _record_events(rows, new_status, comment or '')
+    return len(rows), task_id
+
+
+def transition_orders(queryset: QuerySet, new_status: str, comment: str = '') -> int:
+    """
+    Переводит заказы в новый статус и записывает события смены статуса.
+    Все изменения статуса (админка, API, автоматические переходы)
+    выполняются через этот модуль.
+
+    Args:
+        queryset: Заказы (например, выбранные в админке)
+        new_status: Новый статус
+        comment: Комментарий для уведомления покупателя
+
+    Returns:
+        Количество заказов, у которых изменился статус
+
+    Raises:
+        ValueError: Если статус неизвестен или не входит в MANUAL_STATUSES
+    """
+    changed, _ = _transition(queryset, new_status, comment)
+    return changed
+
+
+def transition_order(order_id: int, new_status: str, comment: str = '') -> Optional[str]:
+    """
+    Переводит один заказ в новый статус (API уведомлений о статусе).
+
+    Args:
+        order_id: ID заказа
+        new_status: Новый статус
+        comment: Комментарий для уведомления покупателя
+
+    Returns:
+        ID задачи обработки события смены статуса или None,
+        если статус не изменился
+
+    Raises:
+        ValueError: Если статус неизвестен или не входит в MANUAL_STATUSES
+    """
+    _, task_id = _transition(Order.objects.filter(id=order_id), new_status, comment)
+    return task_id
+
+
+def _process_event_batch(batch_size: int) -> Dict[str, int]:
+    """
+    Обрабатывает один пакет необработанных событий смены статуса.
+
+    Args:
+        batch_size: Максимальное количество событий в пакете
+
+    Returns:
+        Словарь с количеством обработанных событий, заказов с возвратом
+        товара и уведомлений
+    """
+    with transaction.atomic():
+        # Параллельные обработчики пропускают события, заблокированные другими
+        events = list(
+            OrderStatusEvent.objects.filter(processed_at__isnull=True)
+            .select_for_update(skip_locked=True, of=('self',)).order_by('id')
+            .values('id', 'order_id', 'new_status', 'comment',
+                    'order__user_id', 'order__user__email', 'order__order_number')[:batch_size]
+        )
+        if not events:
+            return {'events': 0, 'restocked_orders': 0, 'notifications': 0}
+
+        # Товар возвращается только по заказам, для которых он был зарезервирован
+        # при оформлении; отметка снимается, поэтому повторная отмена его не вернет
+        canceled = Order.objects.filter(
+            id__in={event['order_id'] for event in events if event['new_status'] == 'canceled'},
+            status='canceled', stock_reserved_at__isnull=False,
+        )
+        canceled_ids = list(canceled.select_for_update().values_list('id', flat=True))
+        if canceled_ids:
+            quantities = dict(
+                OrderItem.objects.filter(order_id__in=canceled_ids).order_by()
+                .values('product_id').annotate(total=Sum('quantity')).values_list('product_id', 'total')
+            )
+            restore_stock(quantities)
+            Order.objects.filter(id__in=canceled_ids).update(stock_reserved_at=None)
+
+        OrderStatusEvent.objects.filter(id__in=[event['id'] for event in events]).update(processed_at=timezone.now())
+
+        notifications = [
+            [event['order__user__email'], event['order__order_number'], event['new_status'], event['comment']]
+            for event in events if event['order__user__email']
+        ]
+        for batch in iter_batches(notifications):
+            enqueue_on_commit(send_order_status_batch, batch)
+
+        user_ids = {event['order__user_id'] for event in events}
+        transaction.on_commit(lambda: invalidate_users_activity(user_ids))
+    return {'events': len(events), 'restocked_orders': len(canceled_ids), 'notifications': len(notifications)}
+
+
+def process_status_events(batch_size: Optional[int] = None) -> Dict[str, int]:
+    """
+    Обрабатывает все необработанные события смены статуса пакетами.
+
+    Args:
+        batch_size: Размер пакета (по умолчанию EVENT_BATCH_SIZE)
+
+    Returns:
+        Словарь с количеством обработанных событий ('events'), заказов
+        с возвратом товара ('restocked_orders') и уведомлений ('notifications')
+    """
+    batch_size = batch_size or EVENT_BATCH_SIZE
+    processed = {'events': 0, 'restocked_orders': 0, 'notifications': 0}
+    while True:
+        batch = _process_event_batch(batch_size)
+        for key, value in batch.items():
+            processed[key] += value
+        if batch['events'] < batch_size:
+            return processed
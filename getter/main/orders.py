@@ -0,0 +1,158 @@
+"""
+Выборка и сериализация истории заказов.
+
+Позиции заказов загружаются одним дополнительным запросом через Prefetch
+с select_related('product'), заказы группируются по статусу из той же
+выборки, а полный список заказов магазина для администратора отдается
+потоком, без накопления всего ответа в памяти.
+"""
+
+import json
+from typing import Any, Dict, Iterable, Iterator, List
+
+from django.db.models import Count, Prefetch, Q, QuerySet, Sum
+from rest_framework.utils.encoders import JSONEncoder
+
+from .models import Order, OrderItem
+
+# Группы статусов в ответе: ключ ответа -> статусы заказов
+STATUS_GROUPS = {
+    'pending_orders': ('assembling',),
+    'completed_orders': ('shipped', 'delivered'),
+    'canceled_orders': ('canceled',),
+}
+
+# Размер пакета при потоковой выдаче заказов
+STREAM_CHUNK_SIZE = 200
+
+
+def with_items(queryset: QuerySet) -> QuerySet:
+    """
+    Добавляет к выборке заказов предзагрузку позиций с товарами.
+
+    Args:
+        queryset: QuerySet заказов
+
+    Returns:
+        QuerySet с Prefetch позиций
+    """
+    items = OrderItem.objects.select_related('product').only(
+        'id', 'order_id', 'quantity', 'product__id', 'product__name', 'product__price', 'product__image'
+    ).order_by('id')
+    return queryset.prefetch_related(Prefetch('items', queryset=items))
+
+
+def serialize_order(order: Order, include_user: bool = False) -> Dict[str, Any]:
+    """
+    Преобразует заказ с предзагруженными позициями в словарь для ответа API.
+
+    Args:
+        order: Заказ (позиции загружены через with_items)
+        include_user: Добавить данные покупателя (для администратора)
+
+    Returns:
+        Словарь с данными заказа
+    """
+    items = []
+    for item in order.items.all():
+        product = item.product
+        image = product.image.url if product.image else None
+        items.append({
+            'id': item.id,
+            'name': product.name,
+            'price': float(product.price),
+            'quantity': item.quantity,
+            'image': image,
+            'product_id': product.id,
+            'product': {
+                'id': product.id,
+                'name': product.name,
+                'price': float(product.price),
+                'image': image,
+            }
+        })
+    data = {
+        'id': order.id,
+        'order_number': order.order_number,
+        'created_at': order.created_at,
+        'status': order.status,
+        'total_price': float(order.total_price),
+        'items': items,
+        'shipping_address': order.get_shipping_address(),
+        'shipping_city': order.shipping_city,
+        'shipping_street': order.shipping_street,
+        'shipping_house': order.shipping_house,
+        'shipping_apartment': order.shipping_apartment,
+        'shipping_postal_code': order.shipping_postal_code,
+        'shipping_comment': order.shipping_comment
+    }
+    if include_user:
+        data['user_id'] = order.user_id
+        data['user_username'] = order.user.username
+        data['user_email'] = order.user.email
+    return data
+
+
+def group_by_status(orders: Iterable[Dict[str, Any]]) -> Dict[str, List[int]]:
+    """
+    Группирует уже сериализованные заказы по статусу.
+
+    Args:
+        orders: Сериализованные заказы
+
+    Returns:
+        Словарь {группа: [id заказов]}
+    """
+    groups = {group: [] for group in STATUS_GROUPS}
+    for order in orders:
+        for group, statuses in STATUS_GROUPS.items():
+            if order['status'] in statuses:
+                groups[group].append(order['id'])
+    return groups
+
+
+def order_summary(queryset: QuerySet) -> Dict[str, Any]:
+    """
+    Считает сумму покупок и количество заказов по группам статусов одним запросом.
+
+    Args:
+        queryset: Отфильтрованный QuerySet заказов
+
+    Returns:
+        Словарь с total_spent и status_counts
+    """
+    aggregates = {
+        group: Count('id', filter=Q(status__in=statuses)) for group, statuses in STATUS_GROUPS.items()
+    }
+    summary = queryset.order_by().aggregate(
+        total_spent=Sum('total_price', filter=~Q(status='canceled')),
+        **aggregates
+    )
+    return {
+        'total_spent': float(summary.pop('total_spent') or 0),
+        'status_counts': summary,
+    }
+
+
+def stream_orders_json(queryset: QuerySet, extra: Dict[str, Any]) -> Iterator[str]:
+    """
+    Отдает JSON-ответ со списком заказов по частям.
+
+    Заказы читаются пакетами через iterator(chunk_size), позиции
+    предзагружаются для каждого пакета отдельно.
+
+    Args:
+        queryset: QuerySet заказов с with_items и select_related('user')
+        extra: Дополнительные поля ответа (итоги), выводятся после списка
+
+    Yields:
+        Фрагменты JSON
+    """
+    encoder = JSONEncoder(ensure_ascii=False)
+    yield '{"orders": ['
+    for index, order in enumerate(queryset.iterator(chunk_size=STREAM_CHUNK_SIZE)):
+        yield (',' if index else '') + encoder.encode(serialize_order(order, include_user=True))
+    yield ']'
+    for key, value in extra.items():
+        yield f', {json.dumps(key)}: {encoder.encode(value)}'
+    yield '}'
@@ -0,0 +1,294 @@
+"""
+Классы пагинации для API каталога.
+
+Каталог пагинируется по ключу (keyset/cursor): курсор хранит значение поля
+сортировки и ID последнего товара страницы, поэтому следующая страница
+выбирается условием WHERE по индексу, а не OFFSET, и стоит одинаково
+для любой глубины.
+"""
+
+import base64
+import json
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from django.db import connections
+from django.db.models import Model, Q, QuerySet
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def approximate_count(queryset: QuerySet) -> int:
+    """
+    Возвращает приблизительное количество строк в queryset.
+
+    Для нефильтрованного queryset на PostgreSQL используется оценка планировщика
+    из pg_class (без сканирования таблицы), в остальных случаях - обычный COUNT.
+
+    Args:
+        queryset: QuerySet для подсчета
+
+    Returns:
+        Количество строк
+    """
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql' and not queryset.query.has_filters():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class WHERE relname = %s',
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+        # reltuples = -1, если таблица еще ни разу не анализировалась
+        if row and row[0] >= 0:
+            return int(row[0])
+    return queryset.count()
+
+
+class ProductCursorPagination(BasePagination):
+    """
+    Курсорная пагинация товаров с устойчивой сортировкой.
+
+    Поддерживает сортировки по creation_date, price, name и discount в обоих
+    направлениях; при равных значениях порядок определяется по id.
+    Для результатов полнотекстового поиска без явной сортировки товары
+    упорядочиваются по релевантности (аннотация search_rank).
+    Общее количество товаров возвращается только по запросу (?with_total=true).
+
+    Attributes:
+        page_size: Размер страницы по умолчанию
+        max_page_size: Максимальный размер страницы
+        page_size_query_param: Параметр запроса для размера страницы
+        cursor_query_param: Параметр запроса для курсора
+        ordering_query_param: Параметр запроса для сортировки
+        total_query_param: Параметр запроса для включения общего количества
+        ordering_fields: Поля, по которым разрешена сортировка
+        default_ordering: Сортировка по умолчанию
+        rank_field: Аннотация релевантности, по которой сортируются результаты поиска
+        results_key: Ключ списка результатов в ответе
+    """
+    page_size = 24
+    max_page_size = 100
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    ordering_query_param = 'ordering'
+    total_query_param = 'with_total'
+    ordering_fields = ('creation_date', 'price', 'name', 'discount')
+    default_ordering = '-creation_date'
+    rank_field = 'search_rank'
+    results_key = 'results'
+    invalid_cursor_message = 'Некорректный курсор'
+
+    def paginate_queryset(self, queryset: QuerySet, request: Request, view: Any = None) -> List[Model]:
+        """
+        Возвращает страницу товаров, начиная с позиции курсора.
+
+        Args:
+            queryset: Отфильтрованный QuerySet товаров
+            request: Объект запроса
+            view: Представление, вызвавшее пагинацию
+
+        Returns:
+            Список объектов текущей страницы
+        """
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(request, queryset)
+        self.total = None
+        if self.wants_total(request):
+            self.total = approximate_count(queryset)
+
+        field = self.ordering.lstrip('-')
+        cursor = self.decode_cursor(request)
+        is_reverse = bool(cursor and cursor['r'])
+        descending = self.ordering.startswith('-') != is_reverse
+
+        prefix = '-' if descending else ''
+        queryset = queryset.order_by(f'{prefix}{field}', f'{prefix}id')
+
+        if cursor:
+            if field == self.rank_field:
+                value = float(cursor['v'])
+            else:
+                value = queryset.model._meta.get_field(field).to_python(cursor['v'])
+            lookup = 'lt' if descending else 'gt'
+            queryset = queryset.filter(
+                Q(**{f'{field}__{lookup}': value}) | Q(**{field: value, f'id__{lookup}': cursor['i']})
+            )
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+
+        if is_reverse:
+            results.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, cursor is not None
+
+        self.field = field
+        self.page = results
+        return results
+
+    def get_paginated_response(self, data: List[Dict[str, Any]]) -> Response:
+        """
+        Формирует ответ со ссылками на соседние страницы.
+
+        Args:
+            data: Сериализованные данные страницы
+
+        Returns:
+            Response с результатами и ссылками next/previous
+        """
+        payload = OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            (self.results_key, data),
+        ])
+        if self.total is not None:
+            payload['total'] = self.total
+        return Response(payload)
+
+    def get_page_size(self, request: Request) -> int:
+        """
+        Определяет размер страницы из параметров запроса.
+
+        Args:
+            request: Объект запроса
+
+        Returns:
+            Размер страницы
+        """
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if size <= 0:
+            return self.page_size
+        return min(size, self.max_page_size)
+
+    def get_ordering(self, request: Request, queryset: QuerySet) -> str:
+        """
+        Определяет сортировку из параметров запроса.
+        Неподдерживаемые значения заменяются сортировкой по умолчанию
+        (по релевантности, если queryset содержит результаты поиска).
+
+        Args:
+            request: Объект запроса
+            queryset: Отфильтрованный QuerySet товаров
+
+        Returns:
+            Строка сортировки, например '-creation_date'
+        """
+        ordering = request.query_params.get(self.ordering_query_param, '').split(',')[0].strip()
+        if ordering.lstrip('-') in self.ordering_fields:
+            return ordering
+        if self.rank_field in queryset.query.annotations:
+            return f'-{self.rank_field}'
+        return self.default_ordering
+
+    def wants_total(self, request: Request) -> bool:
+        """
+        Проверяет, запрошено ли общее количество товаров.
+
+        Args:
+            request: Объект запроса
+
+        Returns:
+            True, если клиент запросил общее количество
+        """
+        return request.query_params.get(self.total_query_param, '').lower() in ('1', 'true')
+
+    def decode_cursor(self, request: Request) -> Optional[Dict[str, Any]]:
+        """
+        Декодирует курсор из параметров запроса.
+
+        Args:
+            request: Объект запроса
+
+        Returns:
+            Словарь с сортировкой, значением, id и направлением или None
+
+        Raises:
+            NotFound: Если курсор поврежден или построен для другой сортировки
+        """
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            raw = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+            cursor = {'o': raw['o'], 'v': raw['v'], 'i': int(raw['i']), 'r': bool(raw.get('r'))}
+            if cursor['o'] != self.ordering:
+                raise ValueError('ordering mismatch')
+        except (TypeError, ValueError, KeyError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+        return cursor
+
+    def encode_cursor(self, instance: Model, reverse: bool) -> str:
+        """
+        Строит URL страницы по граничному объекту текущей страницы.
+
+        Args:
+            instance: Первый или последний объект страницы
+            reverse: True для ссылки на предыдущую страницу
+
+        Returns:
+            Абсолютный URL с параметром курсора
+        """
+        if self.field == self.rank_field:
+            value = getattr(instance, self.field)
+        else:
+            value = instance._meta.get_field(self.field).value_to_string(instance)
+        cursor = {
+            'o': self.ordering,
+            'v': value,
+            'i': instance.pk,
+            'r': int(reverse),
+        }
+        encoded = base64.urlsafe_b64encode(json.dumps(cursor).encode('utf-8')).decode('ascii')
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, encoded)
+
+    def get_next_link(self) -> Optional[str]:
+        """
+        Возвращает ссылку на следующую страницу.
+
+        Returns:
+            URL следующей страницы или None
+        """
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self) -> Optional[str]:
+        """
+        Возвращает ссылку на предыдущую страницу.
+
+        Returns:
+            URL предыдущей страницы или None
+        """
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.request.build_absolute_uri(), self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+
+class ProductSearchCursorPagination(ProductCursorPagination):
+    """
+    Курсорная пагинация для расширенного поиска.
+    Сохраняет ключ 'products', который ожидает фронтенд.
+    """
+    results_key = 'products'
+
+
+class OrderCursorPagination(ProductCursorPagination):
+    """
+    Курсорная пагинация истории заказов (новые заказы первыми).
+    """
+    page_size = 20
+    ordering_fields = ('created_at',)
+    default_ordering = '-created_at'
+    results_key = 'orders'
@@ -0,0 +1,97 @@
+"""
+Проекции выборок товаров для разных представлений.
+
+Списки не загружают все столбцы товара: описание и характеристики (JSON)
+занимают больше всего места, но нужны только на странице товара. Каждое
+представление загружает свой набор столбцов:
+
+- карточка (ProductListSerializer) - QuerySet.only() по выбранным полям
+  (?fields=) и полям сортировки курсорной пагинации;
+- выпадающий список поиска - QuerySet.values() без создания моделей;
+- список товаров в админке - QuerySet.only() по столбцам list_display.
+"""
+
+from typing import Any, Dict, Iterable, List, Optional
+
+from django.db.models import QuerySet
+
+from .pagination import ProductCursorPagination
+from .serializers import ProductListSerializer
+
+# Столбцы выпадающего списка поиска
+DROPDOWN_COLUMNS = ('id', 'name', 'price', 'image', 'is_available', 'category__name')
+# Столбцы списка товаров в админке (list_display ProductAdmin)
+ADMIN_GRID_COLUMNS = (
+    'sku', 'name', 'category', 'category__name', 'price', 'discount', 'stock', 'average_rating',
+)
+
+
+def card_columns(fields: Iterable[str], prefix: str = '') -> List[str]:
+    """
+    Возвращает столбцы для вывода карточек товаров.
+
+    Args:
+        fields: Поля ProductListSerializer
+        prefix: Префикс пути к товару (например, 'product__' для избранного)
+
+    Returns:
+        Список аргументов для QuerySet.only()
+    """
+    columns = ProductListSerializer.columns(tuple(fields))
+    # Курсор пагинации хранит значение поля сортировки последнего товара страницы
+    for column in ProductCursorPagination.ordering_fields:
+        if column not in columns:
+            columns.append(column)
+    return [f'{prefix}{column}' for column in columns]
+
+
+def card_queryset(queryset: QuerySet, request: Optional[Any] = None) -> QuerySet:
+    """
+    Ограничивает выборку товаров столбцами карточек, запрошенными в ?fields=.
+
+    Args:
+        queryset: QuerySet товаров
+        request: Объект запроса (None - поля по умолчанию)
+
+    Returns:
+        QuerySet с only() (и select_related('category'), если категория выводится)
+    """
+    fields = ProductListSerializer.requested_fields(request)
+    queryset = queryset.only(*card_columns(fields))
+    if 'category' in fields:
+        queryset = queryset.select_related('category')
+    return queryset
+
+
+def dropdown_rows(queryset: QuerySet) -> List[Dict[str, Any]]:
+    """
+    Загружает товары для выпадающего списка поиска без создания моделей.
+
+    Args:
+        queryset: Отсортированный и ограниченный QuerySet товаров
+
+    Returns:
+        Список словарей в формате выпадающего списка
+    """
+    storage = queryset.model._meta.get_field('image').storage
+    return [{
+        'id': row['id'],
+        'name': row['name'],
+        'price': float(row['price']),
+        'image': storage.url(row['image']) if row['image'] else None,
+        'category': {'name': row['category__name'] or ''},
+        'is_available': row['is_available'],
+    } for row in queryset.values(*DROPDOWN_COLUMNS)]
+
+
+def admin_grid_queryset(queryset: QuerySet) -> QuerySet:
+    """
+    Ограничивает выборку товаров столбцами списка в админке.
+
+    Args:
+        queryset: QuerySet товаров
+
+    Returns:
+        QuerySet с select_related('category') и only()
+    """
+    return queryset.select_related('category').only(*ADMIN_GRID_COLUMNS)
@@ -0,0 +1,214 @@
+"""
+Подборки главной страницы: новинки, популярные товары, популярные
+в избранном и последние отзывы.
+
+Подборки одинаковы для всех посетителей, поэтому они заранее сериализуются
+в JSON и хранятся в кэше Django вместе с ETag. Обновление выполняет задача
+Celery refresh_home_rails: периодически и после фиксации транзакции, в
+которой изменились товары, отзывы или избранное. Изменения за
+RAIL_REFRESH_DELAY секунд объединяются в одно обновление: задача для
+подборки ставится в очередь с задержкой только тем процессом, который
+захватил блокировку в кэше.
+Запросы главной страницы отдают готовое тело ответа без обращения к ORM
+(к базе данных обращается только первый запрос после очистки кэша;
+одновременные запросы при этом ждут одного пересчета, см. main.caching).
+
+Подборки не зависят от запроса, поэтому ссылки на изображения в них
+относительные (MEDIA_URL без домена).
+"""
+
+import hashlib
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from . import caching
+from .models import Product, Review
+from .projections import card_queryset
+from .serializers import ProductListSerializer
+
+RAIL_NAMESPACE = 'main:rail'
+# Срок жизни больше интервала периодического обновления, чтобы подборка
+# не пропадала из кэша между запусками задачи
+RAIL_TIMEOUT = 60 * 60
+RAIL_SIZE = 10
+# Время кэширования ответа в браузере и промежуточных кэшах (Cache-Control: max-age)
+RAIL_MAX_AGE = 60
+NEW_PRODUCTS_DAYS = 30
+# Задержка обновления подборки после изменения данных (секунды)
+RAIL_REFRESH_DELAY = 30
+# Срок жизни блокировки обновления: если задача не выполнилась (воркер
+# недоступен), следующее изменение снова поставит ее в очередь
+RAIL_REFRESH_LOCK_TIMEOUT = 10 * RAIL_REFRESH_DELAY
+
+
+def _new_products() -> List[Dict[str, Any]]:
+    """
+    Товары, созданные за последние NEW_PRODUCTS_DAYS дней.
+
+    Returns:
+        Сериализованные товары
+    """
+    month_ago = timezone.now() - timezone.timedelta(days=NEW_PRODUCTS_DAYS)
+    products = card_queryset(Product.objects.filter(
+        creation_date__gte=month_ago
+    )).order_by('-creation_date')[:RAIL_SIZE]
+    return ProductListSerializer(products, many=True).data
+
+
+def _popular_products() -> List[Dict[str, Any]]:
+    """
+    Товары с наибольшим количеством отзывов и высоким рейтингом.
+
+    Returns:
+        Сериализованные товары
+    """
+    products = card_queryset(Product.objects.filter(
+        rating_count__gt=0
+    )).order_by('-rating_count', '-average_rating')[:RAIL_SIZE]
+    return ProductListSerializer(products, many=True).data
+
+
+def _popular_wishlist_products() -> List[Dict[str, Any]]:
+    """
+    Товары, которые чаще всего добавляют в избранное.
+
+    Returns:
+        Сериализованные товары
+    """
+    products = card_queryset(Product.objects.annotate(
+        wishlist_count=Count('wishlisted_by')
+    ).filter(
+        wishlist_count__gt=0
+    )).order_by('-wishlist_count')[:RAIL_SIZE]
+    return ProductListSerializer(products, many=True).data
+
+
+def _recent_reviews() -> List[Dict[str, Any]]:
+    """
+    Последние отзывы с краткими данными о товаре и авторе.
+
+    Returns:
+        Список отзывов
+    """
+    reviews = Review.objects.select_related('product', 'user').only(
+        'rating', 'comment', 'pros', 'cons', 'created_at',
+        'product__name', 'product__image', 'user__username', 'user__profile_image',
+    ).order_by('-created_at')[:RAIL_SIZE]
+    return [{
+        'id': review.id,
+        'rating': review.rating,
+        'comment': review.comment,
+        'pros': review.pros,
+        'cons': review.cons,
+        'created_at': review.created_at,
+        'product': {
+            'id': review.product.id,
+            'name': review.product.name,
+            'image': review.product.image.url if review.product.image else None,
+        },
+        'user': {
+            'id': review.user.id,
+            'username': review.user.username,
+            'profile_image': review.user.get_profile_image_url() if hasattr(review.user, 'get_profile_image_url') else None,
+        }
+    } for review in reviews]
+
+
+RAIL_BUILDERS: Dict[str, Callable[[], List[Dict[str, Any]]]] = {
+    'new_products': _new_products,
+    'popular_products': _popular_products,
+    'popular_wishlist_products': _popular_wishlist_products,
+    'recent_reviews': _recent_reviews,
+}
+
+
+def render_rail(name: str) -> Dict[str, Any]:
+    """
+    Строит подборку и сериализует ее в JSON.
+
+    Args:
+        name: Название подборки из RAIL_BUILDERS
+
+    Returns:
+        Словарь с телом ответа (body) и ETag (etag)
+    """
+    body = JSONRenderer().render(RAIL_BUILDERS[name]())
+    return {'body': body, 'etag': '"%s"' % hashlib.md5(body).hexdigest()}
+
+
+def refresh_rails(names: Optional[Iterable[str]] = None) -> List[str]:
+    """
+    Перестраивает подборки и сохраняет их в кэш.
+
+    Args:
+        names: Названия подборок (по умолчанию все)
+
+    Returns:
+        Список обновленных подборок
+    """
+    names = sorted(set(names or RAIL_BUILDERS))
+    # Изменения, зафиксированные во время перестроения, планируют новое обновление
+    caching.delete_many(_refresh_lock_key(name) for name in names)
+    for name in names:
+        caching.set_value(caching.make_key(RAIL_NAMESPACE, name), render_rail(name), RAIL_TIMEOUT)
+    return names
+
+
+def get_rail(name: str) -> Dict[str, Any]:
+    """
+    Возвращает подборку из кэша, строя ее при промахе.
+
+    Args:
+        name: Название подборки
+
+    Returns:
+        Словарь с телом ответа и ETag
+    """
+    return caching.get_or_set(
+        caching.make_key(RAIL_NAMESPACE, name), lambda: render_rail(name), RAIL_TIMEOUT
+    )
+
+
+def _refresh_lock_key(name: str) -> str:
+    """
+    Ключ блокировки запланированного обновления подборки.
+
+    Args:
+        name: Название подборки
+
+    Returns:
+        Ключ кэша
+    """
+    return caching.make_key(RAIL_NAMESPACE, name, 'refresh')
+
+
+def schedule_rails_refresh(names: Iterable[str]) -> None:
+    """
+    Планирует обновление подборок задачей Celery после фиксации текущей
+    транзакции (при откате транзакции обновление не планируется).
+
+    Args:
+        names: Названия подборок
+    """
+    names = sorted(set(names))
+    # robust: недоступность брокера не превращает зафиксированный запрос в ошибку
+    transaction.on_commit(lambda: _enqueue_refresh(names), robust=True)
+
+
+def _enqueue_refresh(names: List[str]) -> None:
+    """
+    Ставит в очередь отложенное обновление подборок, для которых оно
+    еще не запланировано.
+
+    Args:
+        names: Названия подборок
+    """
+    due = [name for name in names if caching.acquire_lock(_refresh_lock_key(name), RAIL_REFRESH_LOCK_TIMEOUT)]
+    if due:
+        # Импорт здесь: main.tasks импортирует этот модуль
+        from .tasks import refresh_home_rails
+        refresh_home_rails.apply_async(kwargs={'names': due}, countdown=RAIL_REFRESH_DELAY)
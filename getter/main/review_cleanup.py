@@ -0,0 +1,91 @@
+"""
+Удаление некорректных отзывов.
+
+Общая реализация для периодической задачи clean_old_reviews и команды
+clean_invalid_reviews. Отзывы без комментария и с комментарием, в который
+попало строковое представление генератора ('<generator object ...>'),
+удаляются диапазонами первичного ключа: каждый диапазон удаляется в своей
+транзакции вместе с пересчетом агрегатов рейтинга затронутых товаров
+одним UPDATE.
+
+Удаляются ровно те отзывы, которые были прочитаны для подсчета и пересчета
+рейтингов (фильтр по их ID), поэтому отзыв, добавленный параллельно,
+не удаляется без учета. Удаление выполняется QuerySet.delete(): сигналы
+post_delete отзывов сбрасывают сводки активности авторов, версию отзывов
+и планируют обновление подборок главной страницы.
+"""
+
+from typing import Dict, Optional
+
+from django.db import transaction
+from django.db.models import BooleanField, ExpressionWrapper, Max, Min, Q, QuerySet
+
+from .models import Product, Review
+
+INVALID_COMMENT_MARKER = '<generator object'
+# Размер диапазона первичных ключей, удаляемого одной транзакцией
+CLEANUP_CHUNK_SIZE = 10000
+
+
+def invalid_reviews(include_empty: bool = True) -> QuerySet:
+    """
+    Возвращает отзывы, подлежащие удалению.
+
+    Args:
+        include_empty: Включать отзывы без комментария
+
+    Returns:
+        QuerySet отзывов
+    """
+    condition = Q(comment__contains=INVALID_COMMENT_MARKER)
+    if include_empty:
+        condition |= Q(comment__isnull=True)
+    return Review.objects.filter(condition)
+
+
+def _delete_chunk(queryset: QuerySet) -> Dict[str, int]:
+    """
+    Удаляет отзывы диапазона и пересчитывает рейтинги затронутых товаров.
+
+    Args:
+        queryset: Отзывы диапазона
+
+    Returns:
+        Словарь с количеством удаленных отзывов без текста и с некорректным текстом
+    """
+    with transaction.atomic():
+        rows = list(queryset.annotate(
+            empty=ExpressionWrapper(Q(comment__isnull=True), output_field=BooleanField()),
+        ).values_list('id', 'product_id', 'empty'))
+        if not rows:
+            return {'empty': 0, 'invalid': 0}
+        Review.objects.filter(id__in=[review_id for review_id, _, _ in rows]).delete()
+        Product.objects.refresh_ratings(sorted({product_id for _, product_id, _ in rows}))
+    empty = sum(1 for _, _, is_empty in rows if is_empty)
+    return {'empty': empty, 'invalid': len(rows) - empty}
+
+
+def delete_invalid_reviews(include_empty: bool = True,
+                           chunk_size: Optional[int] = None) -> Dict[str, int]:
+    """
+    Удаляет некорректные отзывы диапазонами первичного ключа.
+
+    Args:
+        include_empty: Удалять также отзывы без комментария
+        chunk_size: Размер диапазона первичных ключей (по умолчанию CLEANUP_CHUNK_SIZE)
+
+    Returns:
+        Словарь с количеством удаленных отзывов без текста ('empty')
+        и с некорректным текстом ('invalid')
+    """
+    chunk_size = chunk_size or CLEANUP_CHUNK_SIZE
+    queryset = invalid_reviews(include_empty)
+    bounds = queryset.aggregate(first=Min('id'), last=Max('id'))
+    deleted = {'empty': 0, 'invalid': 0}
+    if bounds['first'] is None:
+        return deleted
+    for start in range(bounds['first'], bounds['last'] + 1, chunk_size):
+        chunk = _delete_chunk(queryset.filter(id__gte=start, id__lt=start + chunk_size))
+        deleted['empty'] += chunk['empty']
+        deleted['invalid'] += chunk['invalid']
+    return deleted
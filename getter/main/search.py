@@ -0,0 +1,292 @@
+"""
+Полнотекстовый поиск по товарам.
+
+Поиск выполняется по теневому индексу, который хранится в той же базе данных
+и обновляется при сохранении товара или категории:
+
+- PostgreSQL: таблица main_product_search со столбцом tsvector и GIN-индексом,
+  морфология обеспечивается конфигурацией 'russian';
+- SQLite: виртуальная таблица FTS5 main_product_fts, в которую записывается
+  текст, предварительно приведенный к основам слов стеммером main.stemmer.
+
+Если индекс недоступен (другая СУБД или SQLite без FTS5), используется
+запасной вариант с icontains.
+"""
+
+from typing import Dict, Iterable, List, Optional
+
+from django.db import connection
+from django.db.models import FloatField, Q, QuerySet, Value
+from django.db.models.expressions import RawSQL
+
+from .models import Product
+from .stemmer import normalize_text, stem_russian, tokenize
+
+# Поля индекса и соответствующие им веса tsvector в PostgreSQL
+SEARCH_FIELDS = ('name', 'sku', 'category', 'description')
+POSTGRES_WEIGHTS = {'name': 'A', 'sku': 'B', 'category': 'C', 'description': 'D'}
+
+
+class BaseSearchBackend:
+    """
+    Базовый бэкенд поиска товаров.
+
+    Бэкенд фильтрует QuerySet по поисковому запросу и добавляет аннотацию
+    search_rank (чем больше, тем релевантнее), а также поддерживает
+    теневой индекс в актуальном состоянии.
+    """
+    rank_annotation = 'search_rank'
+
+    def search(self, queryset: QuerySet, query: str, fields: Optional[Iterable[str]] = None,
+               rank: bool = True) -> QuerySet:
+        """
+        Фильтрует товары по поисковому запросу.
+
+        Args:
+            queryset: Исходный QuerySet товаров
+            query: Поисковый запрос
+            fields: Поля индекса, по которым выполняется поиск (по умолчанию все)
+            rank: Добавлять ли аннотацию релевантности
+
+        Returns:
+            Отфильтрованный QuerySet (с аннотацией search_rank, если rank=True)
+        """
+        raise NotImplementedError
+
+    def index_products(self, product_ids: Optional[Iterable[int]] = None) -> None:
+        """
+        Добавляет или обновляет товары в индексе.
+
+        Args:
+            product_ids: ID товаров (по умолчанию весь каталог)
+        """
+
+    def remove_products(self, product_ids: Iterable[int]) -> None:
+        """
+        Удаляет товары из индекса.
+
+        Args:
+            product_ids: ID удаленных товаров
+        """
+
+    def rebuild(self) -> None:
+        """
+        Полностью перестраивает индекс.
+        """
+        self.index_products()
+
+
+class BasicSearchBackend(BaseSearchBackend):
+    """
+    Запасной бэкенд на основе icontains без отдельного индекса.
+    """
+    lookups = {
+        'name': 'name__icontains',
+        'sku': 'sku__icontains',
+        'category': 'category__name__icontains',
+        'description': 'description__icontains',
+    }
+
+    def search(self, queryset: QuerySet, query: str, fields: Optional[Iterable[str]] = None,
+               rank: bool = True) -> QuerySet:
+        condition = Q()
+        for field in fields or SEARCH_FIELDS:
+            condition |= Q(**{self.lookups[field]: query})
+        queryset = queryset.filter(condition)
+        if not rank:
+            return queryset
+        return queryset.annotate(**{self.rank_annotation: Value(0.0, output_field=FloatField())})
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    """
+    Бэкенд поиска на tsvector + GIN (PostgreSQL).
+    """
+    config = 'russian'
+
+    def build_query(self, query: str) -> str:
+        """
+        Строит выражение для to_tsquery с поиском по префиксам слов.
+
+        Args:
+            query: Поисковый запрос
+
+        Returns:
+            Выражение tsquery
+        """
+        return ' & '.join(f'{token}:*' for token in tokenize(query))
+
+    def search(self, queryset: QuerySet, query: str, fields: Optional[Iterable[str]] = None,
+               rank: bool = True) -> QuerySet:
+        tsquery = self.build_query(query)
+        if not tsquery:
+            return queryset.none()
+        weights = sorted({POSTGRES_WEIGHTS[field].lower() for field in fields or SEARCH_FIELDS})
+        document = 's.document'
+        if len(weights) < len(set(POSTGRES_WEIGHTS.values())):
+            document = f"ts_filter(s.document, '{{{','.join(weights)}}}')"
+        matches = RawSQL(
+            "SELECT s.product_id FROM main_product_search s "
+            f"WHERE s.document @@ to_tsquery(%s, %s) AND {document} @@ to_tsquery(%s, %s)",
+            [self.config, tsquery, self.config, tsquery],
+        )
+        queryset = queryset.filter(id__in=matches)
+        if not rank:
+            return queryset
+        rank_expression = RawSQL(
+            "SELECT ts_rank_cd(s.document, to_tsquery(%s, %s)) FROM main_product_search s "
+            'WHERE s.product_id = "main_product"."id"',
+            [self.config, tsquery],
+            output_field=FloatField(),
+        )
+        return queryset.annotate(**{self.rank_annotation: rank_expression})
+
+    def index_products(self, product_ids: Optional[Iterable[int]] = None) -> None:
+        where, params = '', []
+        if product_ids is not None:
+            params = [list(product_ids)]
+            if not params[0]:
+                return
+            where = 'WHERE p.id = ANY(%s)'
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO main_product_search (product_id, document) "
+                "SELECT p.id, "
+                "setweight(to_tsvector('russian', coalesce(p.name, '')), 'A') || "
+                "setweight(to_tsvector('simple', coalesce(p.sku, '')), 'B') || "
+                "setweight(to_tsvector('russian', coalesce(c.name, '')), 'C') || "
+                "setweight(to_tsvector('russian', coalesce(p.description, '')), 'D') "
+                "FROM main_product p JOIN main_category c ON c.id = p.category_id "
+                f"{where} "
+                "ON CONFLICT (product_id) DO UPDATE SET document = EXCLUDED.document",
+                params,
+            )
+
+    def remove_products(self, product_ids: Iterable[int]) -> None:
+        # Строки индекса удаляются каскадно внешним ключом
+        pass
+
+
+class SQLiteFTSSearchBackend(BaseSearchBackend):
+    """
+    Бэкенд поиска на виртуальной таблице FTS5 (SQLite).
+    """
+    table = 'main_product_fts'
+
+    def build_query(self, query: str, fields: Optional[Iterable[str]] = None) -> str:
+        """
+        Строит выражение MATCH для FTS5 с поиском по префиксам основ слов.
+
+        Args:
+            query: Поисковый запрос
+            fields: Столбцы индекса для поиска
+
+        Returns:
+            Выражение MATCH
+        """
+        terms = ' AND '.join(f'"{stem_russian(token)}"*' for token in tokenize(query))
+        if not terms:
+            return ''
+        if fields:
+            return f"{{{' '.join(fields)}}} : ({terms})"
+        return terms
+
+    def search(self, queryset: QuerySet, query: str, fields: Optional[Iterable[str]] = None,
+               rank: bool = True) -> QuerySet:
+        match = self.build_query(query, fields)
+        if not match:
+            return queryset.none()
+        matches = RawSQL(f'SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s', [match])
+        queryset = queryset.filter(id__in=matches)
+        if not rank:
+            return queryset
+        # bm25() возвращает отрицательные значения: чем меньше, тем релевантнее
+        rank_expression = RawSQL(
+            f'SELECT -bm25({self.table}, 10.0, 10.0, 5.0, 1.0) FROM {self.table} '
+            f'WHERE {self.table} MATCH %s AND rowid = "main_product"."id"',
+            [match],
+            output_field=FloatField(),
+        )
+        return queryset.annotate(**{self.rank_annotation: rank_expression})
+
+    def index_products(self, product_ids: Optional[Iterable[int]] = None) -> None:
+        products = Product.objects.select_related('category').only(
+            'id', 'name', 'sku', 'description', 'category__name'
+        )
+        if product_ids is not None:
+            product_ids = list(product_ids)
+            if not product_ids:
+                return
+            products = products.filter(id__in=product_ids)
+        rows = [
+            (
+                product.id,
+                normalize_text(product.name),
+                normalize_text(product.sku),
+                normalize_text(product.category.name),
+                normalize_text(product.description),
+            )
+            for product in products.iterator(chunk_size=500)
+        ]
+        with connection.cursor() as cursor:
+            if product_ids is None:
+                cursor.execute(f'DELETE FROM {self.table}')
+            else:
+                self._delete(cursor, product_ids)
+            cursor.executemany(
+                f'INSERT INTO {self.table} (rowid, name, sku, category, description) VALUES (%s, %s, %s, %s, %s)',
+                rows,
+            )
+
+    def remove_products(self, product_ids: Iterable[int]) -> None:
+        product_ids = list(product_ids)
+        if product_ids:
+            with connection.cursor() as cursor:
+                self._delete(cursor, product_ids)
+
+    def _delete(self, cursor, product_ids: List[int], batch_size: int = 500) -> None:
+        for start in range(0, len(product_ids), batch_size):
+            batch = product_ids[start:start + batch_size]
+            placeholders = ', '.join(['%s'] * len(batch))
+            cursor.execute(f'DELETE FROM {self.table} WHERE rowid IN ({placeholders})', batch)
+
+
+_backends: Dict[str, BaseSearchBackend] = {}
+
+
+def _sqlite_has_fts_table() -> bool:
+    """
+    Проверяет, создана ли таблица FTS5 (миграцией) в базе SQLite.
+
+    Returns:
+        True, если таблица индекса существует
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s",
+            [SQLiteFTSSearchBackend.table],
+        )
+        return cursor.fetchone() is not None
+
+
+def get_search_backend() -> BaseSearchBackend:
+    """
+    Возвращает бэкенд поиска для текущей базы данных.
+    Выбранный индексный бэкенд кэшируется на процесс.
+
+    Returns:
+        Экземпляр бэкенда поиска
+    """
+    key = f"{connection.vendor}:{connection.settings_dict['NAME']}"
+    backend = _backends.get(key)
+    if backend is not None:
+        return backend
+    if connection.vendor == 'postgresql':
+        backend = PostgresSearchBackend()
+    elif connection.vendor == 'sqlite' and _sqlite_has_fts_table():
+        backend = SQLiteFTSSearchBackend()
+    else:
+        # Не кэшируем запасной вариант: индекс может появиться после миграции
+        return BasicSearchBackend()
+    _backends[key] = backend
+    return backend
@@ -4,6 +4,7 @@ from .models import Category, Product, Order, OrderItem, Review, Wishlist
 from users.serializers import UserSerializer
 from typing import Dict, Any, List, Optional, Union
 from decimal import Decimal
+from operator import attrgetter
 
 class CategorySerializer(serializers.ModelSerializer):
     """
@@ -13,14 +14,16 @@ class CategorySerializer(serializers.ModelSerializer):
         image: Поле изображения категории
         url: Вычисляемое поле для URL категории
         product_count: Поле для количества продуктов в категории
+        in_stock_count: Поле для количества продуктов в наличии
     """
     image = serializers.ImageField(required=False, allow_null=True)
     url = serializers.SerializerMethodField()
     product_count = serializers.IntegerField(read_only=True, required=False)  # Количество продуктов
+    in_stock_count = serializers.IntegerField(read_only=True, required=False)  # Количество продуктов в наличии
 
     class Meta:
         model = Category
-        fields = ['id', 'name', 'image', 'url', 'product_count']
+        fields = ['id', 'name', 'image', 'url', 'product_count', 'in_stock_count']
 
     def get_url(self, obj: Category) -> str:
         """
@@ -123,6 +126,149 @@ class ProductSerializer(serializers.ModelSerializer):
                 representation['documentation'] = request.build_absolute_uri(instance.documentation.url)
         return representation
 
+class ProductListSerializer(serializers.BaseSerializer):
+    """
+    Облегченный сериализатор товаров для списков (только чтение).
+
+    Формирует словарь товара напрямую, без полей DRF: reverse() для URL
+    товара и категории и абсолютный адрес сервера вычисляются один раз
+    на список, а категории сериализуются один раз на каждую категорию.
+    Описание, характеристики и документация по умолчанию не выводятся;
+    параметр запроса ?fields=id,name,... выбирает нужные поля
+    (в том числе дополнительные) из ALL_FIELDS.
+
+    Формат значений совпадает с ProductSerializer.
+    """
+    ALL_FIELDS = ('id', 'sku', 'name', 'description', 'price', 'discount', 'discounted_price',
+                  'stock', 'category', 'image', 'documentation', 'is_available',
+                  'specifications', 'url', 'average_rating', 'creation_date')
+    DEFAULT_FIELDS = ('id', 'sku', 'name', 'price', 'discount', 'discounted_price', 'stock',
+                      'category', 'image', 'is_available', 'url', 'average_rating', 'creation_date')
+    # Столбцы товара (и категории), которые нужны для вывода каждого поля
+    FIELD_COLUMNS = {
+        'discounted_price': ('price', 'discount'),
+        'category': ('category', 'category__id', 'category__name', 'category__image'),
+        'url': ('id',),
+    }
+    # Заведомо отсутствующий ID для получения шаблона URL товара одним вызовом reverse()
+    _URL_PK_PLACEHOLDER = 2147483647
+    _datetime_field = serializers.DateTimeField()
+
+    @classmethod
+    def requested_fields(cls, request: Optional[Any]) -> tuple:
+        """
+        Определяет поля вывода по параметру запроса ?fields=.
+
+        Args:
+            request: Объект запроса или None
+
+        Returns:
+            Кортеж полей в порядке ALL_FIELDS
+        """
+        requested = request.query_params.get('fields') if request is not None else None
+        if not requested:
+            return cls.DEFAULT_FIELDS
+        requested = {field.strip() for field in requested.split(',')}
+        return tuple(field for field in cls.ALL_FIELDS if field in requested) or cls.DEFAULT_FIELDS
+
+    @classmethod
+    def columns(cls, fields: tuple) -> List[str]:
+        """
+        Возвращает столбцы, которые нужно загрузить для вывода полей
+        (аргументы для QuerySet.only()).
+
+        Args:
+            fields: Поля вывода
+
+        Returns:
+            Список столбцов товара и категории
+        """
+        columns = []
+        for field in fields:
+            for column in cls.FIELD_COLUMNS.get(field, (field,)):
+                if column not in columns:
+                    columns.append(column)
+        return columns
+
+    def _prepare(self) -> None:
+        """
+        Вычисляет данные, общие для всех товаров списка: выбранные поля
+        и функции получения их значений, шаблон URL товара, URL категорий
+        и адрес сервера для абсолютных ссылок.
+        """
+        request = self.context.get('request')
+        fields = self.requested_fields(request)
+        self._categories = {}
+        self._base_uri = request.build_absolute_uri('/')[:-1] if request is not None else None
+        url_prefix, url_suffix = Product(pk=self._URL_PK_PLACEHOLDER).get_absolute_url().split(
+            str(self._URL_PK_PLACEHOLDER)
+        )
+        self._category_url = Category().get_absolute_url()
+
+        getters = {
+            'price': lambda product: str(product.price),
+            'discounted_price': Product.get_discounted_price,
+            'category': lambda product: self._category(product.category),
+            'image': lambda product: self._file_url(product.image),
+            'documentation': lambda product: self._file_url(product.documentation),
+            'url': lambda product: f'{url_prefix}{product.pk}{url_suffix}',
+            'creation_date': lambda product: self._datetime_field.to_representation(product.creation_date),
+        }
+        self._getters = [(field, getters.get(field) or attrgetter(field)) for field in fields]
+
+    def _file_url(self, file: Any) -> Optional[str]:
+        """
+        Возвращает URL файла, абсолютный при наличии запроса в контексте.
+
+        Args:
+            file: Поле файла или изображения
+
+        Returns:
+            URL файла или None
+        """
+        if not file:
+            return None
+        url = file.url
+        if self._base_uri is not None and url.startswith('/'):
+            return self._base_uri + url
+        return url
+
+    def _category(self, category: Optional[Category]) -> Optional[Dict[str, Any]]:
+        """
+        Сериализует категорию (один раз для каждой категории списка).
+
+        Args:
+            category: Категория товара
+
+        Returns:
+            Словарь в формате CategorySerializer
+        """
+        if category is None:
+            return None
+        data = self._categories.get(category.pk)
+        if data is None:
+            data = self._categories[category.pk] = {
+                'id': category.pk,
+                'name': category.name,
+                'image': self._file_url(category.image),
+                'url': self._category_url,
+            }
+        return data
+
+    def to_representation(self, instance: Product) -> Dict[str, Any]:
+        """
+        Преобразует товар в словарь с выбранными полями.
+
+        Args:
+            instance: Объект товара (категория загружена через select_related)
+
+        Returns:
+            Словарь с данными товара
+        """
+        if not hasattr(self, '_getters'):
+            self._prepare()
+        return {field: getter(instance) for field, getter in self._getters}
+
 class OrderItemSerializer(serializers.ModelSerializer):
     """
     Сериализатор для модели OrderItem.
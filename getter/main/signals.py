@@ -0,0 +1,219 @@
+"""
+Обработчики сигналов приложения main.
+"""
+
+from typing import Any
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .activity import invalidate_user_activity
+from .caching import bump_model_version_on_commit
+from .categories import schedule_counts_refresh
+from .models import Category, Order, Product, Review, Wishlist
+from .rails import RAIL_BUILDERS, schedule_rails_refresh
+from .search import get_search_backend
+from .stats import invalidate_catalog_stats
+from .suggest import suggest_index
+
+# Поля товара, которые попадают в поисковый индекс
+SEARCH_INDEXED_FIELDS = frozenset({'name', 'sku', 'description', 'category'})
+# Поля товара, которые используются в подсказках поиска
+SUGGEST_FIELDS = frozenset({'name', 'sku', 'price', 'image', 'is_available', 'category'})
+# Поля товара, от которых зависят счетчики товаров категории
+CATEGORY_COUNT_FIELDS = frozenset({'category', 'stock'})
+# Подборки главной страницы, зависящие от модели
+RAILS_BY_MODEL = {
+    Product: tuple(RAIL_BUILDERS),
+    Category: ('new_products', 'popular_products', 'popular_wishlist_products'),
+    Review: ('popular_products', 'recent_reviews'),
+    Wishlist: ('popular_wishlist_products',),
+}
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def product_changed(sender: Any, instance: Product, **kwargs: Any) -> None:
+    """
+    Сбрасывает кэшированную статистику каталога при изменении товара.
+    
+    Args:
+        sender: Класс модели
+        instance: Измененный товар
+        **kwargs: Дополнительные аргументы сигнала
+    """
+    invalidate_catalog_stats()
+
+
+@receiver(pre_save, sender=Product)
+def remember_product_counts(sender: Any, instance: Product, **kwargs: Any) -> None:
+    """
+    Запоминает прежние категорию и наличие товара, если товар сохраняется
+    без загрузки из базы данных (обычно их запоминает Product.from_db).
+    
+    Args:
+        sender: Класс модели
+        instance: Сохраняемый товар
+        **kwargs: Дополнительные аргументы сигнала
+    """
+    if instance._state.adding or hasattr(instance, '_counts_state'):
+        return
+    row = Product.objects.filter(pk=instance.pk).values_list('category_id', 'stock').first()
+    instance._counts_state = None if row is None else (row[0], row[1] > 0)
+
+
+@receiver(post_save, sender=Product)
+def product_saved_counts(sender: Any, instance: Product, created: bool = False,
+                         update_fields: Any = None, **kwargs: Any) -> None:
+    """
+    Планирует пересчет счетчиков товаров категории после сохранения товара.
+    Пересчитываются только категории, счетчики которых могли измениться:
+    прежняя и новая категория при переносе товара, текущая - при появлении
+    или окончании товара на складе.
+    
+    Args:
+        sender: Класс модели
+        instance: Сохраненный товар
+        created: Создан ли товар
+        update_fields: Список сохраненных полей (если указан при save)
+        **kwargs: Дополнительные аргументы сигнала
+    """
+    if update_fields is not None and not CATEGORY_COUNT_FIELDS.intersection(update_fields):
+        return
+    previous = getattr(instance, '_counts_state', None)
+    current = instance._counts_state = (instance.category_id, instance.stock > 0)
+    if created or previous is None:
+        schedule_counts_refresh([instance.category_id])
+    elif previous != current:
+        schedule_counts_refresh({previous[0], instance.category_id})
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted_counts(sender: Any, instance: Product, **kwargs: Any) -> None:
+    """
+    Планирует пересчет счетчиков товаров категории удаленного товара.
+    
+    Args:
+        sender: Класс модели
+        instance: Удаленный товар
+        **kwargs: Дополнительные аргументы сигнала
+    """
+    schedule_counts_refresh([instance.category_id])
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender: Any, instance: Product, update_fields: Any = None, **kwargs: Any) -> None:
+    """
+    Обновляет запись товара в поисковом индексе и (после фиксации
+    транзакции) в индексе подсказок. Сохранения, не затрагивающие индексируемые поля, пропускаются.
+    
+    Args:
+        sender: Класс модели
+        instance: Сохраненный товар
+        update_fields: Список сохраненных полей (если указан при save)
+        **kwargs: Дополнительные аргументы сигнала
+    """
+    if update_fields is None or SUGGEST_FIELDS.intersection(update_fields):
+        # Индекс подсказок хранится в памяти процесса: обновляется только после фиксации
+        product_id = instance.pk
+        transaction.on_commit(lambda: suggest_index.update_products([product_id]))
+    if update_fields is not None and not SEARCH_INDEXED_FIELDS.intersection(update_fields):
+        return
+    get_search_backend().index_products([instance.pk])
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender: Any, instance: Product, **kwargs: Any) -> None:
+    """
+    Удаляет товар из поискового индекса и (после фиксации транзакции)
+    из индекса подсказок.
+    
+    Args:
+        sender: Класс модели
+        instance: Удаленный товар
+        **kwargs: Дополнительные аргументы сигнала
+    """
+    get_search_backend().remove_products([instance.pk])
+    product_id = instance.pk
+    transaction.on_commit(lambda: suggest_index.remove_products([product_id]))
+
+
+@receiver(post_save, sender=Category)
+def reindex_category_products(sender: Any, instance: Category, created: bool = False, **kwargs: Any) -> None:
+    """
+    Переиндексирует товары категории после ее изменения (название категории
+    входит в поисковый документ товара).
+    
+    Args:
+        sender: Класс модели
+        instance: Сохраненная категория
+        created: True, если категория только что создана
+        **kwargs: Дополнительные аргументы сигнала
+    """
+    if created:
+        return
+    product_ids = list(instance.products.values_list('id', flat=True))
+    get_search_backend().index_products(product_ids)
+    transaction.on_commit(lambda: suggest_index.update_products(product_ids))
+
+
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+@receiver(post_save, sender=Wishlist)
+@receiver(post_delete, sender=Wishlist)
+def user_activity_changed(sender: Any, instance: Any, **kwargs: Any) -> None:
+    """
+    Сбрасывает кэшированную сводку активности владельца заказа, отзыва
+    или записи избранного.
+    
+    Args:
+        sender: Класс модели
+        instance: Измененный объект
+        **kwargs: Дополнительные аргументы сигнала
+    """
+    invalidate_user_activity(instance.user_id)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+@receiver(post_save, sender=Wishlist)
+@receiver(post_delete, sender=Wishlist)
+def home_rails_changed(sender: Any, instance: Any, **kwargs: Any) -> None:
+    """
+    Планирует обновление подборок главной страницы, в которые входят
+    данные измененной модели.
+    
+    Args:
+        sender: Класс модели
+        instance: Измененный объект
+        **kwargs: Дополнительные аргументы сигнала
+    """
+    schedule_rails_refresh(RAILS_BY_MODEL[sender])
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def model_version_changed(sender: Any, instance: Any, **kwargs: Any) -> None:
+    """
+    Увеличивает версию данных модели после фиксации транзакции:
+    кэшированные значения с этой версией в ключе становятся устаревшими.
+    Данные заказов кэшируются по пользователям (main.activity) и
+    сбрасываются явно, поэтому версия заказов не ведется.
+    
+    Args:
+        sender: Класс модели
+        instance: Измененный объект
+        **kwargs: Дополнительные аргументы сигнала
+    """
+    bump_model_version_on_commit(sender)
@@ -0,0 +1,52 @@
+"""
+Кэшируемая статистика каталога.
+
+Счетчики товаров нужны нескольким экранам, но меняются только при записи
+товаров, поэтому они вычисляются одним агрегирующим запросом и хранятся
+в кэше Django под ключом с версией товаров (см. main.caching): изменение
+каталога увеличивает версию, и следующий запрос вычисляет статистику заново.
+"""
+
+from typing import Dict
+
+from django.db.models import Count, Q
+
+from . import caching
+from .models import Product
+
+CATALOG_STATS_TIMEOUT = 60 * 60  # Страховочный срок жизни, основное обновление - по версии товаров
+
+
+def compute_catalog_stats() -> Dict[str, int]:
+    """
+    Вычисляет статистику каталога одним запросом.
+    
+    Returns:
+        Словарь с общим количеством товаров, товаров в наличии,
+        доступных для заказа и со скидкой
+    """
+    return Product.objects.aggregate(
+        products_count=Count('id'),
+        products_in_stock=Count('id', filter=Q(stock__gt=0)),
+        products_available=Count('id', filter=Q(is_available=True)),
+        products_with_discount=Count('id', filter=Q(discount__gt=0)),
+    )
+
+
+def get_catalog_stats() -> Dict[str, int]:
+    """
+    Возвращает статистику каталога из кэша, вычисляя ее при промахе.
+    
+    Returns:
+        Словарь со статистикой каталога
+    """
+    key = caching.versioned_key('main', 'catalog_stats', [Product])
+    return caching.get_or_set(key, compute_catalog_stats, CATALOG_STATS_TIMEOUT)
+
+
+def invalidate_catalog_stats() -> None:
+    """
+    Сбрасывает кэш статистики каталога, увеличивая версию товаров.
+    Вызывается сигналами Product и после массовых обновлений через QuerySet.update().
+    """
+    caching.bump_model_version(Product)
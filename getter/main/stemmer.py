@@ -0,0 +1,163 @@
+"""
+Стеммер для русского языка и нормализация текста для поискового индекса.
+
+Реализует алгоритм Snowball для русского языка без внешних зависимостей,
+чтобы основы слов в индексе SQLite FTS5 и в поисковом запросе совпадали.
+"""
+
+import re
+from typing import List, Optional, Sequence, Tuple
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+_VOWELS = 'аеиоуыэюя'
+_PERFECTIVE_GERUND_1 = ('вшись', 'вши', 'в')
+_PERFECTIVE_GERUND_2 = ('ившись', 'ывшись', 'ивши', 'ывши', 'ив', 'ыв')
+_REFLEXIVE = ('ся', 'сь')
+_ADJECTIVE = (
+    'ими', 'ыми', 'его', 'ого', 'ему', 'ому', 'ее', 'ие', 'ые', 'ое', 'ей', 'ий', 'ый', 'ой',
+    'ем', 'им', 'ым', 'ом', 'их', 'ых', 'ую', 'юю', 'ая', 'яя', 'ою', 'ею',
+)
+_PARTICIPLE_1 = ('ем', 'нн', 'вш', 'ющ', 'щ')
+_PARTICIPLE_2 = ('ивш', 'ывш', 'ующ')
+_VERB_1 = ('ете', 'йте', 'ешь', 'нно', 'ла', 'на', 'ли', 'ем', 'ло', 'но', 'ет', 'ют', 'ны', 'ть', 'й', 'л', 'н')
+_VERB_2 = (
+    'ейте', 'уйте', 'ила', 'ыла', 'ена', 'ите', 'или', 'ыли', 'ило', 'ыло', 'ено', 'ует', 'уют',
+    'ены', 'ить', 'ыть', 'ишь', 'ей', 'уй', 'ил', 'ыл', 'им', 'ым', 'ен', 'ят', 'ит', 'ыт', 'ую', 'ю',
+)
+_NOUN = (
+    'иями', 'ями', 'ами', 'ией', 'иям', 'ием', 'иях', 'ев', 'ов', 'ие', 'ье', 'еи', 'ии', 'ей', 'ой',
+    'ий', 'ям', 'ем', 'ам', 'ом', 'ах', 'ях', 'ию', 'ью', 'ия', 'ья', 'а', 'е', 'и', 'й', 'о', 'у',
+    'ы', 'ь', 'ю', 'я',
+)
+_SUPERLATIVE = ('ейше', 'ейш')
+_DERIVATIONAL = ('ость', 'ост')
+
+
+def _regions(word: str) -> Tuple[int, int]:
+    """
+    Вычисляет начало областей RV и R2 слова.
+
+    Args:
+        word: Слово в нижнем регистре
+
+    Returns:
+        Кортеж из индексов начала RV и R2
+    """
+    rv = len(word)
+    for i, char in enumerate(word):
+        if char in _VOWELS:
+            rv = i + 1
+            break
+
+    def next_region(start: int) -> int:
+        for i in range(start + 1, len(word)):
+            if word[i] not in _VOWELS and word[i - 1] in _VOWELS:
+                return i + 1
+        return len(word)
+
+    r1 = next_region(0)
+    return rv, next_region(r1)
+
+
+def _strip(word: str, start: int, suffixes: Sequence[str], preceded_by: str = '') -> Optional[str]:
+    """
+    Удаляет самое длинное подходящее окончание внутри области слова.
+
+    Args:
+        word: Слово
+        start: Начало области, в которой ищется окончание
+        suffixes: Возможные окончания
+        preceded_by: Буквы, одна из которых должна стоять перед окончанием
+
+    Returns:
+        Слово без окончания или None, если окончание не найдено
+    """
+    region = word[start:]
+    for suffix in sorted(suffixes, key=len, reverse=True):
+        if region.endswith(suffix):
+            stem = word[:-len(suffix)]
+            if preceded_by and (len(stem) <= start or stem[-1] not in preceded_by):
+                continue
+            return stem
+    return None
+
+
+def stem_russian(word: str) -> str:
+    """
+    Приводит слово к основе по алгоритму Snowball для русского языка.
+    Слова не на кириллице возвращаются без изменений.
+
+    Args:
+        word: Слово в нижнем регистре
+
+    Returns:
+        Основа слова
+    """
+    word = word.replace('ё', 'е')
+    if not any(char in _VOWELS for char in word):
+        return word
+    rv, r2 = _regions(word)
+
+    # Шаг 1: деепричастия, возвратные частицы, прилагательные, глаголы, существительные
+    stem = _strip(word, rv, _PERFECTIVE_GERUND_1, 'ая') or _strip(word, rv, _PERFECTIVE_GERUND_2)
+    if stem is None:
+        word = _strip(word, rv, _REFLEXIVE) or word
+        adjective = _strip(word, rv, _ADJECTIVE)
+        if adjective is not None:
+            stem = (
+                _strip(adjective, rv, _PARTICIPLE_1, 'ая')
+                or _strip(adjective, rv, _PARTICIPLE_2)
+                or adjective
+            )
+        else:
+            stem = (
+                _strip(word, rv, _VERB_1, 'ая')
+                or _strip(word, rv, _VERB_2)
+                or _strip(word, rv, _NOUN)
+            )
+    word = stem if stem is not None else word
+
+    # Шаг 2: окончание "и"
+    if word[rv:].endswith('и'):
+        word = word[:-1]
+
+    # Шаг 3: словообразовательные суффиксы в R2
+    word = _strip(word, r2, _DERIVATIONAL) or word
+
+    # Шаг 4: превосходная степень, двойное "н", мягкий знак
+    if word[rv:].endswith('нн'):
+        return word[:-1]
+    superlative = _strip(word, rv, _SUPERLATIVE)
+    if superlative is not None:
+        word = superlative
+        return word[:-1] if word[rv:].endswith('нн') else word
+    if word[rv:].endswith('ь'):
+        return word[:-1]
+    return word
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """
+    Разбивает текст на слова в нижнем регистре.
+
+    Args:
+        text: Исходный текст
+
+    Returns:
+        Список слов
+    """
+    return TOKEN_RE.findall((text or '').lower())
+
+
+def normalize_text(text: Optional[str]) -> str:
+    """
+    Приводит все слова текста к основам для записи в FTS5-индекс.
+
+    Args:
+        text: Исходный текст
+
+    Returns:
+        Строка основ слов, разделенных пробелами
+    """
+    return ' '.join(stem_russian(token) for token in tokenize(text))
@@ -0,0 +1,251 @@
+"""
+Подсказки для строки поиска (typeahead).
+
+Подсказки отдаются из префиксного индекса в памяти процесса: отсортированный
+список пар (слово, id товара) по названиям, артикулам и названиям категорий.
+Поиск по префиксу - это двоичный поиск и проход по соседним элементам,
+поэтому запрос обслуживается без обращения к базе данных.
+
+Индекс строится при первом обращении, обновляется инкрементально сигналами
+при изменении товаров и категорий в этом процессе и полностью перестраивается
+раз в SUGGEST_INDEX_MAX_AGE секунд, чтобы подхватить изменения, сделанные
+другими процессами (воркерами, Celery, админкой на другом сервере).
+Устаревший индекс перестраивается в фоновом потоке, который запускает
+только один запрос; до окончания перестроения запросы обслуживаются
+прежним индексом.
+"""
+
+import threading
+import time
+from bisect import bisect_left, insort
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import connections
+
+from .models import Product
+from .stemmer import tokenize
+
+# Вес совпадения в зависимости от поля: название важнее артикула и категории
+FIELD_WEIGHTS = {'name': 3, 'sku': 2, 'category': 1}
+
+
+class SuggestIndex:
+    """
+    Префиксный индекс товаров для подсказок поиска.
+
+    Attributes:
+        max_age: Время жизни индекса в секундах до полного перестроения
+    """
+
+    def __init__(self, max_age: Optional[int] = None):
+        self.max_age = max_age
+        self._lock = threading.RLock()
+        self._keys: List[Tuple[str, int, str]] = []
+        self._entries: Dict[int, Dict[str, Any]] = {}
+        self._tokens: Dict[int, List[Tuple[str, int, str]]] = {}
+        self._built_at: Optional[float] = None
+        # Полное перестроение выполняется только одним потоком
+        self._build_lock = threading.Lock()
+        self._refreshing = False
+
+    @staticmethod
+    def _products(product_ids: Optional[Iterable[int]] = None):
+        products = Product.objects.select_related('category').only(
+            'id', 'name', 'sku', 'price', 'image', 'is_available', 'category__name'
+        )
+        if product_ids is not None:
+            products = products.filter(id__in=list(product_ids))
+        return products.iterator(chunk_size=1000)
+
+    @staticmethod
+    def _make_entry(product: Product) -> Tuple[Dict[str, Any], List[Tuple[str, int, str]]]:
+        """
+        Готовит данные товара для ответа и ключи индекса.
+
+        Args:
+            product: Товар с загруженной категорией
+
+        Returns:
+            Кортеж (данные для ответа, список ключей индекса)
+        """
+        entry = {
+            'id': product.id,
+            'name': product.name,
+            'price': float(product.price),
+            'image': product.image.name if product.image else None,
+            'category': {'name': product.category.name},
+            'is_available': product.is_available,
+        }
+        keys = set()
+        for field, text in (('name', product.name), ('sku', product.sku), ('category', product.category.name)):
+            for token in tokenize(text.replace('ё', 'е').replace('Ё', 'Е')):
+                keys.add((token, product.id, field))
+        return entry, sorted(keys)
+
+    def build(self) -> None:
+        """
+        Полностью перестраивает индекс по текущему каталогу.
+        """
+        keys: List[Tuple[str, int, str]] = []
+        entries: Dict[int, Dict[str, Any]] = {}
+        tokens: Dict[int, List[Tuple[str, int, str]]] = {}
+        for product in self._products():
+            entry, product_keys = self._make_entry(product)
+            entries[product.id] = entry
+            tokens[product.id] = product_keys
+            keys.extend(product_keys)
+        keys.sort()
+        with self._lock:
+            self._keys, self._entries, self._tokens = keys, entries, tokens
+            self._built_at = time.monotonic()
+
+    def ensure_fresh(self) -> None:
+        """
+        Строит индекс, если он еще не построен, и запускает фоновое
+        перестроение, если он устарел.
+        """
+        if self._built_at is None:
+            with self._build_lock:
+                # Индекс мог построить другой поток, пока этот ждал блокировку
+                if self._built_at is None:
+                    self.build()
+            return
+        if not self.max_age or time.monotonic() - self._built_at <= self.max_age:
+            return
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        self._start_refresh()
+
+    def _start_refresh(self) -> None:
+        """
+        Запускает перестроение индекса в фоновом потоке.
+        """
+        def run() -> None:
+            try:
+                self._refresh()
+            finally:
+                # Соединение с базой данных открыто в этом потоке
+                connections.close_all()
+
+        threading.Thread(target=run, name='suggest-index-refresh', daemon=True).start()
+
+    def _refresh(self) -> None:
+        """
+        Перестраивает устаревший индекс и снимает отметку перестроения.
+        """
+        try:
+            with self._build_lock:
+                self.build()
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def invalidate(self) -> None:
+        """
+        Помечает индекс как требующий перестроения при следующем запросе.
+        """
+        with self._lock:
+            self._built_at = None
+
+    def update_products(self, product_ids: Iterable[int]) -> None:
+        """
+        Обновляет записи товаров в индексе (добавляет новые, заменяет измененные).
+
+        Args:
+            product_ids: ID измененных товаров
+        """
+        if self._built_at is None:
+            # Индекс еще не построен - актуальные данные попадут в него при построении
+            return
+        product_ids = list(product_ids)
+        if not product_ids:
+            return
+        products = list(self._products(product_ids))
+        with self._lock:
+            for product_id in product_ids:
+                self._remove(product_id)
+            for product in products:
+                entry, product_keys = self._make_entry(product)
+                self._entries[product.id] = entry
+                self._tokens[product.id] = product_keys
+                for key in product_keys:
+                    insort(self._keys, key)
+
+    def remove_products(self, product_ids: Iterable[int]) -> None:
+        """
+        Удаляет товары из индекса.
+
+        Args:
+            product_ids: ID удаленных товаров
+        """
+        with self._lock:
+            for product_id in product_ids:
+                self._remove(product_id)
+
+    def _remove(self, product_id: int) -> None:
+        self._entries.pop(product_id, None)
+        for key in self._tokens.pop(product_id, ()):
+            position = bisect_left(self._keys, key)
+            if position < len(self._keys) and self._keys[position] == key:
+                del self._keys[position]
+
+    def _match(self, prefix: str) -> Dict[int, int]:
+        """
+        Находит товары, у которых есть слово с заданным префиксом.
+
+        Args:
+            prefix: Префикс слова
+
+        Returns:
+            Словарь {id товара: вес лучшего совпадения}
+        """
+        scores: Dict[int, int] = {}
+        keys = self._keys
+        position = bisect_left(keys, (prefix,))
+        while position < len(keys) and keys[position][0].startswith(prefix):
+            token, product_id, field = keys[position]
+            # Полное совпадение слова ценнее совпадения по префиксу
+            score = FIELD_WEIGHTS[field] * 2 + (token == prefix)
+            if score > scores.get(product_id, 0):
+                scores[product_id] = score
+            position += 1
+        return scores
+
+    def suggest(self, query: str, limit: int = 5) -> List[Dict[str, Any]]:
+        """
+        Возвращает товары, в названии, артикуле или категории которых
+        есть слова, начинающиеся с каждого слова запроса.
+
+        Args:
+            query: Введенный пользователем текст
+            limit: Максимальное количество подсказок
+
+        Returns:
+            Список товаров в порядке релевантности
+        """
+        words = tokenize(query.replace('ё', 'е').replace('Ё', 'Е'))
+        if not words:
+            return []
+        self.ensure_fresh()
+        with self._lock:
+            scores: Optional[Dict[int, int]] = None
+            for word in dict.fromkeys(words):
+                matches = self._match(word)
+                if scores is None:
+                    scores = matches
+                else:
+                    scores = {pid: score + matches[pid] for pid, score in scores.items() if pid in matches}
+                if not scores:
+                    return []
+            entries = self._entries
+            ranked = sorted(
+                scores,
+                key=lambda pid: (-scores[pid], not entries[pid]['is_available'], len(entries[pid]['name']), pid),
+            )
+            return [entries[pid] for pid in ranked[:limit]]
+
+
+suggest_index = SuggestIndex(max_age=getattr(settings, 'SUGGEST_INDEX_MAX_AGE', 300))
@@ -1,9 +1,12 @@
 from celery import shared_task
 from django.utils import timezone
-from django.db.models import Avg, Count, F, Sum
-from django.core.mail import send_mail
-from django.conf import settings
+from django.db.models import Avg, Count, Sum
 from .models import Product, Order, Category, Review
+from .rails import refresh_rails
+from .stats import invalidate_catalog_stats
+from .caching import bump_model_version
+from .order_status import apply_time_based_transitions, process_status_events
+from .review_cleanup import delete_invalid_reviews
 import logging
 from typing import Dict, List, Any, Optional, Union
 
@@ -18,15 +21,37 @@ def update_product_availability(*args, **kwargs) -> Dict[str, int]:
     Returns:
         Словарь с количеством обновленных товаров
     """
-    updated = Product.objects.filter(stock=0, is_available=True).update(is_available=False)
+    # updated_at обновляется явно: по нему вычисляются ETag и Last-Modified каталога
+    updated = Product.objects.filter(stock=0, is_available=True).update(is_available=False, updated_at=timezone.now())
     logger.info(f"Обновлено {updated} товаров со статусом 'недоступен'")
     
     # Также можно помечать товары как доступные, если они снова в наличии
-    restored = Product.objects.filter(stock__gt=0, is_available=False).update(is_available=True)
+    restored = Product.objects.filter(stock__gt=0, is_available=False).update(is_available=True, updated_at=timezone.now())
     logger.info(f"Восстановлено {restored} товаров со статусом 'доступен'")
     
+    # QuerySet.update() не отправляет сигналы, поэтому сбрасываем кэш явно
+    if updated or restored:
+        invalidate_catalog_stats()
+    
     return {'updated': updated, 'restored': restored}
 
+@shared_task
+def refresh_home_rails(*args, names: Optional[List[str]] = None, **kwargs) -> Dict[str, List[str]]:
+    """
+    Периодическая задача для обновления подборок главной страницы
+    (новинки, популярные товары, популярные в избранном, последние отзывы).
+    Также ставится в очередь с задержкой после изменения данных (см. main.rails).
+    
+    Args:
+        names: Названия подборок (по умолчанию все)
+    
+    Returns:
+        Словарь со списком обновленных подборок
+    """
+    refreshed = refresh_rails(names)
+    logger.info(f"Обновлены подборки главной страницы: {', '.join(refreshed)}")
+    return {'refreshed': refreshed}
+
 @shared_task
 def generate_daily_sales_report() -> Dict[str, Any]:
     """
@@ -76,47 +101,59 @@ def update_order_statuses(*args, **kwargs) -> Dict[str, int]:
     """
     Периодическая задача для автоматического обновления статусов заказов
     на основе времени их создания/обновления.
+    Каждый переход выполняется одним UPDATE (см. main.order_status).
     
     Returns:
         Словарь с количеством обновленных заказов по статусам
     """
-    from .models import Order
-    
-    updated_counts = {'canceled': 0, 'delivered': 0}
-    
-    # Получаем все заказы в ожидании или отправленные
-    orders = Order.objects.filter(status__in=['pending', 'shipped'])
-    
-    for order in orders:
-        # Вызываем метод обновления статуса для каждого заказа
-        if order.update_status_by_time():
-            if order.status == 'canceled':
-                updated_counts['canceled'] += 1
-            elif order.status == 'delivered':
-                updated_counts['delivered'] += 1
+    changed = apply_time_based_transitions()
+    updated_counts = {status: len(order_ids) for status, order_ids in changed.items()}
     
     logger.info(f"Обновлены статусы заказов: {updated_counts}")
     return updated_counts
 
+@shared_task
+def process_order_status_events(*args, **kwargs) -> Dict[str, int]:
+    """
+    Обрабатывает события смены статусов заказов пакетами (см. main.order_status):
+    возвращает товар отмененных заказов на склад, ставит в очередь уведомления
+    и сбрасывает кэш. Запускается после массовой смены статусов и периодически,
+    чтобы обработать события, если постановка в очередь не удалась.
+    
+    Returns:
+        Словарь с количеством обработанных событий, заказов с возвратом товара и уведомлений
+    """
+    processed = process_status_events()
+    
+    logger.info(f"Обработаны события смены статусов заказов: {processed}")
+    return processed
+
 @shared_task
 def calculate_product_ratings() -> Dict[str, int]:
     """
-    Периодическая задача для пересчета средних рейтингов товаров.
+    Периодическая задача для исправления расхождений в сохраненных рейтингах товаров.
+    Агрегаты обновляются инкрементально при изменении отзывов, здесь они
+    сверяются с таблицей отзывов и пересчитываются только для расходящихся товаров.
     
     Returns:
-        Словарь с количеством обновленных товаров и средним рейтингом
+        Словарь с количеством исправленных товаров, товаров с отзывами и средним рейтингом
     """
-    products_with_reviews = Product.objects.annotate(
-        review_count=Count('reviews'),
-        avg_rating=Avg('reviews__rating')
-    ).filter(review_count__gt=0)
+    drifted_ids = list(Product.objects.with_rating_drift().values_list('id', flat=True))
+    repaired = Product.objects.refresh_ratings(drifted_ids) if drifted_ids else 0
+    if repaired:
+        bump_model_version(Review)
     
+    products_with_reviews = Product.objects.filter(rating_count__gt=0)
     count = products_with_reviews.count()
-    avg_site_rating = products_with_reviews.aggregate(Avg('avg_rating'))['avg_rating__avg'] or 0
+    avg_site_rating = products_with_reviews.aggregate(Avg('average_rating'))['average_rating__avg'] or 0
     
-    logger.info(f"Пересчитаны рейтинги для {count} товаров. Средний рейтинг по сайту: {avg_site_rating:.2f}")
+    logger.info(
+        f"Исправлены рейтинги для {repaired} товаров. Товаров с отзывами: {count}. "
+        f"Средний рейтинг по сайту: {avg_site_rating:.2f}"
+    )
     
     return {
+        'repaired_products': repaired,
         'updated_products': count,
         'average_site_rating': float(avg_site_rating)
     }
@@ -125,27 +162,15 @@ def calculate_product_ratings() -> Dict[str, int]:
 def clean_old_reviews(*args, **kwargs) -> Dict[str, int]:
     """
     Периодическая задача для удаления отзывов без текста или с некорректными комментариями.
+    Отзывы удаляются диапазонами первичного ключа (см. main.review_cleanup).
     
     Returns:
         Словарь с количеством удаленных отзывов
     """
-    # Удаляем отзывы без комментария
-    deleted_empty, _ = Review.objects.filter(
-        comment__isnull=True
-    ).delete()
-    
-    # Для удаления отзывов с некорректными комментариями, содержащими <generator object>,
-    # нужно проверить каждый отзыв индивидуально, так как Django ORM не поддерживает поиск по таким строкам
-    deleted_invalid = 0
-    reviews = Review.objects.all()
-    for review in reviews:
-        comment_str = str(review.comment)
-        if "<generator object" in comment_str:
-            review.delete()
-            deleted_invalid += 1
-    
-    total_deleted = deleted_empty + deleted_invalid
-    
-    logger.info(f"Удалено {deleted_empty} отзывов без текста и {deleted_invalid} отзывов с некорректными комментариями")
-    
-    return {'deleted_reviews': total_deleted} 
\ No newline at end of file
+    deleted = delete_invalid_reviews()
+    
+    logger.info(
+        f"Удалено {deleted['empty']} отзывов без текста и {deleted['invalid']} отзывов с некорректными комментариями"
+    )
+    
+    return {'deleted_reviews': deleted['empty'] + deleted['invalid']}
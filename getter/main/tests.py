@@ -1,12 +1,41 @@
+import json
 from django.test import TestCase
+from django.core.cache import cache
+from django.db import IntegrityError, connection, transaction
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from rest_framework.test import APITestCase, APIClient
+from rest_framework.request import Request
+from rest_framework.test import APITestCase, APIClient, APIRequestFactory
 from rest_framework import status
 from django.utils import timezone
+from datetime import timedelta
 from decimal import Decimal
-from .models import Category, Product, Order, OrderItem, Review
+from . import caching
+from .activity import compute_user_activity, get_user_activity
+from .models import Category, Product, Order, OrderItem, OrderStatusEvent, Review, Wishlist
+from .rails import refresh_rails
+from .serializers import ProductListSerializer, ProductSerializer
+from .stats import get_catalog_stats
+from .suggest import suggest_index
 from users.models import User
 
+
+def count_queries(func, *args, **kwargs) -> int:
+    """Считает SQL-запросы вызова без служебных запросов профилировщика Silk (EXPLAIN, таблицы silk_*, точки сохранения) в режиме DEBUG"""
+    with CaptureQueriesContext(connection) as context:
+        func(*args, **kwargs)
+    return len([
+        q for q in context.captured_queries
+        if not q['sql'].startswith(('EXPLAIN', 'SAVEPOINT', 'RELEASE SAVEPOINT')) and '"silk_' not in q['sql']
+    ])
+
+def run_tasks_eagerly(test_case) -> None:
+    """Выполняет задачи Celery синхронно до конца теста (в том числе поставленные после фиксации транзакции)"""
+    from getter.celery import app as celery_app
+
+    celery_app.conf.task_always_eager = True
+    test_case.addCleanup(setattr, celery_app.conf, 'task_always_eager', False)
+
 class CategoryModelTests(TestCase):
     def setUp(self):
         self.category = Category.objects.create(name='Тестовая категория')
@@ -180,8 +209,8 @@ class ProductAPITests(APITestCase):
         """Тест получения списка продуктов"""
         response = self.client.get(self.product_list_url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertTrue(len(response.data) > 0)
-        product_names = [p['name'] for p in response.data]
+        self.assertTrue(len(response.data['results']) > 0)
+        product_names = [p['name'] for p in response.data['results']]
         self.assertIn('Тестовый продукт', product_names)
 
     def test_product_detail(self):
@@ -191,3 +220,1220 @@ class ProductAPITests(APITestCase):
         self.assertEqual(response.data['name'], 'Тестовый продукт')
         self.assertEqual(response.data['price'], '100.00')
         self.assertEqual(response.data['discount'], 10)
+
+class ProductRatingAggregateTests(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.admin = User.objects.create_superuser(
+            username='admin',
+            email='admin@example.com',
+            password='adminpassword123'
+        )
+        self.category = Category.objects.create(name='Тестовая категория')
+        self.product = Product.objects.create(
+            sku='TEST001',
+            name='Тестовый продукт',
+            price=Decimal('100.00'),
+            stock=50,
+            category=self.category
+        )
+        self.client.force_authenticate(user=self.admin)
+
+    def test_review_create_and_delete_update_aggregates(self):
+        """Тест инкрементального обновления рейтинга при создании и удалении отзыва"""
+        url = reverse('review-list-create', kwargs={'product_id': self.product.pk})
+        response = self.client.post(url, {'rating': 4, 'comment': 'Хорошо'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.client.post(url, {'rating': 2, 'comment': 'Так себе'}, format='json')
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.rating_count, 2)
+        self.assertEqual(self.product.rating_sum, 6)
+        self.assertAlmostEqual(self.product.average_rating, 3.0)
+
+        review_id = response.data['id']
+        delete_url = reverse('review-detail', kwargs={'product_id': self.product.pk, 'review_id': review_id})
+        response = self.client.delete(delete_url)
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.rating_count, 1)
+        self.assertAlmostEqual(self.product.average_rating, 2.0)
+
+    def test_calculate_product_ratings_repairs_drift(self):
+        """Тест исправления расхождений в сохраненном рейтинге"""
+        from .tasks import calculate_product_ratings
+
+        Review.objects.create(user=self.admin, product=self.product, rating=5, comment='Отлично')
+        self.assertEqual(Product.objects.with_rating_drift().count(), 1)
+
+        result = calculate_product_ratings()
+        self.assertEqual(result['repaired_products'], 1)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.rating_count, 1)
+        self.assertAlmostEqual(self.product.average_rating, 5.0)
+        self.assertFalse(Product.objects.with_rating_drift().exists())
+
+class ProductCursorPaginationTests(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.category = Category.objects.create(name='Тестовая категория')
+        # Одинаковые скидки проверяют устойчивость сортировки по id
+        for i in range(7):
+            Product.objects.create(
+                sku=f'SKU{i:03d}',
+                name=f'Товар {i}',
+                price=Decimal('100.00') + i,
+                discount=10 if i % 2 else 0,
+                stock=5,
+                category=self.category
+            )
+        self.url = reverse('product-list')
+
+    def collect_pages(self, params):
+        """Обходит все страницы по ссылкам next и возвращает id товаров"""
+        ids = []
+        response = self.client.get(self.url, params)
+        while True:
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            ids.extend(p['id'] for p in response.data['results'])
+            if not response.data['next']:
+                return ids, response
+            response = self.client.get(response.data['next'])
+
+    def test_pages_cover_catalog_without_duplicates(self):
+        """Тест обхода каталога по курсору для каждой сортировки"""
+        for ordering in ('-creation_date', 'price', '-name', 'discount', '-discount'):
+            ids, _ = self.collect_pages({'ordering': ordering, 'page_size': 3})
+            self.assertEqual(len(ids), 7, ordering)
+            self.assertEqual(len(set(ids)), 7, ordering)
+
+        ids, _ = self.collect_pages({'ordering': 'discount', 'page_size': 2})
+        expected = list(Product.objects.order_by('discount', 'id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+
+    def test_previous_link_returns_previous_page(self):
+        """Тест перехода на предыдущую страницу"""
+        first = self.client.get(self.url, {'ordering': 'price', 'page_size': 3})
+        second = self.client.get(first.data['next'])
+        back = self.client.get(second.data['previous'])
+        self.assertEqual(
+            [p['id'] for p in back.data['results']],
+            [p['id'] for p in first.data['results']]
+        )
+
+    def test_total_is_opt_in(self):
+        """Тест получения общего количества только по запросу"""
+        response = self.client.get(self.url)
+        self.assertNotIn('total', response.data)
+        response = self.client.get(self.url, {'with_total': 'true'})
+        self.assertEqual(response.data['total'], 7)
+
+    def test_invalid_cursor(self):
+        """Тест обработки поврежденного курсора"""
+        response = self.client.get(self.url, {'cursor': 'broken'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+class CatalogStatsTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.category = Category.objects.create(name='Тестовая категория')
+        self.product = Product.objects.create(
+            sku='TEST001',
+            name='Тестовый продукт',
+            price=Decimal('100.00'),
+            discount=10,
+            stock=5,
+            category=self.category
+        )
+        Product.objects.create(
+            sku='TEST002',
+            name='Товар без остатка',
+            price=Decimal('50.00'),
+            stock=0,
+            category=self.category
+        )
+        self.url = reverse('catalog-stats')
+
+    def test_stats_endpoint(self):
+        """Тест получения статистики каталога"""
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {
+            'products_count': 2,
+            'products_in_stock': 1,
+            'products_available': 2,
+            'products_with_discount': 1,
+        })
+
+    def test_stats_cached_and_invalidated_on_save(self):
+        """Тест кэширования статистики и сброса кэша при изменении товара"""
+        get_catalog_stats()
+        with self.assertNumQueries(0):
+            get_catalog_stats()
+
+        self.product.discount = 0
+        self.product.save()
+        self.assertEqual(get_catalog_stats()['products_with_discount'], 0)
+
+    def test_stats_invalidated_after_bulk_update(self):
+        """Тест сброса кэша после массового обновления доступности"""
+        from .tasks import update_product_availability
+
+        self.assertEqual(get_catalog_stats()['products_available'], 2)
+        update_product_availability()
+        self.assertEqual(get_catalog_stats()['products_available'], 1)
+
+class CategoryListCacheTests(APITestCase):
+    def setUp(self):
+        run_tasks_eagerly(self)
+        cache.clear()
+        self.category = Category.objects.create(name='Тестовая категория')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product = Product.objects.create(
+                sku='CAT001', name='Товар', price=Decimal('10.00'), stock=5, category=self.category
+            )
+            Product.objects.create(sku='CAT002', name='Нет в наличии', price=Decimal('5.00'), stock=0, category=self.category)
+        self.url = reverse('category-list')
+
+    def test_counters_maintained_on_product_writes(self):
+        """Тест пересчета сохраненных счетчиков при изменении и переносе товаров"""
+        self.category.refresh_from_db()
+        self.assertEqual((self.category.products_total, self.category.products_in_stock), (2, 1))
+        other = Category.objects.create(name='Другая категория')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.category = other
+            self.product.save()
+        self.category.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual((self.category.products_total, self.category.products_in_stock), (1, 0))
+        self.assertEqual((other.products_total, other.products_in_stock), (1, 1))
+
+    def test_price_change_skips_counts_refresh(self):
+        """Тест сохранения товара без пересчета счетчиков, если категория и наличие не изменились"""
+        product = Product.objects.get(id=self.product.id)
+        product.price = Decimal('12.00')
+        with CaptureQueriesContext(connection) as context:
+            with self.captureOnCommitCallbacks(execute=True):
+                product.save()
+        self.assertFalse([q for q in context.captured_queries if q['sql'].startswith('UPDATE "main_category"')])
+
+    def test_list_served_from_cache_until_products_change(self):
+        """Тест выдачи списка категорий из кэша и обновления после изменения остатка"""
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(json.loads(response.content)[0]['product_count'], 2)
+        self.assertEqual(count_queries(self.client.get, self.url), 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.stock = 0
+            self.product.save(update_fields=['stock'])
+        data = json.loads(self.client.get(self.url).content)
+        self.assertEqual((data[0]['product_count'], data[0]['in_stock_count']), (2, 0))
+
+
+class ProductFullTextSearchTests(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.phones = Category.objects.create(name='Смартфоны')
+        self.audio = Category.objects.create(name='Аудиотехника')
+        self.headphones = Product.objects.create(
+            sku='HP-100',
+            name='Беспроводные наушники',
+            description='Наушники с активным шумоподавлением',
+            price=Decimal('5000.00'),
+            stock=5,
+            category=self.audio
+        )
+        self.phone = Product.objects.create(
+            sku='PH-200',
+            name='Смартфон Galaxy',
+            description='В комплекте беспроводной наушник',
+            price=Decimal('30000.00'),
+            stock=5,
+            category=self.phones
+        )
+        self.url = reverse('product-list')
+
+    def search(self, query, url=None, **params):
+        """Выполняет поиск и возвращает id найденных товаров по порядку"""
+        response = self.client.get(url or self.url, {'search': query, **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        key = 'products' if url else 'results'
+        return [p['id'] for p in response.data[key]]
+
+    def test_search_matches_word_forms_and_ranks_by_relevance(self):
+        """Тест поиска по словоформам с сортировкой по релевантности"""
+        # Совпадение в названии весит больше, чем в описании
+        self.assertEqual(self.search('беспроводных наушников'), [self.headphones.id, self.phone.id])
+        self.assertEqual(self.search('смартфоны'), [self.phone.id])
+        self.assertEqual(self.search('PH-200'), [self.phone.id])
+        self.assertEqual(self.search('наушники', ordering='-price'), [self.phone.id, self.headphones.id])
+
+    def test_advanced_search_field_filters(self):
+        """Тест полнотекстовых фильтров по отдельным полям в расширенном поиске"""
+        url = reverse('advanced-product-search')
+        response = self.client.get(url, {'name': 'наушник'})
+        self.assertEqual([p['id'] for p in response.data['products']], [self.headphones.id])
+        response = self.client.get(url, {'dropdown': 'true', 'search': 'наушники'})
+        self.assertEqual([p['id'] for p in response.data['products']], [self.headphones.id, self.phone.id])
+
+    def test_index_follows_product_and_category_changes(self):
+        """Тест синхронизации индекса при изменении товара и категории"""
+        self.phone.name = 'Планшет Galaxy'
+        self.phone.save()
+        self.assertEqual(self.search('смартфон'), [self.phone.id])  # осталось название категории
+        self.assertEqual(self.search('планшеты'), [self.phone.id])
+
+        self.phones.name = 'Гаджеты'
+        self.phones.save()
+        self.assertEqual(self.search('смартфон'), [])
+
+        self.headphones.delete()
+        self.assertEqual(self.search('наушники'), [self.phone.id])
+
+class ProductSuggestionTests(APITestCase):
+    def setUp(self):
+        run_tasks_eagerly(self)
+        self.client = APIClient()
+        self.category = Category.objects.create(name='Наушники')
+        self.earbuds = Product.objects.create(
+            sku='EB-001',
+            name='Беспроводные вкладыши',
+            price=Decimal('3000.00'),
+            stock=5,
+            category=self.category
+        )
+        self.headset = Product.objects.create(
+            sku='HS-002',
+            name='Игровая гарнитура',
+            price=Decimal('7000.00'),
+            stock=5,
+            category=self.category
+        )
+        # Индекс живет в памяти процесса, перестраиваем его под данные теста
+        suggest_index.invalidate()
+        self.url = reverse('product-suggestions')
+
+    def test_suggest_by_prefix_of_name_sku_and_category(self):
+        """Тест подсказок по префиксам названия, артикула и категории"""
+        response = self.client.get(self.url, {'q': 'бесп'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([p['id'] for p in response.data['products']], [self.earbuds.id])
+        self.assertEqual(response.data['products'][0]['category'], {'name': 'Наушники'})
+
+        self.assertEqual([p['id'] for p in suggest_index.suggest('hs')], [self.headset.id])
+        self.assertEqual(len(suggest_index.suggest('науш')), 2)
+        self.assertEqual([p['id'] for p in suggest_index.suggest('наушники игр')], [self.headset.id])
+        self.assertEqual(suggest_index.suggest('телевизор'), [])
+
+    def test_suggest_without_queries_and_incremental_update(self):
+        """Тест ответа из памяти без запросов к БД и обновления индекса при изменениях"""
+        suggest_index.suggest('игр')
+        with self.assertNumQueries(0):
+            self.assertEqual([p['id'] for p in suggest_index.suggest('игр')], [self.headset.id])
+
+        # Откаченное изменение не попадает в индекс
+        with transaction.atomic():
+            self.headset.name = 'Гарнитура Max'
+            self.headset.save()
+            transaction.set_rollback(True)
+        self.assertEqual(suggest_index.suggest('max'), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.headset.name = 'Гарнитура Pro'
+            self.headset.save()
+        self.assertEqual(suggest_index.suggest('игр'), [])
+        self.assertEqual([p['id'] for p in suggest_index.suggest('pro')], [self.headset.id])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.earbuds.delete()
+        self.assertEqual(suggest_index.suggest('бесп'), [])
+
+    def test_stale_index_refreshed_once_in_background(self):
+        """Тест единственного фонового перестроения устаревшего индекса"""
+        from unittest import mock
+        from .suggest import SuggestIndex
+
+        index = SuggestIndex(max_age=60)
+        index.build()
+        index._built_at -= 61
+        Product.objects.filter(id=self.headset.id).update(name='Гарнитура Pro')
+        with mock.patch.object(index, '_start_refresh') as start_refresh, self.assertNumQueries(0):
+            # Пока индекс перестраивается, запросы обслуживаются прежним индексом
+            self.assertEqual([p['id'] for p in index.suggest('игр')], [self.headset.id])
+            self.assertEqual([p['id'] for p in index.suggest('игр')], [self.headset.id])
+        start_refresh.assert_called_once_with()
+
+        index._refresh()
+        self.assertFalse(index._refreshing)
+        self.assertEqual(index.suggest('игр'), [])
+        self.assertEqual([p['id'] for p in index.suggest('pro')], [self.headset.id])
+
+class CartServiceTests(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='buyer',
+            email='buyer@example.com',
+            password='testpassword123'
+        )
+        self.client.force_authenticate(user=self.user)
+        self.category = Category.objects.create(name='Тестовая категория')
+        self.product = Product.objects.create(
+            sku='CART001',
+            name='Товар для корзины',
+            price=Decimal('200.00'),
+            discount=10,
+            stock=5,
+            category=self.category
+        )
+        self.url = reverse('add-to-cart')
+
+    def test_add_increments_item_and_total(self):
+        """Тест добавления товара и пересчета стоимости корзины"""
+        response = self.client.post(self.url, {'product_id': self.product.id, 'quantity': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['item']['quantity'], 2)
+        self.assertEqual(response.data['total_price'], 360.0)
+
+        response = self.client.post(self.url, {'product_id': self.product.id, 'quantity': -1})
+        self.assertEqual(response.data['item']['quantity'], 1)
+        self.assertEqual(response.data['total_price'], 180.0)
+        self.assertEqual(OrderItem.objects.filter(order__user=self.user).count(), 1)
+
+        item_id = response.data['item']['id']
+        response = self.client.delete(reverse('remove-from-cart', kwargs={'item_id': item_id}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['total_price'], 0.0)
+
+    def test_total_follows_price_change(self):
+        """Тест стоимости корзины после изменения цены товара между добавлением и удалением"""
+        other = Product.objects.create(sku='CART002', name='Второй товар', price=Decimal('99.99'), discount=15,
+                                       stock=5, category=self.category)
+        self.client.post(self.url, {'product_id': other.id, 'quantity': 3})
+        response = self.client.post(self.url, {'product_id': self.product.id, 'quantity': 1})
+        self.assertAlmostEqual(response.data['total_price'], 180.0 + 3 * 84.99)
+
+        Product.objects.filter(id=self.product.id).update(price=Decimal('300.00'))
+        response = self.client.delete(reverse('remove-from-cart', kwargs={'item_id': response.data['item']['id']}))
+        self.assertAlmostEqual(response.data['total_price'], 3 * 84.99)
+        self.assertEqual(Order.objects.get(user=self.user).total_price, Decimal('254.97'))
+
+    def test_total_matches_checkout_on_half_cent(self):
+        """Тест совпадения стоимости корзины и оформления при цене на половине копейки"""
+        from .checkout import calculate_items_total
+
+        half_cent = Product.objects.create(sku='CART003', name='Товар за 10.05', price=Decimal('10.05'), discount=10,
+                                           stock=5, category=self.category)
+        # 1.15 - 70% = 0.345: ROUND() над float в SQLite дает 0.34
+        float_half_cent = Product.objects.create(sku='CART004', name='Товар за 1.15', price=Decimal('1.15'),
+                                                 discount=70, stock=5, category=self.category)
+        self.assertEqual(half_cent.get_discounted_price(), Decimal('9.05'))
+        self.assertEqual(float_half_cent.get_discounted_price(), Decimal('0.35'))
+        self.client.post(self.url, {'product_id': half_cent.id, 'quantity': 3})
+        self.client.post(self.url, {'product_id': float_half_cent.id, 'quantity': 2})
+        cart = Order.objects.get(user=self.user)
+        items = list(cart.items.select_related('product'))
+        self.assertEqual(cart.total_price, Decimal('27.85'))
+        self.assertEqual(cart.total_price, calculate_items_total(items))
+
+    def test_quantity_limits(self):
+        """Тест ограничения количества остатком на складе и минимумом в 1 штуку"""
+        self.client.post(self.url, {'product_id': self.product.id, 'quantity': 4})
+        response = self.client.post(self.url, {'product_id': self.product.id, 'quantity': 2})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('quantity', response.data)
+        response = self.client.post(self.url, {'product_id': self.product.id, 'quantity': -4})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(OrderItem.objects.get(order__user=self.user).quantity, 4)
+
+        response = self.client.post(self.url, {'product_id': 999999, 'quantity': 1})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('product_id', response.data)
+
+    def test_query_count_does_not_depend_on_cart_size(self):
+        """Тест фиксированного количества запросов при добавлении товара"""
+        from . import cart as cart_service
+
+        cart_service.add_to_cart(self.user, self.product.id, 1)
+        queries = count_queries(cart_service.add_to_cart, self.user, self.product.id, 1)
+        for i in range(5):
+            product = Product.objects.create(
+                sku=f'CART1{i:02d}', name=f'Товар {i}', price=Decimal('10.00'), stock=5, category=self.category
+            )
+            cart_service.add_to_cart(self.user, product.id, 1)
+        self.assertEqual(count_queries(cart_service.add_to_cart, self.user, self.product.id, 1), queries)
+        self.assertLessEqual(queries, 7)
+
+    def test_single_cart_per_user(self):
+        """Тест ограничения: у пользователя может быть только одна корзина"""
+        self.client.post(self.url, {'product_id': self.product.id, 'quantity': 1})
+        self.client.post(self.url, {'product_id': self.product.id, 'quantity': 1})
+        self.assertEqual(Order.objects.filter(user=self.user, status='pending').count(), 1)
+
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Order.objects.create(user=self.user, status='pending')
+        # Оформленных заказов может быть сколько угодно
+        Order.objects.create(user=self.user, status='assembling')
+        Order.objects.create(user=self.user, status='assembling')
+
+class CreateOrderStockTests(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='buyer',
+            email='buyer@example.com',
+            password='testpassword123'
+        )
+        self.client.force_authenticate(user=self.user)
+        self.category = Category.objects.create(name='Тестовая категория')
+        self.product1 = Product.objects.create(
+            sku='STOCK001', name='Товар 1', price=Decimal('100.00'), stock=2, category=self.category
+        )
+        self.product2 = Product.objects.create(
+            sku='STOCK002', name='Товар 2', price=Decimal('50.00'), stock=10, category=self.category
+        )
+        self.cart = Order.objects.create(user=self.user, status='pending')
+        OrderItem.objects.create(order=self.cart, product=self.product1, quantity=2)
+        OrderItem.objects.create(order=self.cart, product=self.product2, quantity=3)
+        self.url = reverse('create-order')
+
+    def test_stock_reserved_and_availability_updated(self):
+        """Тест списания остатков и снятия доступности закончившегося товара"""
+        response = self.client.post(self.url, {'shipping_city': 'Москва'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.product1.refresh_from_db()
+        self.product2.refresh_from_db()
+        self.assertEqual((self.product1.stock, self.product1.is_available), (0, False))
+        self.assertEqual((self.product2.stock, self.product2.is_available), (7, True))
+        self.assertFalse(self.cart.items.exists())
+
+    def test_shortage_report_rolls_back_checkout(self):
+        """Тест отчета о нехватке товара без частичного оформления заказа"""
+        Product.objects.filter(id=self.product1.id).update(stock=1)
+        response = self.client.post(self.url, {}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data['shortages'], [{
+            'product_id': self.product1.id,
+            'sku': 'STOCK001',
+            'name': 'Товар 1',
+            'requested': 2,
+            'available': 1,
+        }])
+        self.product2.refresh_from_db()
+        self.assertEqual(self.product2.stock, 10)
+        self.assertEqual(self.cart.items.count(), 2)
+        self.assertFalse(Order.objects.filter(user=self.user, status='assembling').exists())
+
+    def test_checkout_query_count_does_not_depend_on_cart_size(self):
+        """Тест оформления заказа за фиксированное число запросов"""
+        from . import cart as cart_service
+        from .checkout import create_order_from_cart
+
+        def checkout():
+            cart = cart_service.get_cart(self.user)
+            return create_order_from_cart(self.user, cart, list(cart.items.all()))
+
+        small_cart_queries = count_queries(checkout)
+        order = Order.objects.get(user=self.user, status='assembling')
+        self.assertEqual(order.total_price, Decimal('350.00'))
+        self.assertEqual(order.items.count(), 2)
+        self.assertTrue(order.order_number.startswith('ORD-'))
+
+        for i in range(50):
+            product = Product.objects.create(
+                sku=f'BULK{i:03d}', name=f'Товар {i}', price=Decimal('10.00'), stock=5, category=self.category
+            )
+            OrderItem.objects.create(order=self.cart, product=product, quantity=1)
+        self.assertEqual(count_queries(checkout), small_cart_queries)
+        self.assertLessEqual(small_cart_queries, 14)
+
+class OrderNumberTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpassword123'
+        )
+
+    def test_number_assigned_before_insert(self):
+        """Тест присвоения номера без дополнительного UPDATE заказа"""
+        with CaptureQueriesContext(connection) as context:
+            order = Order.objects.create(user=self.user, status='assembling')
+        order_queries = [q['sql'] for q in context.captured_queries if 'main_order"' in q['sql']]
+        self.assertEqual(len(order_queries), 1)
+        self.assertTrue(order_queries[0].startswith('INSERT'))
+        self.assertRegex(order.order_number, r'^ORD-\d{6}-\d{8}$')
+        order.refresh_from_db()
+        self.assertRegex(order.order_number, r'^ORD-\d{6}-\d{8}$')
+
+    def test_numbers_are_unique(self):
+        """Тест уникальности номеров заказов"""
+        numbers = [Order.objects.create(user=self.user, status='delivered').order_number for _ in range(30)]
+        self.assertEqual(len(set(numbers)), 30)
+
+    def test_number_fits_after_eight_digits(self):
+        """Тест номера заказа после исчерпания восьмизначной порядковой части"""
+        from .order_numbers import ORDER_NUMBER_COUNTER_TABLE
+
+        with connection.cursor() as cursor:
+            cursor.execute(f'UPDATE {ORDER_NUMBER_COUNTER_TABLE} SET value = %s WHERE id = 1', [10 ** 9])
+        order = Order.objects.create(user=self.user, status='delivered')
+        order.refresh_from_db()
+        self.assertRegex(order.order_number, r'^ORD-\d{6}-1000000001$')
+        self.assertLessEqual(len(order.order_number), Order._meta.get_field('order_number').max_length)
+
+class UserOrdersTests(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='buyer',
+            email='buyer@example.com',
+            password='testpassword123'
+        )
+        self.admin = User.objects.create_superuser(
+            username='admin',
+            email='admin@example.com',
+            password='adminpassword123'
+        )
+        self.category = Category.objects.create(name='Тестовая категория')
+        self.product = Product.objects.create(
+            sku='ORD001', name='Товар', price=Decimal('100.00'), stock=50, category=self.category
+        )
+        self.url = reverse('user-orders')
+
+    def create_orders(self, count, status_name='delivered'):
+        """Создает заказы пользователя с одной позицией"""
+        for _ in range(count):
+            order = Order.objects.create(user=self.user, status=status_name, total_price=Decimal('100.00'))
+            OrderItem.objects.create(order=order, product=self.product, quantity=1)
+
+    def test_pages_groups_and_summary(self):
+        """Тест пагинации, группировки по статусу и итогов истории заказов"""
+        self.create_orders(3)
+        self.create_orders(1, 'canceled')
+        Order.objects.create(user=self.user, status='pending')
+        self.client.force_authenticate(user=self.user)
+
+        response = self.client.get(self.url, {'page_size': 3})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['orders']), 3)
+        self.assertEqual(response.data['orders'][0]['items'][0]['name'], 'Товар')
+        self.assertEqual(response.data['total_spent'], 300.0)
+        self.assertEqual(response.data['status_counts'], {
+            'pending_orders': 0, 'completed_orders': 3, 'canceled_orders': 1
+        })
+        self.assertEqual(len(response.data['groups']['completed_orders']) + len(response.data['groups']['canceled_orders']), 3)
+
+        next_page = self.client.get(response.data['next'])
+        self.assertEqual(len(next_page.data['orders']), 1)
+        self.assertIsNone(next_page.data['next'])
+
+    def test_query_count_does_not_depend_on_order_count(self):
+        """Тест отсутствия N+1 запросов при выдаче истории заказов"""
+        self.client.force_authenticate(user=self.user)
+        self.create_orders(2)
+        few = count_queries(self.client.get, self.url)
+        self.create_orders(8)
+        self.assertEqual(count_queries(self.client.get, self.url), few)
+
+    def test_admin_orders_streamed(self):
+        """Тест потоковой выдачи всех заказов администратору"""
+        self.create_orders(2)
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.get(self.url, {'admin': 'true'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        data = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(len(data['orders']), 2)
+        self.assertEqual(data['orders'][0]['user_username'], 'buyer')
+        self.assertEqual(data['total_spent'], 200.0)
+
+
+class UserActivityTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='active',
+            email='active@example.com',
+            password='testpassword123'
+        )
+        self.category = Category.objects.create(name='Тестовая категория')
+        self.product = Product.objects.create(
+            sku='ACT001', name='Товар', price=Decimal('100.00'), stock=50, category=self.category
+        )
+        Order.objects.create(user=self.user, status='delivered', total_price=Decimal('150.00'))
+        Order.objects.create(user=self.user, status='canceled', total_price=Decimal('70.00'))
+        Order.objects.create(user=self.user, status='pending', total_price=Decimal('30.00'))
+        Review.objects.create(user=self.user, product=self.product, rating=4, comment='Хорошо', pros='Цена')
+        Wishlist.objects.create(user=self.user, product=self.product)
+        self.url = reverse('user_activity')
+
+    def test_summary_in_two_queries(self):
+        """Тест вычисления сводки активности не более чем двумя запросами"""
+        self.assertLessEqual(count_queries(compute_user_activity, self.user.id), 2)
+        data = compute_user_activity(self.user.id)
+        self.assertEqual(data['totalOrders'], 2)
+        self.assertEqual(data['totalSpent'], 150.0)
+        self.assertEqual(data['totalReviews'], 1)
+        self.assertEqual(data['wishlistCount'], 1)
+        self.assertEqual(data['recentOrders'][0]['status'], 'canceled')
+        self.assertEqual(data['recentReviews'][0]['product'], {'id': self.product.id, 'name': 'Товар'})
+        self.assertEqual(data['recentReviews'][0]['rating'], 4)
+        self.assertEqual(data['wishlistItems'][0]['product']['price'], 100.0)
+
+    def test_cache_invalidated_by_signals(self):
+        """Тест кэширования сводки и ее сброса при изменении избранного"""
+        get_user_activity(self.user.id)
+        self.assertEqual(count_queries(get_user_activity, self.user.id), 0)
+        Wishlist.objects.filter(user=self.user).get().delete()
+        data, _ = get_user_activity(self.user.id)
+        self.assertEqual(data['wishlistCount'], 0)
+        self.assertEqual(data['wishlistItems'], [])
+
+    def test_not_modified_by_etag(self):
+        """Тест ответа 304 при совпадении ETag"""
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['totalOrders'], 2)
+        etag = response['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        Review.objects.create(user=self.user, product=self.product, rating=5, comment='Отлично')
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['totalReviews'], 2)
+
+
+class OrderStatusTransitionTests(TestCase):
+    def setUp(self):
+        run_tasks_eagerly(self)
+        cache.clear()
+        self.user = User.objects.create_user(username='buyer', email='buyer@example.com', password='testpassword123')
+        other = User.objects.create_user(username='other', email='other@example.com', password='testpassword123')
+        old = timezone.now() - timedelta(days=10)
+        self.stale_cart = Order.objects.create(user=self.user, status='pending')
+        self.fresh_cart = Order.objects.create(user=other, status='pending')
+        self.shipped = Order.objects.create(user=self.user, status='shipped')
+        self.assembling = Order.objects.create(user=self.user, status='assembling')
+        Order.objects.filter(id__in=[self.stale_cart.id, self.shipped.id, self.assembling.id]).update(
+            created_at=old, updated_at=old
+        )
+
+    def test_transitions_in_constant_queries(self):
+        """Тест смены статусов двумя UPDATE и записи событий независимо от количества заказов"""
+        from .tasks import update_order_statuses
+
+        # UPDATE на каждый переход и INSERT событий доставки (для брошенных корзин событий нет)
+        self.assertEqual(count_queries(update_order_statuses), 3)
+        statuses = dict(Order.objects.values_list('id', 'status'))
+        self.assertEqual(statuses[self.stale_cart.id], 'canceled')
+        self.assertEqual(statuses[self.fresh_cart.id], 'pending')
+        self.assertEqual(statuses[self.shipped.id], 'delivered')
+        self.assertEqual(statuses[self.assembling.id], 'assembling')
+
+    def test_fallback_without_update_returning(self):
+        """Тест смены статусов на базах данных без UPDATE ... RETURNING"""
+        from unittest import mock
+        from .order_status import apply_time_based_transitions
+
+        with mock.patch('main.order_status._supports_update_returning', return_value=False):
+            changed = apply_time_based_transitions()
+        self.assertEqual(changed, {'canceled': [self.stale_cart.id], 'delivered': [self.shipped.id]})
+
+    def test_returns_ids_and_invalidates_activity(self):
+        """Тест возврата ID измененных заказов и сброса сводки активности"""
+        from django.core import mail
+        from .order_status import apply_time_based_transitions
+
+        self.assertEqual(get_user_activity(self.user.id)[0]['totalOrders'], 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            changed = apply_time_based_transitions()
+        self.assertEqual(changed, {'canceled': [self.stale_cart.id], 'delivered': [self.shipped.id]})
+        self.assertEqual(get_user_activity(self.user.id)[0]['totalOrders'], 3)
+        self.assertEqual(
+            sorted(OrderStatusEvent.objects.values_list('order_id', 'old_status', 'new_status')),
+            [(self.shipped.id, 'shipped', 'delivered')],
+        )
+        self.assertFalse(OrderStatusEvent.objects.filter(processed_at__isnull=True).exists())
+        # Письмо об отмене брошенной корзины не отправляется
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn(self.shipped.order_number, mail.outbox[0].subject)
+
+
+class OrderStatusEventTests(TestCase):
+    def setUp(self):
+        run_tasks_eagerly(self)
+        cache.clear()
+        category = Category.objects.create(name='Тестовая категория')
+        self.product = Product.objects.create(sku='EVENT001', name='Товар', price=Decimal('10.00'), stock=1, category=category)
+        self.user = User.objects.create_user(username='buyer', email='buyer@example.com', password='testpassword123')
+        self.orders = [
+            Order.objects.create(user=self.user, status='assembling', stock_reserved_at=timezone.now())
+            for _ in range(3)
+        ]
+        for order in self.orders:
+            OrderItem.objects.create(order=order, product=self.product, quantity=2)
+        Product.objects.filter(id=self.product.id).update(stock=0, is_available=False)
+
+    def test_bulk_cancel_restores_stock_and_notifies(self):
+        """Тест массовой отмены: события в outbox, возврат товара на склад и уведомления после фиксации"""
+        from django.core import mail
+        from .models import OrderStatusEvent
+        from .order_status import transition_orders
+
+        with self.captureOnCommitCallbacks(execute=True):
+            changed = transition_orders(Order.objects.filter(id__in=[self.orders[0].id, self.orders[1].id]), 'canceled')
+        self.assertEqual(changed, 2)
+        self.assertFalse(OrderStatusEvent.objects.filter(processed_at__isnull=True).exists())
+        self.assertEqual(
+            sorted(OrderStatusEvent.objects.values_list('order_id', 'old_status', 'new_status')),
+            [(self.orders[0].id, 'assembling', 'canceled'), (self.orders[1].id, 'assembling', 'canceled')],
+        )
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.stock, self.product.is_available), (4, True))
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(mail.outbox[0].to, ['buyer@example.com'])
+
+        # Повторная обработка не возвращает товар второй раз
+        from .order_status import process_status_events
+        self.assertEqual(process_status_events()['events'], 0)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 4)
+
+    def test_stock_returned_only_for_reserved_orders(self):
+        """Тест возврата товара только по заказам с резервом и только один раз"""
+        from .order_status import transition_orders
+
+        cart = Order.objects.create(user=self.user, status='pending')
+        OrderItem.objects.create(order=cart, product=self.product, quantity=3)
+        order = Order.objects.filter(id=self.orders[0].id)
+        steps = [(Order.objects.filter(id=cart.id), 'shipped'), (Order.objects.filter(id=cart.id), 'canceled'),
+                 (order, 'canceled'), (order, 'assembling'), (order, 'canceled')]
+        for queryset, new_status in steps:
+            with self.captureOnCommitCallbacks(execute=True):
+                transition_orders(queryset, new_status)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 2)
+        self.assertIsNone(order.get().stock_reserved_at)
+
+    def test_transition_queries_independent_of_order_count(self):
+        """Тест массовой смены статуса постоянным числом запросов"""
+        from .order_status import transition_orders
+
+        with self.captureOnCommitCallbacks(execute=False):
+            one = count_queries(transition_orders, Order.objects.filter(id=self.orders[0].id), 'shipped')
+            many = count_queries(transition_orders, Order.objects.filter(id__in=[order.id for order in self.orders[1:]]), 'shipped')
+        self.assertEqual(one, many)
+        self.assertEqual(transition_orders(Order.objects.all(), 'shipped'), 0)
+
+
+class ReviewCleanupTests(TestCase):
+    def setUp(self):
+        run_tasks_eagerly(self)
+        cache.clear()
+        category = Category.objects.create(name='Тестовая категория')
+        self.product = Product.objects.create(sku='CLEAN001', name='Товар', price=Decimal('10.00'), stock=5, category=category)
+        users = [
+            User.objects.create_user(username=f'reviewer{index}', email=f'reviewer{index}@example.com', password='testpassword123')
+            for index in range(3)
+        ]
+        self.valid = Review.objects.create(user=users[0], product=self.product, rating=5, comment='Отлично')
+        Review.objects.create(user=users[1], product=self.product, rating=1, comment=None)
+        Review.objects.create(user=users[2], product=self.product, rating=1, comment='<generator object <genexpr> at 0x7f>')
+        Product.objects.refresh_ratings([self.product.id])
+
+    def test_task_deletes_in_chunks_and_refreshes_ratings(self):
+        """Тест удаления некорректных отзывов диапазонами и пересчета рейтинга товара"""
+        from .review_cleanup import delete_invalid_reviews
+
+        with self.captureOnCommitCallbacks(execute=True):
+            deleted = delete_invalid_reviews(chunk_size=1)
+        self.assertEqual(deleted, {'empty': 1, 'invalid': 1})
+        self.assertEqual(list(Review.objects.values_list('id', flat=True)), [self.valid.id])
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.rating_count, self.product.average_rating), (1, 5.0))
+
+    def test_review_added_during_chunk_is_kept(self):
+        """Тест удаления только прочитанных отзывов, если отзыв добавлен перед DELETE"""
+        from django.db import connection
+        from .review_cleanup import _delete_chunk, invalid_reviews
+
+        late_user = User.objects.create_user(username='late', email='late@example.com', password='testpassword123')
+        late = []
+
+        def insert_before_delete(execute, sql, params, many, context):
+            if sql.startswith('DELETE') and Review._meta.db_table in sql and not late:
+                late.append(Review.objects.create(user=late_user, product=self.product, rating=2, comment=None))
+            return execute(sql, params, many, context)
+
+        with self.captureOnCommitCallbacks(execute=True), connection.execute_wrapper(insert_before_delete):
+            deleted = _delete_chunk(invalid_reviews())
+        self.assertEqual(deleted, {'empty': 1, 'invalid': 1})
+        self.assertEqual(sorted(Review.objects.values_list('id', flat=True)), [self.valid.id, late[0].id])
+
+    def test_command_keeps_reviews_without_comment(self):
+        """Тест команды clean_invalid_reviews: удаляются только отзывы с некорректным текстом"""
+        from django.core.management import call_command
+        from io import StringIO
+
+        call_command('clean_invalid_reviews', stdout=StringIO())
+        self.assertEqual(Review.objects.count(), 2)
+        self.assertFalse(Review.objects.filter(comment__contains='<generator object').exists())
+
+
+class HomeRailsTests(APITestCase):
+    def setUp(self):
+        run_tasks_eagerly(self)
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='reviewer',
+            email='reviewer@example.com',
+            password='testpassword123'
+        )
+        self.category = Category.objects.create(name='Тестовая категория')
+        self.product = Product.objects.create(
+            sku='RAIL001', name='Товар', price=Decimal('100.00'), stock=5, category=self.category
+        )
+        Review.objects.create(user=self.user, product=self.product, rating=5, comment='Отлично')
+        Product.objects.apply_rating_change(self.product.id, 5, 1)
+
+    def test_rails_served_from_cache(self):
+        """Тест выдачи подборок главной страницы без запросов к БД"""
+        refresh_rails()
+        for name in ('new-products', 'popular-products', 'popular-wishlist-products', 'recent_reviews'):
+            self.assertEqual(count_queries(self.client.get, reverse(name)), 0)
+        response = self.client.get(reverse('popular-products'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()[0]['id'], self.product.id)
+        self.assertIn('public', response['Cache-Control'])
+
+        response = self.client.get(reverse('popular-products'), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_rails_refreshed_after_commit(self):
+        """Тест обновления подборок после фиксации изменения избранного"""
+        self.assertEqual(self.client.get(reverse('popular-wishlist-products')).json(), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            Wishlist.objects.create(user=self.user, product=self.product)
+        response = self.client.get(reverse('popular-wishlist-products'))
+        self.assertEqual([product['id'] for product in response.json()], [self.product.id])
+
+
+    def test_refresh_debounced_and_skipped_on_rollback(self):
+        """Тест одной отложенной задачи обновления подборок на несколько изменений и ее отсутствия при откате"""
+        from unittest import mock
+        from .rails import RAIL_REFRESH_DELAY
+        from .tasks import refresh_home_rails
+
+        with mock.patch.object(refresh_home_rails, 'apply_async') as apply_async:
+            for _ in range(2):
+                with self.captureOnCommitCallbacks(execute=True):
+                    Wishlist.objects.update_or_create(user=self.user, product=self.product)
+            with self.captureOnCommitCallbacks(execute=True):
+                with transaction.atomic():
+                    Review.objects.filter(user=self.user).delete()
+                    transaction.set_rollback(True)
+        apply_async.assert_called_once_with(kwargs={'names': ['popular_wishlist_products']}, countdown=RAIL_REFRESH_DELAY)
+
+
+class ProductListSerializerTests(APITestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name='Тестовая категория', image='category_images/test.png')
+        for index in range(3):
+            Product.objects.create(
+                sku=f'LIST00{index}', name=f'Товар {index}', description='Описание',
+                price=Decimal('99.90'), discount=index * 10, stock=5, category=self.category,
+                image=f'product_images/{index}.jpg', specifications={'Цвет': 'черный'}
+            )
+        self.products = Product.objects.select_related('category').order_by('id')
+
+    def serialize(self, serializer_class, query=''):
+        """Сериализует товары с запросом в контексте и возвращает данные после JSON"""
+        request = Request(APIRequestFactory().get(f'/main/products/{query}'))
+        data = serializer_class(self.products, many=True, context={'request': request}).data
+        return json.loads(json.dumps(data, default=str))
+
+    def test_matches_full_serializer(self):
+        """Тест совпадения значений облегченного и полного сериализатора"""
+        fields = ','.join(ProductListSerializer.ALL_FIELDS)
+        full = self.serialize(ProductSerializer)
+        self.assertEqual(self.serialize(ProductListSerializer, f'?fields={fields}'), full)
+
+        lean = self.serialize(ProductListSerializer)
+        self.assertEqual(list(lean[0]), list(ProductListSerializer.DEFAULT_FIELDS))
+        self.assertEqual(lean[0]['category'], full[0]['category'])
+
+    def test_sparse_fieldsets(self):
+        """Тест выбора полей списка товаров параметром fields"""
+        response = self.client.get(reverse('product-list'), {'fields': 'id,name,specifications,unknown'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'][0], {
+            'id': self.products[2].id, 'name': 'Товар 2', 'specifications': {'Цвет': 'черный'}
+        })
+
+
+class ProductProjectionTests(APITestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(
+            username='admin',
+            email='admin@example.com',
+            password='adminpassword123'
+        )
+        self.category = Category.objects.create(name='Тестовая категория')
+        for index in range(3):
+            product = Product.objects.create(
+                sku=f'PROJ00{index}', name=f'Товар {index}', description='Длинное описание',
+                price=Decimal('10.00'), stock=5, category=self.category, specifications={'Цвет': 'черный'}
+            )
+            Wishlist.objects.create(user=self.admin, product=product)
+        self.client.force_authenticate(user=self.admin)
+
+    def product_queries(self, url, params=None):
+        """Возвращает SQL запросов к таблице товаров при обращении к URL"""
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, params or {})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [
+            q['sql'] for q in context.captured_queries
+            if '"main_product"' in q['sql'] and not q['sql'].startswith('EXPLAIN') and '"silk_' not in q['sql']
+        ]
+
+    def test_card_lists_skip_heavy_columns(self):
+        """Тест загрузки списков товаров без описания и характеристик"""
+        for url in (reverse('product-list'), reverse('advanced-product-search'), reverse('get-favorites')):
+            queries = self.product_queries(url)
+            self.assertTrue(queries, url)
+            for sql in queries:
+                self.assertNotIn('"description"', sql)
+                self.assertNotIn('"specifications"', sql)
+
+        queries = self.product_queries(reverse('product-list'), {'fields': 'id,specifications'})
+        page_query = [sql for sql in queries if '"specifications"' in sql]
+        self.assertEqual(len(page_query), 1)
+        self.assertNotIn('"main_category"', page_query[0])
+
+    def test_dropdown_and_admin_grid(self):
+        """Тест проекций выпадающего списка поиска и списка товаров в админке"""
+        response = self.client.get(reverse('advanced-product-search'), {'dropdown': 'true'})
+        self.assertEqual(response.data['products'][0]['category'], {'name': 'Тестовая категория'})
+
+        self.client.force_login(self.admin)
+        queries = self.product_queries(reverse('admin:main_product_changelist'))
+        self.assertTrue(queries)
+        self.assertFalse([sql for sql in queries if '"description"' in sql])
+
+
+class ConditionalGetTests(APITestCase):
+    def setUp(self):
+        run_tasks_eagerly(self)
+        cache.clear()
+        self.category = Category.objects.create(name='Тестовая категория')
+        self.product = Product.objects.create(
+            sku='ETAG001', name='Товар', price=Decimal('10.00'), stock=5, category=self.category
+        )
+        self.user = User.objects.create_user(
+            username='reader',
+            email='reader@example.com',
+            password='testpassword123'
+        )
+
+    def assert_revalidates(self, url):
+        """Проверяет выдачу 304 по ETag и Last-Modified и возвращает ETag"""
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Cache-Control'], 'public, no-cache')
+        etag = response['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        return etag
+
+    def test_catalog_reads_return_not_modified(self):
+        """Тест условных запросов к списку товаров, товару и категориям"""
+        for url in (reverse('product-list'), reverse('product-detail', args=[self.product.id]), reverse('category-list')):
+            self.assert_revalidates(url)
+
+    def test_not_modified_skips_serialization(self):
+        """Тест ответа 304 для списка товаров без запросов к таблице товаров"""
+        url = reverse('product-list') + '?category=%d' % self.category.id
+        etag = self.client.get(url)['ETag']
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        product_queries = [
+            q['sql'] for q in context.captured_queries
+            if '"main_product"' in q['sql'] and not q['sql'].startswith('EXPLAIN') and '"silk_' not in q['sql']
+        ]
+        self.assertEqual(product_queries, [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.price = Decimal('12.00')
+            self.product.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_200_OK)
+
+    def test_etag_changes_with_reviews(self):
+        """Тест смены ETag после изменения товара и нового отзыва"""
+        url = reverse('product-list')
+        etag = self.assert_revalidates(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            Review.objects.create(user=self.user, product=self.product, rating=5, comment='Отлично')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        detail_url = reverse('product-detail', args=[self.product.id])
+        etag = self.client.get(detail_url)['ETag']
+        Product.objects.apply_rating_change(self.product.id, 5, 1)
+        self.assertEqual(self.client.get(detail_url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_200_OK)
+
+
+    def test_detail_last_modified_follows_rating(self):
+        """Тест Last-Modified карточки товара после изменения рейтинга"""
+        past = timezone.now() - timedelta(days=1)
+        Product.objects.filter(id=self.product.id).update(updated_at=past)
+        for model in ('main.category', 'main.review'):
+            cache.set(caching.make_key('version', model), int(past.timestamp() * 1000), None)
+        url = reverse('product-detail', args=[self.product.id])
+        last_modified = self.client.get(url)['Last-Modified']
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, status.HTTP_304_NOT_MODIFIED)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.apply_rating_change(self.product.id, 5, 1)
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['average_rating'], 5.0)
+
+
+class CachingLayerTests(TestCase):
+    def setUp(self):
+        run_tasks_eagerly(self)
+        cache.clear()
+        self.calls = 0
+
+    def compute(self):
+        self.calls += 1
+        return self.calls
+
+    def test_versioned_key_changes_after_commit(self):
+        """Тест устаревания ключа после изменения модели и фиксации транзакции"""
+        key = caching.versioned_key('main', 'test', [Category])
+        self.assertTrue(key.startswith('main:test:v'))
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            Category.objects.create(name='Новая категория')
+        self.assertEqual(caching.versioned_key('main', 'test', [Category]), key)
+        for callback in callbacks:
+            callback()
+        self.assertNotEqual(caching.versioned_key('main', 'test', [Category]), key)
+        self.assertEqual(caching.versioned_key('main', 'test', [Product]), caching.versioned_key('main', 'test', ['main.product']))
+
+    def test_get_or_set_computes_once(self):
+        """Тест однократного вычисления значения до истечения срока"""
+        self.assertEqual(caching.get_or_set('main:test', self.compute, 60), 1)
+        self.assertEqual(caching.get_or_set('main:test', self.compute, 60), 1)
+        self.assertEqual(self.calls, 1)
+
+    def test_early_refresh_serves_stale_value_while_locked(self):
+        """Тест выдачи текущего значения, пока другой процесс пересчитывает его заранее"""
+        cache.set('main:test', ('old', 0), 60)
+        cache.add('main:test:lock', 1, 60)
+        self.assertEqual(caching.get_or_set('main:test', self.compute, 60), 'old')
+        self.assertEqual(self.calls, 0)
+        cache.delete('main:test:lock')
+        self.assertEqual(caching.get_or_set('main:test', self.compute, 60), 1)
+        self.assertEqual(caching.get_value('main:test'), 1)
+
+
+class OrderNotificationTests(APITestCase):
+    def setUp(self):
+        run_tasks_eagerly(self)
+        self.admin = User.objects.create_superuser(username='admin', email='admin@example.com', password='adminpassword123')
+        customer = User.objects.create_user(username='customer', email='customer@example.com', password='testpassword123')
+        self.order = Order.objects.create(user=customer, status='assembling')
+        self.client.force_authenticate(user=self.admin)
+
+    def test_email_enqueued_after_commit(self):
+        """Тест постановки письма о статусе заказа в очередь после фиксации транзакции"""
+        from django.core import mail
+
+        url = reverse('send-order-notification', args=[self.order.id])
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            response = self.client.post(url, {'status': 'shipped', 'comment': 'Трек-номер 123'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertTrue(response.data['task_id'])
+        self.assertEqual(response.data['new_status'], 'shipped')
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(self.order.status_events.get().comment, 'Трек-номер 123')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            for callback in callbacks:
+                callback()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['customer@example.com'])
+        self.assertIn('Трек-номер 123', mail.outbox[0].body)
+        self.assertIn(self.order.order_number, mail.outbox[0].subject)
+
+    def test_status_change_returns_event_task_id(self):
+        """Тест возврата ID задачи обработки события при смене статуса"""
+        from unittest import mock
+        from .tasks import process_order_status_events
+
+        url = reverse('send-order-notification', args=[self.order.id])
+        with mock.patch.object(process_order_status_events, 'apply_async') as apply_async:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(url, {'status': 'shipped'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['old_status'], 'assembling')
+        self.assertEqual(apply_async.call_args.kwargs['task_id'], response.data['task_id'])
+        self.assertEqual(Order.objects.get(id=self.order.id).status, 'shipped')
+
+    def test_unchanged_status_resends_notification(self):
+        """Тест повторной отправки уведомления без смены статуса"""
+        from django.core import mail
+
+        url = reverse('send-order-notification', args=[self.order.id])
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(url, {'status': 'assembling'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertTrue(response.data['task_id'])
+        self.assertFalse(self.order.status_events.exists())
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_pending_rejected_as_manual_status(self):
+        """Тест запрета возврата заказа в корзину при ручной смене статуса"""
+        from .admin import OrderAdminForm
+        from .order_status import transition_orders
+
+        Order.objects.create(user=self.order.user, status='pending')
+        url = reverse('send-order-notification', args=[self.order.id])
+        response = self.client.post(url, {'status': 'pending'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        with self.assertRaises(ValueError):
+            transition_orders(Order.objects.filter(id=self.order.id), 'pending')
+        form = OrderAdminForm(
+            data={'user': self.order.user_id, 'status': 'pending', 'total_price': '0'},
+            instance=self.order,
+        )
+        self.assertFalse(form.is_valid())
+        self.assertIn('status', form.errors)
+        self.assertEqual(Order.objects.get(id=self.order.id).status, 'assembling')
+
+    def test_admin_change_form_uses_transition_service(self):
+        """Тест смены статуса в форме заказа админки через события смены статуса"""
+        from types import SimpleNamespace
+        from django.contrib import admin
+        from django.test import RequestFactory
+
+        request = RequestFactory().post('/')
+        request.user = self.admin
+        self.order.status = 'canceled'
+        form = SimpleNamespace(changed_data=['status'], initial={'status': 'assembling'})
+        with self.captureOnCommitCallbacks(execute=True):
+            admin.site._registry[Order].save_model(request, self.order, form, True)
+        self.assertEqual(Order.objects.get(id=self.order.id).status, 'canceled')
+        event = self.order.status_events.get()
+        self.assertEqual((event.old_status, event.new_status), ('assembling', 'canceled'))
+        self.assertIsNotNone(event.processed_at)
@@ -7,12 +7,14 @@ from .views import (
     ReviewListCreateView, get_favorites, user_orders, check_user_purchased_product,
     popular_wishlist_products, user_activity, FilteredProductListView,
     new_products, popular_products, recent_reviews, create_order,
-    send_order_notification
+    send_order_notification, catalog_stats, product_suggestions
 )
 
 urlpatterns = [
     path('categories/', CategoryListView.as_view(), name='category-list'),
     path('products/', ProductListView.as_view(), name='product-list'),
+    path('products/stats/', catalog_stats, name='catalog-stats'),
+    path('products/suggest/', product_suggestions, name='product-suggestions'),
     path('products/<int:pk>/', ProductDetailView.as_view(), name='product-detail'),
     path('products/<int:product_id>/check-purchased/', check_user_purchased_product, name='check-purchased'),
     path('products/<int:product_id>/reviews/', ReviewListCreateView.as_view(), name='review-list-create'),
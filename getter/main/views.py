@@ -1,28 +1,50 @@
+import logging
+
 from django.shortcuts import render, redirect, get_object_or_404
-from django.db.models import Sum, Count, Avg, Q
-from django.utils import timezone
+from django.db import transaction
+from django.db.models import Sum, Q
+from django.http import HttpResponse, StreamingHttpResponse
 from rest_framework import generics, status, permissions
 from rest_framework.views import APIView
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.exceptions import NotFound
+from rest_framework.decorators import api_view, authentication_classes, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework.filters import SearchFilter, OrderingFilter
-import random
 from decimal import Decimal
 from .models import Category, Product, Order, OrderItem, Review, Wishlist
-from .serializers import CategorySerializer, ProductSerializer, OrderSerializer, ReviewSerializer, OrderItemSerializer, WishlistSerializer
-from .filters import ProductFilter
-from users.utils import send_order_status_update
+from .serializers import CategorySerializer, ProductListSerializer, ProductSerializer, OrderSerializer, ReviewSerializer, WishlistSerializer
+from .filters import ProductFilter, ProductSearchFilter
+from .pagination import OrderCursorPagination, ProductCursorPagination, ProductSearchCursorPagination
+from .projections import card_columns, card_queryset, dropdown_rows
+from .orders import group_by_status, order_summary, serialize_order, stream_orders_json, with_items
+from . import cart as cart_service
+from .checkout import CartChangedError, StockShortageError, create_order_from_cart
+from .order_status import MANUAL_STATUSES, transition_order
+from .activity import get_user_activity
+from .categories import get_category_list
+from .http_cache import conditional_response, last_modified_ms, list_validators, make_etag
+from .rails import RAIL_MAX_AGE, get_rail
+from .stats import get_catalog_stats
+from .suggest import suggest_index
+from .caching import get_model_version
+from users.tasks import enqueue_on_commit, send_order_status_update_task
+
+logger = logging.getLogger(__name__)
 
 class CategoryListView(APIView):
     permission_classes = [AllowAny]
 
     def get(self, request):
-        # Аннотируем количество продуктов в каждой категории
-        categories = Category.objects.annotate(product_count=Count('products'))
-        serializer = CategorySerializer(categories, many=True, context={'request': request})
-        return Response(serializer.data)
+        # Список со счетчиками товаров хранится в кэше готовым JSON,
+        # время изменения определяется версиями категорий и товаров
+        categories = get_category_list(request)
+        last_modified = last_modified_ms(None, (Category, Product))
+
+        def build():
+            return HttpResponse(categories['body'], content_type='application/json')
+
+        return conditional_response(request, categories['etag'], last_modified, build)
 
     def post(self, request):
         if not request.user.is_superuser:
@@ -58,19 +80,43 @@ class ProductListView(generics.ListCreateAPIView):
     """
     serializer_class = ProductSerializer
     permission_classes = [AllowAny]
-    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
+    # Сортировку (?ordering=, по умолчанию -creation_date или релевантность
+    # для ?search=) выполняет курсорная пагинация
+    filter_backends = [DjangoFilterBackend, ProductSearchFilter]
     filterset_class = ProductFilter
-    search_fields = ['name', 'description', 'sku', 'category__name']
-    ordering_fields = ['name', 'price', 'creation_date', 'discount']
-    ordering = ['-creation_date']  # Сортировка по умолчанию
+    pagination_class = ProductCursorPagination
     
     def get_queryset(self):
         """
-        Возвращает queryset с аннотированным средним рейтингом.
+        Возвращает queryset товаров. Средний рейтинг хранится в самой модели.
         """
-        return Product.objects.all().select_related('category').annotate(
-            average_rating=Avg('reviews__rating')
-        )
+        if self.request.method == 'GET':
+            return card_queryset(Product.objects.all(), self.request)
+        return Product.objects.all().select_related('category')
+
+    def list(self, request, *args, **kwargs):
+        """
+        Список товаров с поддержкой условных запросов: при совпадении ETag
+        или If-Modified-Since возвращается 304 без выборки страницы и сериализации
+        """
+        # Валидаторы строятся по версиям моделей, без COUNT/MAX по выборке
+        etag, last_modified = list_validators(request)
+        queryset = self.filter_queryset(self.get_queryset())
+
+        def build():
+            page = self.paginate_queryset(queryset)
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+
+        return conditional_response(request, etag, last_modified, build)
+
+    def get_serializer_class(self):
+        """
+        Для чтения списка используется облегченный сериализатор, для создания - полный
+        """
+        if self.request.method == 'GET':
+            return ProductListSerializer
+        return ProductSerializer
     
     def create(self, request, *args, **kwargs):
         """
@@ -91,25 +137,59 @@ class ProductListView(generics.ListCreateAPIView):
         Дополнительный контекст для сериализатора
         """
         context = super().get_serializer_context()
-        # Добавляем статистику по товарам
-        context['products_count'] = Product.objects.count()
-        context['products_in_stock'] = Product.objects.filter(stock__gt=0).count()
-        context['products_with_discount'] = Product.objects.filter(discount__gt=0).count()
+        # Статистика каталога отдается отдельным эндпоинтом catalog_stats
         # Добавляем информацию о последнем просмотренном товаре из сессии
         if self.request.session.get('last_viewed_product'):
             context['last_viewed_product_id'] = self.request.session.get('last_viewed_product')
         return context
 
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def catalog_stats(request):
+    """Статистика каталога: общее количество товаров, в наличии, доступных и со скидкой"""
+    return Response(get_catalog_stats())
+
+@api_view(['GET'])
+@authentication_classes([])  # подсказки не зависят от пользователя, JWT не проверяем
+@permission_classes([AllowAny])
+def product_suggestions(request):
+    """Подсказки для строки поиска из префиксного индекса в памяти (без запросов к БД)"""
+    query = request.query_params.get('q', '').strip()
+    try:
+        limit = min(max(int(request.query_params.get('limit', 5)), 1), 10)
+    except ValueError:
+        limit = 5
+
+    return Response({
+        'products': suggest_index.suggest(query, limit) if query else [],
+        'query': query
+    })
+
 class ProductDetailView(APIView):
     permission_classes = [AllowAny]
 
     def get(self, request, pk):
-        try:
-            product = Product.objects.select_related('category').prefetch_related('reviews__user').get(id=pk)
+        # Рейтинг хранится в строке товара, поэтому для валидаторов ответа
+        # достаточно updated_at, агрегатов рейтинга и версий категорий и отзывов
+        row = Product.objects.filter(id=pk).values_list('updated_at', 'rating_sum', 'rating_count').first()
+        if row is None:
+            return Response({'error': 'Продукт не найден'}, status=status.HTTP_404_NOT_FOUND)
+        updated_at, rating_sum, rating_count = row
+        category_version = get_model_version(Category)
+        etag = make_etag(request.build_absolute_uri(), updated_at, rating_sum, rating_count, category_version)
+        # Агрегаты рейтинга меняются без изменения updated_at, поэтому
+        # Last-Modified учитывает версию отзывов
+        last_modified = last_modified_ms(updated_at, [Category, Review])
+
+        def build():
+            try:
+                product = Product.objects.select_related('category').get(id=pk)
+            except Product.DoesNotExist:
+                return Response({'error': 'Продукт не найден'}, status=status.HTTP_404_NOT_FOUND)
             serializer = ProductSerializer(product, context={'request': request})
             return Response(serializer.data)
-        except Product.DoesNotExist:
-            return Response({'error': 'Продукт не найден'}, status=status.HTTP_404_NOT_FOUND)
+
+        return conditional_response(request, etag, last_modified, build)
 
     def delete(self, request, pk):
         if not request.user.is_superuser:
@@ -200,7 +280,9 @@ class ReviewListCreateView(APIView):
             })
             
             if serializer.is_valid():
-                review = serializer.save()  # Сохраняем с уже установленным контекстом
+                with transaction.atomic():
+                    review = serializer.save()  # Сохраняем с уже установленным контекстом
+                    Product.objects.apply_rating_change(product.id, review.rating, 1)
                 return Response(ReviewSerializer(review, context={'request': request}).data, status=status.HTTP_201_CREATED)
             
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -222,7 +304,9 @@ class ReviewListCreateView(APIView):
                 review = Review.objects.get(id=review_id, product_id=product_id, user=request.user)
             
             print(f"Found review: {review.id} by user {review.user.username}")
-            review.delete()
+            with transaction.atomic():
+                review.delete()
+                Product.objects.apply_rating_change(review.product_id, -review.rating, -1)
             print("Review deleted successfully")
             return Response(status=status.HTTP_204_NO_CONTENT)
         except Review.DoesNotExist:
@@ -289,16 +373,7 @@ def check_wishlist(request):
 @permission_classes([IsAuthenticated])
 def get_cart(request):
     try:
-        # Проверяем, есть ли у пользователя несколько корзин
-        pending_orders = Order.objects.filter(user=request.user, status='pending')
-        if pending_orders.count() > 1:
-            # Если их несколько, оставляем только самую последнюю, остальные удаляем
-            latest_order = pending_orders.order_by('-created_at').first()
-            pending_orders.exclude(id=latest_order.id).delete()
-            print(f"Удалены лишние корзины, оставлена корзина с ID: {latest_order.id}")
-            order = latest_order
-        else:
-            order = pending_orders.first()
+        order = cart_service.get_cart(request.user)
 
         total_orders_sum = Order.objects.filter(user=request.user).aggregate(total_sum=Sum('total_price'))['total_sum'] or 0
 
@@ -316,96 +391,31 @@ def get_cart(request):
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def add_to_cart(request):
+    """Добавление товара в корзину (или изменение количества при отрицательном quantity)"""
+    product_id = request.data.get('product_id')
+    if not product_id:
+        return Response({'error': 'product_id is required'}, status=status.HTTP_400_BAD_REQUEST)
     try:
-        print("Полученные данные:", request.data)  # Лог входящих данных
-        
-        product_id = request.data.get('product_id')
-        quantity = int(request.data.get('quantity', 1))  # Убедимся, что это число
-        print(f"ID товара: {product_id}, Количество: {quantity}")
-
-        if not product_id:
-            print("Ошибка: product_id отсутствует")
-            return Response({'error': 'product_id is required'}, status=status.HTTP_400_BAD_REQUEST)
-
-        # Проверяем, есть ли у пользователя несколько корзин (заказов со статусом pending)
-        pending_orders = Order.objects.filter(user=request.user, status='pending')
-        if pending_orders.count() > 1:
-            # Если их несколько, оставляем только самую последнюю, остальные удаляем
-            latest_order = pending_orders.order_by('-created_at').first()
-            pending_orders.exclude(id=latest_order.id).delete()
-            print(f"Удалены лишние корзины, оставлена корзина с ID: {latest_order.id}")
-            order = latest_order
-        else:
-            # Если корзины нет или она одна, используем стандартную логику
-            order, created = Order.objects.get_or_create(user=request.user, status='pending')
-            print(f"Текущий заказ: {order.id}, создан ли новый: {created}")
-            
-        # Подготавливаем данные для валидации
-        order_item_data = {
-            'product_id': product_id,
-            'quantity': quantity
-        }
-        
-        # Проверяем существующий элемент в корзине
-        existing_item = OrderItem.objects.filter(order=order, product_id=product_id).first()
-        
-        if existing_item:
-            # Если товар уже есть в корзине, увеличиваем его количество
-            item_serializer = OrderItemSerializer(
-                existing_item, 
-                data={'product_id': product_id, 'quantity': existing_item.quantity + quantity},
-                partial=True
-            )
-        else:
-            # Если товара нет в корзине, создаем новый элемент
-            item_serializer = OrderItemSerializer(data={
-                'order': order.id,
-                'product_id': product_id,
-                'quantity': quantity
-            })
-        
-        # Проверяем валидность данных
-        if not item_serializer.is_valid():
-            print(f"Ошибки валидации: {item_serializer.errors}")
-            return Response(item_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-        
-        # Сохраняем элемент корзины
-        item_serializer.save(order=order)
-        
-        # Обновляем общую стоимость заказа
-        order.save()  # Пересчитываем total_price
-        print(f"Итоговая сумма заказа: {order.total_price}")
-        
-        # Возвращаем обновленную корзину
-        serializer = OrderSerializer(order, context={'request': request})
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        quantity = int(request.data.get('quantity', 1))
+    except (TypeError, ValueError):
+        return Response({'quantity': ['Введите правильное число.']}, status=status.HTTP_400_BAD_REQUEST)
 
+    try:
+        # Компактный ответ: измененная позиция и новая стоимость корзины
+        return Response(cart_service.add_to_cart(request.user, product_id, quantity), status=status.HTTP_200_OK)
+    except cart_service.CartError as e:
+        return Response(e.as_response_data(), status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
-        print("Ошибка:", str(e))  # Логируем любую другую ошибку
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 @api_view(['DELETE'])
 @permission_classes([IsAuthenticated])
 def remove_from_cart(request, item_id):
+    """Удаление позиции из корзины"""
     try:
-        # Проверяем, есть ли у пользователя несколько корзин
-        pending_orders = Order.objects.filter(user=request.user, status='pending')
-        if pending_orders.count() > 1:
-            # Если их несколько, оставляем только самую последнюю, остальные удаляем
-            latest_order = pending_orders.order_by('-created_at').first()
-            pending_orders.exclude(id=latest_order.id).delete()
-            print(f"Удалены лишние корзины, оставлена корзина с ID: {latest_order.id}")
-        
-        # Пытаемся найти товар в корзине
-        try:
-            order_item = OrderItem.objects.get(id=item_id, order__user=request.user, order__status='pending')
-            order = order_item.order
-            order_item.delete()
-            order.save()  # Пересчитывает total_price
-            serializer = OrderSerializer(order)
-            return Response(serializer.data, status=status.HTTP_200_OK)
-        except OrderItem.DoesNotExist:
-            return Response({'error': 'Позиция не найдена'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(cart_service.remove_from_cart(request.user, item_id), status=status.HTTP_200_OK)
+    except cart_service.CartError as e:
+        return Response(e.as_response_data(), status=status.HTTP_404_NOT_FOUND)
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
@@ -413,23 +423,13 @@ def remove_from_cart(request, item_id):
 @permission_classes([IsAuthenticated])
 def get_favorites(request):
     """Получение всех избранных товаров пользователя"""
-    wishlist_items = Wishlist.objects.filter(user=request.user).select_related('product')
+    fields = ProductListSerializer.requested_fields(request)
+    wishlist_items = Wishlist.objects.filter(user=request.user).select_related(
+        'product__category' if 'category' in fields else 'product'
+    ).only('product', *card_columns(fields, prefix='product__'))
     products = [item.product for item in wishlist_items]
     
-    # Аннотируем средний рейтинг
-    product_ids = [product.id for product in products]
-    products_with_rating = Product.objects.filter(id__in=product_ids).annotate(
-        average_rating=Avg('reviews__rating'),
-        reviews_count=Count('reviews')
-    )
-    
-    # Создаем словарь для быстрого доступа к продуктам с рейтингом
-    products_dict = {product.id: product for product in products_with_rating}
-    
-    # Заменяем продукты на аннотированные версии
-    products_with_data = [products_dict.get(product.id, product) for product in products]
-    
-    serializer = ProductSerializer(products_with_data, many=True, context={'request': request})
+    serializer = ProductListSerializer(products, many=True, context={'request': request})
     return Response(serializer.data)
 
 @api_view(['POST'])
@@ -437,95 +437,33 @@ def get_favorites(request):
 def create_order(request):
     """Создание заказа из корзины"""
     try:
-        print("=== Начало создания заказа ===")
-        print(f"Пользователь: {request.user.username} (ID: {request.user.id})")
-        print(f"Полученные данные: {request.data}")
-        
-        # Проверяем, есть ли у пользователя корзина (заказ со статусом pending)
-        pending_orders = Order.objects.filter(user=request.user, status='pending')
-        print(f"Найдено корзин: {pending_orders.count()}")
-        
-        if pending_orders.count() > 1:
-            # Если их несколько, оставляем только самую последнюю, остальные удаляем
-            latest_order = pending_orders.order_by('-created_at').first()
-            pending_orders.exclude(id=latest_order.id).delete()
-            print(f"Удалены лишние корзины, оставлена корзина с ID: {latest_order.id}")
-            cart = latest_order
-        else:
-            cart = pending_orders.first()
-            print(f"Использована существующая корзина с ID: {cart.id if cart else 'Нет'}")
+        # Корзина у пользователя одна (заказ со статусом pending)
+        cart = cart_service.get_cart(request.user)
         
         if not cart:
-            print("Ошибка: Корзина не найдена")
             return Response({'error': 'Корзина не найдена'}, status=status.HTTP_400_BAD_REQUEST)
             
-        if not cart.items.exists():
-            print("Ошибка: Корзина пуста")
+        cart_items = list(cart.items.all())
+        if not cart_items:
             return Response({'error': 'Корзина пуста'}, status=status.HTTP_400_BAD_REQUEST)
         
-        print(f"Корзина содержит {cart.items.count()} товаров")
-        
         # Получение данных доставки из запроса
-        print("Получение данных доставки из запроса:")
         shipping_data = request.data.get('shipping', {})
         
-        # Получаем итоговую цену заказа из запроса или вычисляем из корзины
-        total_price = request.data.get('total_price')
-        if total_price is not None:
-            try:
-                total_price = float(total_price)
-                print(f"Получена цена заказа из запроса: {total_price}")
-            except (ValueError, TypeError):
-                total_price = float(cart.calculate_total_price())
-                print(f"Ошибка при преобразовании цены из запроса, используем вычисленную: {total_price}")
-        else:
-            total_price = float(cart.calculate_total_price())
-            print(f"Цена заказа не указана в запросе, используем вычисленную: {total_price}")
-        
-        # Создаем новый заказ со статусом assembling вместо изменения корзины
-        new_order = Order.objects.create(
-            user=request.user,
-            status='assembling',
-            shipping_city=request.data.get('shipping_city') or shipping_data.get('city'),
-            shipping_street=request.data.get('shipping_street') or shipping_data.get('street'),
-            shipping_house=request.data.get('shipping_house') or shipping_data.get('house'),
-            shipping_apartment=request.data.get('shipping_apartment') or shipping_data.get('apartment'),
-            shipping_postal_code=request.data.get('shipping_postal_code') or shipping_data.get('postal_code'),
-            shipping_comment=request.data.get('shipping_comment') or shipping_data.get('comment'),
-            total_price=total_price
+        # Итоговая цена считается на сервере по ценам товаров корзины
+        new_order = create_order_from_cart(request.user, cart, cart_items, shipping={
+            'shipping_city': request.data.get('shipping_city') or shipping_data.get('city'),
+            'shipping_street': request.data.get('shipping_street') or shipping_data.get('street'),
+            'shipping_house': request.data.get('shipping_house') or shipping_data.get('house'),
+            'shipping_apartment': request.data.get('shipping_apartment') or shipping_data.get('apartment'),
+            'shipping_postal_code': request.data.get('shipping_postal_code') or shipping_data.get('postal_code'),
+            'shipping_comment': request.data.get('shipping_comment') or shipping_data.get('comment'),
+        })
+        logger.info(
+            f"Создан заказ {new_order.order_number} пользователя {request.user.id}: "
+            f"{len(cart_items)} позиций на сумму {new_order.total_price}"
         )
         
-        # Генерируем номер заказа
-        timestamp = timezone.now().strftime('%Y%m%d%H%M')
-        random_suffix = ''.join([str(random.randint(0, 9)) for _ in range(4)])
-        new_order.order_number = f"ORD-{timestamp}-{random_suffix}"
-        new_order.save(update_fields=['order_number'])
-        print(f"Сгенерирован номер заказа: {new_order.order_number}")
-        
-        # Копируем товары из корзины в новый заказ
-        for cart_item in cart.items.all():
-            # Создаем новый OrderItem для нового заказа
-            OrderItem.objects.create(
-                order=new_order,
-                product=cart_item.product,
-                quantity=cart_item.quantity
-            )
-            
-            # Уменьшаем количество товара на складе
-            product = cart_item.product
-            product.stock -= cart_item.quantity
-            product.save(update_fields=['stock'])
-            print(f"Уменьшено количество товара '{product.name}' на складе на {cart_item.quantity}. Остаток: {product.stock}")
-        
-        # Очищаем корзину (удаляем все товары)
-        cart.items.all().delete()
-        print(f"Корзина очищена")
-        
-        # Принудительно пересчитываем и обновляем total_price
-        new_order.total_price = new_order.calculate_total_price()
-        new_order.save(update_fields=['total_price'])
-        print(f"Обновлена итоговая цена заказа: {new_order.total_price}")
-        
         response_data = {
             'message': 'Заказ успешно создан',
             'order_id': new_order.id,
@@ -533,25 +471,27 @@ def create_order(request):
             'total_price': float(new_order.total_price),
             'shipping_address': new_order.get_shipping_address()
         }
-        print("=== Заказ успешно создан ===")
         return Response(response_data, status=status.HTTP_201_CREATED)
         
+    except StockShortageError as e:
+        logger.warning(f"Недостаточно товара для заказа пользователя {request.user.id}: {e.shortages}")
+        return Response(e.as_response_data(), status=status.HTTP_409_CONFLICT)
+    except CartChangedError as e:
+        return Response({'error': str(e)}, status=status.HTTP_409_CONFLICT)
     except Exception as e:
-        print(f"=== ОШИБКА: {str(e)} ===")
-        import traceback
-        print(traceback.format_exc())
+        logger.exception(f"Ошибка при создании заказа пользователя {request.user.id}: {e}")
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def user_orders(request):
-    """Получение всех заказов пользователя с полной информацией"""
+    """Получение заказов пользователя с полной информацией (курсорная пагинация)"""
     try:
         # Проверяем, запрашивает ли админ все заказы
         is_admin_request = request.user.is_superuser and request.query_params.get('admin') == 'true'
         
         # Базовый запрос для заказов
-        orders_query = Order.objects
+        orders_query = Order.objects.all()
         
         # Если это не админ или админ не запрашивает все заказы, фильтруем по пользователю
         if not is_admin_request:
@@ -573,94 +513,59 @@ def user_orders(request):
         if date_to:
             orders_query = orders_query.filter(created_at__lte=date_to)
         
-        # Сортируем по дате создания (сначала новые)
-        user_orders = orders_query.order_by('-created_at')
+        # Сумма покупок и количество заказов по группам статусов - одним запросом
+        summary = order_summary(orders_query)
         
-        # Группируем заказы по статусу
-        pending_orders = user_orders.filter(status__in=['assembling'])
-        completed_orders = user_orders.filter(status__in=['delivered', 'shipped'])
-        canceled_orders = user_orders.filter(status='canceled')
-        
-        # Вычисляем общую сумму всех заказов
-        total_spent = user_orders.exclude(status='canceled').aggregate(Sum('total_price'))['total_price__sum'] or 0
-        
-        # Подготавливаем детальную информацию о заказах
-        orders_data = []
-        for order in user_orders:
-            order_items = []
-            for item in order.items.all().select_related('product'):
-                order_items.append({
-                    'id': item.id,
-                    'name': item.product.name,
-                    'price': float(item.product.price),
-                    'quantity': item.quantity,
-                    'image': item.product.image.url if item.product.image else None,
-                    'product_id': item.product.id,
-                    'product': {
-                        'id': item.product.id,
-                        'name': item.product.name,
-                        'price': float(item.product.price),
-                        'image': item.product.image.url if item.product.image else None,
-                    }
-                })
-            
-            # Подготавливаем информацию о заказе
-            order_data = {
-                'id': order.id,
-                'order_number': order.order_number,
-                'created_at': order.created_at,
-                'status': order.status,
-                'total_price': float(order.total_price),
-                'items': order_items,
-                'shipping_address': order.get_shipping_address(),
-                'shipping_city': order.shipping_city,
-                'shipping_street': order.shipping_street,
-                'shipping_house': order.shipping_house,
-                'shipping_apartment': order.shipping_apartment,
-                'shipping_postal_code': order.shipping_postal_code,
-                'shipping_comment': order.shipping_comment
-            }
-            
-            # Добавляем информацию о пользователе для админа
-            if is_admin_request:
-                order_data['user_id'] = order.user.id
-                order_data['user_username'] = order.user.username
-                order_data['user_email'] = order.user.email
-            
-            orders_data.append(order_data)
-        
-        print(f"Найдено заказов для пользователя {request.user.id}: {len(orders_data)}")
+        # Все заказы магазина для админа отдаются потоком, без пагинации
+        if is_admin_request:
+            admin_orders = with_items(orders_query.select_related('user')).order_by('-created_at', '-id')
+            return StreamingHttpResponse(
+                stream_orders_json(admin_orders, summary),
+                content_type='application/json'
+            )
         
-        return Response({
-            'orders': orders_data,
-            'pending_orders': OrderSerializer(pending_orders, many=True).data,
-            'completed_orders': OrderSerializer(completed_orders, many=True).data,
-            'canceled_orders': OrderSerializer(canceled_orders, many=True).data,
-            'total_spent': float(total_spent)
-        })
+        # Страница заказов (новые первыми), позиции загружаются одним запросом
+        paginator = OrderCursorPagination()
+        page = paginator.paginate_queryset(with_items(orders_query), request)
+        orders_data = [serialize_order(order) for order in page]
+        
+        response = paginator.get_paginated_response(orders_data)
+        # Группы по статусу строятся из той же выборки (id заказов страницы)
+        response.data['groups'] = group_by_status(orders_data)
+        response.data.update(summary)
+        return response
+    except NotFound:
+        raise
     except Exception as e:
         print(f"Ошибка при получении заказов: {str(e)}")
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+def _rail_response(request, name: str) -> HttpResponse:
+    """
+    Отдает заранее сериализованную подборку главной страницы из кэша.
+
+    Args:
+        request: HTTP запрос
+        name: Название подборки
+
+    Returns:
+        Ответ с готовым JSON или 304, если ETag клиента совпадает
+    """
+    rail = get_rail(name)
+    if rail['etag'] in request.headers.get('If-None-Match', ''):
+        response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        response = HttpResponse(rail['body'], content_type='application/json')
+    response['ETag'] = rail['etag']
+    response['Cache-Control'] = f'public, max-age={RAIL_MAX_AGE}'
+    return response
+
 @api_view(['GET'])
+@authentication_classes([])  # подборки не зависят от пользователя, JWT не проверяем
 @permission_classes([AllowAny])
 def popular_wishlist_products(request):
     """Получение популярных товаров из списков желаемого"""
-    # Используем related_name="wishlisted_by" из модели Wishlist для определения популярных товаров
-    popular_products = Product.objects.annotate(
-        wishlist_count=Count('wishlisted_by')
-    ).filter(
-        wishlist_count__gt=0  # Только товары, добавленные хотя бы в один wishlist
-    ).order_by('-wishlist_count')[:10]
-    
-    # Добавляем информацию о рейтинге
-    popular_products = popular_products.annotate(
-        average_rating=Avg('reviews__rating'),
-        reviews_count=Count('reviews')
-    )
-    
-    serializer = ProductSerializer(popular_products, many=True, context={'request': request})
-    return Response(serializer.data)
+    return _rail_response(request, 'popular_wishlist_products')
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
@@ -670,59 +575,15 @@ def user_activity(request, user_id=None):
         # Определяем, чью активность запрашиваем
         target_user_id = user_id if user_id and request.user.is_superuser else request.user.id
         
-        # Получаем заказы пользователя
-        orders = Order.objects.filter(user_id=target_user_id).order_by('-created_at')
-        recent_orders = orders.select_related('user')[:5]
-        total_orders = orders.count()
-        total_spent = orders.exclude(status='canceled').aggregate(Sum('total_price'))['total_price__sum'] or 0
-
-        # Получаем отзывы пользователя
-        reviews = Review.objects.filter(user_id=target_user_id).order_by('-created_at')
-        recent_reviews = reviews.select_related('product', 'user')[:5]
-        total_reviews = reviews.count()
-
-        # Получаем избранные товары
-        wishlist = Wishlist.objects.filter(user_id=target_user_id).order_by('-added_at')
-        wishlist_items = wishlist.select_related('product')[:5]
-        total_wishlist = wishlist.count()
-
-        # Форматируем ответ
-        response_data = {
-            'totalOrders': total_orders,
-            'totalReviews': total_reviews,
-            'wishlistCount': total_wishlist,
-            'totalSpent': float(total_spent),
-            'recentOrders': [{
-                'id': order.id,
-                'order_number': order.order_number,
-                'total_price': float(order.total_price),
-                'status': order.status,
-                'created_at': order.created_at
-            } for order in recent_orders],
-            'recentReviews': [{
-                'id': review.id,
-                'product': {
-                    'id': review.product.id,
-                    'name': review.product.name,
-                },
-                'rating': review.rating,
-                'comment': review.comment,
-                'created_at': review.created_at,
-                'pros': review.pros,
-                'cons': review.cons
-            } for review in recent_reviews],
-            'wishlistItems': [{
-                'id': item.id,
-                'product': {
-                    'id': item.product.id,
-                    'name': item.product.name,
-                    'price': float(item.product.price)
-                },
-                'added_at': item.added_at
-            } for item in wishlist_items]
-        }
-
-        return Response(response_data)
+        data, etag = get_user_activity(target_user_id)
+        if etag in request.headers.get('If-None-Match', ''):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response(data)
+        response['ETag'] = etag
+        # Ответ зависит от пользователя: кэшировать можно только в браузере с перепроверкой
+        response['Cache-Control'] = 'private, no-cache'
+        return response
 
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -731,21 +592,19 @@ class FilteredProductListView(generics.ListAPIView):
     """
     Расширенный поиск и анализ товаров с поддержкой фильтрации
     """
-    serializer_class = ProductSerializer
+    serializer_class = ProductListSerializer
     permission_classes = [AllowAny]
-    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
+    # Сортировку (?ordering=, по умолчанию -creation_date или релевантность
+    # для ?search=) выполняет курсорная пагинация
+    filter_backends = [DjangoFilterBackend, ProductSearchFilter]
     filterset_class = ProductFilter
-    search_fields = ['name', 'description', 'sku', 'category__name']
-    ordering_fields = ['name', 'price', 'creation_date', 'discount']
-    ordering = ['-creation_date']  # Сортировка по умолчанию
+    pagination_class = ProductSearchCursorPagination
 
     def get_queryset(self):
         """
-        Возвращает queryset с аннотированным средним рейтингом.
+        Возвращает queryset товаров со столбцами, нужными для карточек.
         """
-        return Product.objects.all().select_related('category').annotate(
-            average_rating=Avg('reviews__rating')
-        )
+        return card_queryset(Product.objects.all(), self.request)
     
     def list(self, request, *args, **kwargs):
         """
@@ -755,17 +614,12 @@ class FilteredProductListView(generics.ListAPIView):
         
         # Если запрос для выпадающего списка, форматируем результаты по-другому
         if request.query_params.get('dropdown') == 'true':
-            limited_queryset = queryset[:5]  # Ограничиваем результаты
-            
-            # Форматируем результаты
-            results = [{
-                'id': p.id,
-                'name': p.name,
-                'price': float(p.price),
-                'image': p.image.url if p.image else None,
-                'category': {'name': p.category.name if p.category else ''},
-                'is_available': p.is_available
-            } for p in limited_queryset]
+            if 'search_rank' in queryset.query.annotations:
+                queryset = queryset.order_by('-search_rank', 'id')
+            else:
+                queryset = queryset.order_by('-creation_date', 'id')
+            # Загружаем только столбцы выпадающего списка, без создания моделей
+            results = dropdown_rows(queryset[:5])
             
             return Response({
                 'products': results,
@@ -773,90 +627,34 @@ class FilteredProductListView(generics.ListAPIView):
                 'query': request.query_params.get('search', '')
             })
             
-        # Стандартная сериализация для страницы поиска
+        # Стандартная сериализация для страницы поиска (курсорная пагинация,
+        # общее количество - только по запросу ?with_total=true)
         page = self.paginate_queryset(queryset)
-        if page is not None:
-            serializer = self.get_serializer(page, many=True)
-            response = self.get_paginated_response(serializer.data)
-            response.data['query'] = request.query_params.get('search', '')
-            return response
-
-        serializer = self.get_serializer(queryset, many=True)
-        return Response({
-            'products': serializer.data,
-            'total': queryset.count(),
-            'query': request.query_params.get('search', '')
-        })
+        serializer = self.get_serializer(page, many=True)
+        response = self.get_paginated_response(serializer.data)
+        response.data['query'] = request.query_params.get('search', '')
+        return response
 
 @api_view(['GET'])
+@authentication_classes([])  # подборки не зависят от пользователя, JWT не проверяем
 @permission_classes([AllowAny])
 def new_products(request):
     """Получение новых товаров по дате создания"""
-    # Получаем текущую дату
-    current_date = timezone.now()
-    
-    # Определяем дату, которая была 30 дней назад
-    month_ago = current_date - timezone.timedelta(days=30)
-    
-    # Найдем все товары, созданные за последние 30 дней
-    new_products = Product.objects.filter(
-        creation_date__gte=month_ago
-    ).order_by('-creation_date')[:10]  # Сортируем по дате создания (от новых к старым)
-    
-    # Аннотируем средний рейтинг
-    new_products = new_products.annotate(
-        average_rating=Avg('reviews__rating')
-    )
-    
-    serializer = ProductSerializer(new_products, many=True, context={'request': request})
-    return Response(serializer.data)
+    return _rail_response(request, 'new_products')
 
 @api_view(['GET'])
+@authentication_classes([])  # подборки не зависят от пользователя, JWT не проверяем
 @permission_classes([AllowAny])
 def popular_products(request):
     """Получение популярных товаров по количеству отзывов и рейтингу"""
-    # Находим товары с наибольшим количеством отзывов и высоким рейтингом
-    popular_products = Product.objects.annotate(
-        reviews_count=Count('reviews'),
-        average_rating=Avg('reviews__rating')
-    ).filter(
-        reviews_count__gt=0  # Только товары с отзывами
-    ).order_by('-reviews_count', '-average_rating')[:10]
-    
-    serializer = ProductSerializer(popular_products, many=True, context={'request': request})
-    return Response(serializer.data)
+    return _rail_response(request, 'popular_products')
 
 @api_view(['GET'])
+@authentication_classes([])  # подборки не зависят от пользователя, JWT не проверяем
 @permission_classes([AllowAny])
 def recent_reviews(request):
     """Получение последних отзывов пользователей"""
-    # Получаем последние отзывы с информацией о продуктах и пользователях
-    reviews = Review.objects.select_related('product', 'user').order_by('-created_at')[:10]
-    
-    # Создаем расширенный ответ
-    response_data = []
-    for review in reviews:
-        review_data = {
-            'id': review.id,
-            'rating': review.rating,
-            'comment': review.comment,
-            'pros': review.pros,
-            'cons': review.cons,
-            'created_at': review.created_at,
-            'product': {
-                'id': review.product.id,
-                'name': review.product.name,
-                'image': review.product.image.url if review.product.image else None,
-            },
-            'user': {
-                'id': review.user.id,
-                'username': review.user.username,
-                'profile_image': review.user.get_profile_image_url() if hasattr(review.user, 'get_profile_image_url') else None,
-            }
-        }
-        response_data.append(review_data)
-    
-    return Response(response_data)
+    return _rail_response(request, 'recent_reviews')
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
@@ -925,31 +723,34 @@ def send_order_notification(request, order_id):
         if not status_update:
             return Response({'error': 'Необходимо указать статус заказа'}, status=status.HTTP_400_BAD_REQUEST)
         
-        # Проверяем, что статус валидный
-        valid_statuses = ['pending', 'assembling', 'shipped', 'delivered', 'canceled']
-        if status_update not in valid_statuses:
+        # Проверяем, что статус валидный (вернуть заказ в корзину нельзя)
+        if status_update not in MANUAL_STATUSES:
             return Response({'error': 'Неверный статус заказа'}, status=status.HTTP_400_BAD_REQUEST)
         
-        # Обновляем статус заказа
+        # Статус меняется через main.order_status: событие смены статуса
+        # обрабатывает воркер Celery (уведомление, возврат товара при отмене)
         old_status = order.status
-        order.status = status_update
-        order.save()
+        with transaction.atomic():
+            task_id = transition_order(order.id, status_update, comment)
+            
+            # Статус не изменился: событие не записывается, уведомление отправляется повторно
+            if task_id is None and order.user.email:
+                task_id = enqueue_on_commit(
+                    send_order_status_update_task,
+                    order.user.email,
+                    order.order_number,
+                    status_update,
+                    comment
+                )
         
-        # Отправляем уведомление по email
         if order.user.email:
-            send_order_status_update(
-                order.user.email,
-                order.order_number,
-                status_update,
-                comment
-            )
-            
             return Response({
-                'message': f'Уведомление о статусе заказа отправлено на {order.user.email}',
+                'message': f'Уведомление о статусе заказа поставлено в очередь на {order.user.email}',
                 'order_id': order.id,
                 'old_status': old_status,
-                'new_status': status_update
-            }, status=status.HTTP_200_OK)
+                'new_status': status_update,
+                'task_id': task_id
+            }, status=status.HTTP_202_ACCEPTED)
         else:
             return Response({
                 'message': 'Статус заказа обновлен, но уведомление не отправлено: у пользователя не указан email',
@@ -7,6 +7,8 @@ import subprocess
 
 # Установка переменной окружения для настроек Django
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "getter.settings")
+# Воркер получает отдельные размеры пула соединений с базой данных
+os.environ.setdefault("CELERY_WORKER", "True")
 
 if __name__ == "__main__":
     # Запуск Celery worker с событиями для мониторинга
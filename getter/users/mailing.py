@@ -0,0 +1,110 @@
+"""
+Массовая рассылка писем.
+
+Получатели читаются потоком (values_list + iterator) без создания объектов
+User и делятся на пакеты по BULK_EMAIL_BATCH_SIZE. Каждый пакет отправляется
+отдельной задачей Celery через одно SMTP-соединение; частота задач
+ограничена BULK_EMAIL_RATE_LIMIT, а при ошибке SMTP задача повторяет
+отправку только еще не отправленных писем пакета. Так же пакетами
+отправляются уведомления об изменении статуса заказов.
+"""
+
+import logging
+import smtplib
+from itertools import islice
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+
+logger = logging.getLogger(__name__)
+
+# Получатель рассылки: (имя пользователя, email)
+Recipient = Tuple[str, str]
+
+
+def iter_batches(recipients: Iterable[Recipient], size: Optional[int] = None) -> Iterator[List[Recipient]]:
+    """
+    Делит поток получателей на пакеты.
+
+    Args:
+        recipients: Получатели (например, values_list('username', 'email').iterator())
+        size: Размер пакета (по умолчанию BULK_EMAIL_BATCH_SIZE)
+
+    Yields:
+        Списки получателей
+    """
+    size = size or settings.BULK_EMAIL_BATCH_SIZE
+    iterator = iter(recipients)
+    while batch := [list(recipient) for recipient in islice(iterator, size)]:
+        yield batch
+
+
+def inactive_reminder_message(username: str, email: str) -> EmailMessage:
+    """
+    Создает письмо-напоминание неактивному пользователю.
+
+    Args:
+        username: Имя пользователя
+        email: Email пользователя
+
+    Returns:
+        Письмо
+    """
+    return EmailMessage(
+        'Мы скучаем по вам!',
+        f'Здравствуйте, {username}!\n\nМы заметили, что вы давно не заходили в наш магазин. '
+        f'У нас появилось много новых товаров, которые могут вас заинтересовать.\n\n'
+        f'Посетите наш сайт, чтобы узнать о новинках и специальных предложениях!',
+        settings.DEFAULT_FROM_EMAIL,
+        [email],
+    )
+
+
+class BatchSendError(Exception):
+    """
+    Ошибка отправки пакета: хранит количество получателей, обработанных до ошибки.
+    """
+
+    def __init__(self, processed: int, error: Exception):
+        super().__init__(str(error))
+        self.processed = processed
+        self.error = error
+
+
+def send_batch(recipients: Sequence[Sequence[Any]],
+               build: Callable[..., EmailMessage]) -> int:
+    """
+    Отправляет пакет писем через одно соединение с почтовым сервером.
+    Письмо, адрес которого отклонил сервер, пропускается: повтор его не
+    исправит, поэтому повторяются только ошибки соединения.
+
+    Args:
+        recipients: Данные писем пакета (например, пары (имя пользователя, email))
+        build: Функция, создающая письмо из элемента пакета (build(*item))
+
+    Returns:
+        Количество отправленных писем
+
+    Raises:
+        BatchSendError: Если отправка прервалась ошибкой соединения SMTP или сети;
+            processed - сколько получателей пакета уже обработано
+    """
+    sent = processed = 0
+    connection = get_connection(fail_silently=False)
+    try:
+        connection.open()
+        # Письма отправляются по одному в открытом соединении, чтобы при
+        # ошибке знать, с какого получателя продолжить
+        for item in recipients:
+            message = build(*item)
+            try:
+                sent += connection.send_messages([message]) or 0
+            except smtplib.SMTPRecipientsRefused as error:
+                logger.warning(f"Адрес отклонен почтовым сервером, письмо пропущено: {', '.join(error.recipients)}")
+            processed += 1
+    except (smtplib.SMTPException, OSError) as error:
+        raise BatchSendError(processed, error) from error
+    finally:
+        connection.close()
+    return sent
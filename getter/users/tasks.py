@@ -1,50 +1,175 @@
-from celery import shared_task
+import smtplib
+from celery import Task, shared_task
+from celery.utils import uuid
+from django.db import transaction
 from django.utils import timezone
 from django.db.models import Q, Count
-from django.core.mail import send_mail
 from django.conf import settings
+from .mailing import BatchSendError, inactive_reminder_message, iter_batches, send_batch
 from .models import User
+from . import utils
 import logging
 from typing import Dict, List, Any, Optional
 
 logger = logging.getLogger(__name__)
 
+# Параметры повторов отправки писем: экспоненциальная задержка до 10 минут
+EMAIL_TASK_OPTIONS = {
+    'autoretry_for': (smtplib.SMTPException, OSError),
+    'retry_backoff': 30,
+    'retry_backoff_max': 600,
+    'retry_jitter': True,
+    'max_retries': 5,
+}
+
+
+def enqueue_on_commit(task: Task, *args: Any) -> str:
+    """
+    Ставит задачу в очередь после фиксации текущей транзакции, чтобы
+    воркер не получил данные, которые еще не записаны или будут откачены.
+    
+    Args:
+        task: Задача Celery
+        *args: Аргументы задачи
+    
+    Returns:
+        ID задачи (известен до постановки в очередь)
+    """
+    task_id = uuid()
+    # robust: недоступность брокера не превращает уже зафиксированный запрос в ошибку
+    transaction.on_commit(lambda: task.apply_async(args=args, task_id=task_id), robust=True)
+    return task_id
+
+@shared_task(**EMAIL_TASK_OPTIONS)
+def send_welcome_email_task(user_email: str) -> bool:
+    """
+    Отправляет приветственное письмо (users.utils.send_welcome_email).
+    
+    Args:
+        user_email: Email пользователя
+    
+    Returns:
+        True, если письмо отправлено
+    """
+    return utils.send_welcome_email(user_email)
+
+@shared_task(**EMAIL_TASK_OPTIONS)
+def send_password_reset_email_task(user_email: str, reset_link: str) -> bool:
+    """
+    Отправляет письмо для сброса пароля (users.utils.send_password_reset_email).
+    
+    Args:
+        user_email: Email пользователя
+        reset_link: Ссылка для сброса пароля
+    
+    Returns:
+        True, если письмо отправлено
+    """
+    return utils.send_password_reset_email(user_email, reset_link)
+
+@shared_task(**EMAIL_TASK_OPTIONS)
+def send_order_confirmation_email_task(user_email: str, order_number: str, order_details: str) -> bool:
+    """
+    Отправляет письмо с подтверждением заказа (users.utils.send_order_confirmation_email).
+    
+    Args:
+        user_email: Email пользователя
+        order_number: Номер заказа
+        order_details: Состав заказа
+    
+    Returns:
+        True, если письмо отправлено
+    """
+    return utils.send_order_confirmation_email(user_email, order_number, order_details)
+
+@shared_task(**EMAIL_TASK_OPTIONS)
+def send_order_status_update_task(user_email: str, order_number: str, status: str,
+                                  comment: Optional[str] = None) -> bool:
+    """
+    Отправляет уведомление об изменении статуса заказа (users.utils.send_order_status_update).
+    
+    Args:
+        user_email: Email пользователя
+        order_number: Номер заказа
+        status: Новый статус заказа
+        comment: Дополнительный комментарий
+    
+    Returns:
+        True, если письмо отправлено
+    """
+    return utils.send_order_status_update(user_email, order_number, status, comment)
+
 @shared_task
 def send_inactive_users_reminder(*args, **kwargs) -> Dict[str, int]:
     """
     Периодическая задача для отправки напоминаний неактивным пользователям.
     Отправляет email пользователям, которые не входили в систему более 30 дней.
+    Получатели читаются потоком и делятся на пакеты, каждый пакет отправляется
+    задачей send_reminder_batch (см. users.mailing).
     
     Returns:
-        Словарь с количеством отправленных напоминаний
+        Словарь с количеством получателей и пакетов, поставленных в очередь
     """
     # Определяем порог неактивности (30 дней)
     threshold_date = timezone.now() - timezone.timedelta(days=30)
     
-    # Получаем неактивных пользователей
-    inactive_users = User.objects.filter(
+    # Получаем неактивных пользователей (только имя и email)
+    recipients = User.objects.filter(
         last_login__lt=threshold_date,
         is_active=True
-    )
-    
-    sent_count = 0
-    for user in inactive_users:
-        try:
-            send_mail(
-                'Мы скучаем по вам!',
-                f'Здравствуйте, {user.username}!\n\nМы заметили, что вы давно не заходили в наш магазин. '
-                f'У нас появилось много новых товаров, которые могут вас заинтересовать.\n\n'
-                f'Посетите наш сайт, чтобы узнать о новинках и специальных предложениях!',
-                settings.DEFAULT_FROM_EMAIL,
-                [user.email],
-                fail_silently=True,
-            )
-            sent_count += 1
-        except Exception as e:
-            logger.error(f"Ошибка при отправке напоминания пользователю {user.username}: {e}")
-    
-    logger.info(f"Отправлено {sent_count} напоминаний неактивным пользователям")
-    return {'sent_reminders': sent_count}
+    ).exclude(email='').order_by('pk').values_list('username', 'email')
+    
+    queued = batches = 0
+    for batch in iter_batches(recipients.iterator(chunk_size=settings.BULK_EMAIL_BATCH_SIZE)):
+        send_reminder_batch.delay(batch)
+        queued += len(batch)
+        batches += 1
+    
+    logger.info(f"Поставлено в очередь {queued} напоминаний неактивным пользователям ({batches} пакетов)")
+    return {'queued_reminders': queued, 'batches': batches}
+
+@shared_task(bind=True, rate_limit=settings.BULK_EMAIL_RATE_LIMIT, max_retries=5)
+def send_reminder_batch(self, recipients: List[List[str]]) -> Dict[str, int]:
+    """
+    Отправляет пакет напоминаний через одно SMTP-соединение.
+    При ошибке повторяет отправку оставшихся писем с экспоненциальной задержкой.
+    
+    Args:
+        recipients: Список пар [имя пользователя, email]
+    
+    Returns:
+        Словарь с количеством отправленных напоминаний
+    """
+    try:
+        sent = send_batch(recipients, inactive_reminder_message)
+    except BatchSendError as e:
+        logger.error(f"Ошибка при отправке пакета напоминаний: {e}")
+        raise self.retry(args=(recipients[e.processed:],), exc=e.error, countdown=60 * 2 ** self.request.retries)
+    
+    logger.info(f"Отправлено {sent} напоминаний неактивным пользователям")
+    return {'sent_reminders': sent}
+
+@shared_task(bind=True, rate_limit=settings.BULK_EMAIL_RATE_LIMIT, max_retries=5)
+def send_order_status_batch(self, notifications: List[List[str]]) -> Dict[str, int]:
+    """
+    Отправляет пакет уведомлений об изменении статуса заказов через одно
+    SMTP-соединение (см. main.order_status.process_status_events).
+    При ошибке повторяет отправку оставшихся писем с экспоненциальной задержкой.
+    
+    Args:
+        notifications: Список [email, номер заказа, новый статус]
+    
+    Returns:
+        Словарь с количеством отправленных уведомлений
+    """
+    try:
+        sent = send_batch(notifications, utils.order_status_update_message)
+    except BatchSendError as e:
+        logger.error(f"Ошибка при отправке пакета уведомлений о статусе заказов: {e}")
+        raise self.retry(args=(notifications[e.processed:],), exc=e.error, countdown=60 * 2 ** self.request.retries)
+    
+    logger.info(f"Отправлено {sent} уведомлений об изменении статуса заказов")
+    return {'sent_notifications': sent}
 
 @shared_task
 def cleanup_inactive_accounts(*args, **kwargs) -> Dict[str, int]:
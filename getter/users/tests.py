@@ -4,6 +4,30 @@ from rest_framework.test import APITestCase, APIClient
 from rest_framework import status
 from .models import User
 from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
+from django.test import override_settings
+from django.utils import timezone
+from smtplib import SMTPRecipientsRefused, SMTPServerDisconnected
+from getter.celery import app as celery_app
+
+
+class FlakyEmailBackend(EmailBackend):
+    """Почтовый бэкенд для тестов: обрывает соединение на третьем письме один раз и отклоняет адреса invalid*"""
+    connections = 0
+    failed = False
+
+    def open(self):
+        FlakyEmailBackend.connections += 1
+        return super().open()
+
+    def send_messages(self, messages):
+        refused = [address for message in messages for address in message.to if address.startswith('invalid')]
+        if refused:
+            raise SMTPRecipientsRefused({address: (550, b'No such user') for address in refused})
+        if len(mail.outbox) == 2 and not FlakyEmailBackend.failed:
+            FlakyEmailBackend.failed = True
+            raise SMTPServerDisconnected('Соединение разорвано')
+        return super().send_messages(messages)
 
 class UserModelTests(TestCase):
     def setUp(self):
@@ -108,3 +132,45 @@ class UserAPITests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(mail.outbox), 1)  # Проверяем, что письмо было отправлено
         self.assertIn('Добро пожаловать', mail.outbox[0].subject)
+
+
+@override_settings(BULK_EMAIL_BATCH_SIZE=2, EMAIL_BACKEND='users.tests.FlakyEmailBackend')
+class BulkEmailTests(TestCase):
+    def setUp(self):
+        celery_app.conf.task_always_eager = True
+        self.addCleanup(setattr, celery_app.conf, 'task_always_eager', False)
+        FlakyEmailBackend.connections = 0
+        FlakyEmailBackend.failed = True
+        old_login = timezone.now() - timezone.timedelta(days=60)
+        for index in range(5):
+            User.objects.create_user(username=f'sleepy{index}', email=f'sleepy{index}@example.com',
+                                     password='testpassword123', last_login=old_login)
+        User.objects.create_user(username='active', email='active@example.com',
+                                 password='testpassword123', last_login=timezone.now())
+
+    def test_reminders_sent_in_batches(self):
+        """Тест рассылки напоминаний пакетами: одно соединение на пакет"""
+        from .tasks import send_inactive_users_reminder
+
+        self.assertEqual(send_inactive_users_reminder(), {'queued_reminders': 5, 'batches': 3})
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox),
+                         [f'sleepy{index}@example.com' for index in range(5)])
+        self.assertEqual(FlakyEmailBackend.connections, 3)
+
+    def test_failed_batch_retries_remaining_messages(self):
+        """Тест повтора пакета после ошибки SMTP без повторной отправки доставленных писем"""
+        from .tasks import send_reminder_batch
+
+        FlakyEmailBackend.failed = False
+        recipients = [[f'sleepy{index}', f'sleepy{index}@example.com'] for index in range(4)]
+        send_reminder_batch.delay(recipients)
+        self.assertEqual([message.to[0] for message in mail.outbox], [email for _, email in recipients])
+
+    def test_refused_recipient_skipped_without_retry(self):
+        """Тест пропуска отклоненного адреса без повтора пакета"""
+        from .tasks import send_reminder_batch
+
+        recipients = [['sleepy0', 'sleepy0@example.com'], ['broken', 'invalid@example.com'], ['sleepy1', 'sleepy1@example.com']]
+        self.assertEqual(send_reminder_batch.delay(recipients).get(), {'sent_reminders': 2})
+        self.assertEqual([message.to[0] for message in mail.outbox], ['sleepy0@example.com', 'sleepy1@example.com'])
+        self.assertEqual(FlakyEmailBackend.connections, 1)
@@ -1,4 +1,4 @@
-from django.core.mail import send_mail
+from django.core.mail import EmailMessage, send_mail
 from django.conf import settings
 
 
@@ -83,15 +83,18 @@ def send_order_confirmation_email(user_email, order_number, order_details):
     return True
 
 
-def send_order_status_update(user_email, order_number, status, comment=None):
+def order_status_update_message(user_email, order_number, status, comment=None):
     """
-    Отправляет уведомление об изменении статуса заказа
+    Создает уведомление об изменении статуса заказа
     
     Args:
         user_email: Email пользователя
         order_number: Номер заказа
         status: Новый статус заказа
         comment: Дополнительный комментарий (опционально)
+    
+    Returns:
+        Письмо (EmailMessage)
     """
     status_map = {
         'pending': 'Ожидает обработки',
@@ -123,12 +126,24 @@ def send_order_status_update(user_email, order_number, status, comment=None):
     Команда поддержки
     '''
     
-    send_mail(
+    return EmailMessage(
         subject=subject,
-        message=message,
+        body=message,
         from_email=settings.DEFAULT_FROM_EMAIL,
-        recipient_list=[user_email],
-        fail_silently=False,
+        to=[user_email],
     )
+
+
+def send_order_status_update(user_email, order_number, status, comment=None):
+    """
+    Отправляет уведомление об изменении статуса заказа
+    
+    Args:
+        user_email: Email пользователя
+        order_number: Номер заказа
+        status: Новый статус заказа
+        comment: Дополнительный комментарий (опционально)
+    """
+    order_status_update_message(user_email, order_number, status, comment).send(fail_silently=False)
     
-    return True 
\ No newline at end of file
+    return True